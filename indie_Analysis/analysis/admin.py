@@ -1,9 +1,15 @@
 from django.contrib import admin
 
 # Register your models here.
-from django.contrib import admin
-from django.core.mail import send_mail
-from .models import ContactMessage
+from django.contrib import admin, messages
+from django.db import transaction
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .mail import enqueue_email
+from .models import ContactMessage, OutboundEmail, ProfileArtifact
 
 @admin.register(ContactMessage)
 class ContactMessageAdmin(admin.ModelAdmin):
@@ -11,20 +17,102 @@ class ContactMessageAdmin(admin.ModelAdmin):
     list_filter = ('date_envoi', 'responded')
     search_fields = ('email', 'message')
     readonly_fields = ('email', 'message', 'date_envoi')
+    ordering = ('-date_envoi',)
+    actions = ['bulk_reply']
+
+    # Pas de COUNT(*) sur toute la table à chaque affichage de la liste
+    show_full_result_count = False
 
     # Champs à afficher dans le formulaire
     fields = ('nom', 'email', 'message', 'date_envoi', 'response', 'responded')
 
     def save_model(self, request, obj, form, change):
         # Si une réponse est ajoutée et le message n'a pas encore été répondu
+        # (la réponse est mise en file d'attente, envoyée par send_queued_mail)
         if obj.response and not obj.responded:
-            send_mail(
+            enqueue_email(
                 subject="Réponse à votre message",
-                message=obj.response,
-                from_email="votre.email@example.com",  # à remplacer
-                recipient_list=[obj.email],
-                fail_silently=False,
+                body=obj.response,
+                recipients=[obj.email],
             )
             obj.responded = True
         super().save_model(request, obj, form, change)
+
+    @admin.action(description="Répondre aux messages sélectionnés")
+    def bulk_reply(self, request, queryset):
+        """Answer the selected messages with one reply (intermediate page with the reply form)"""
+        pending = queryset.filter(responded=False)
+        response = request.POST.get('response', '').strip()
+
+        if 'apply' in request.POST and response:
+            with transaction.atomic():
+                recipients = list(pending.select_for_update().values_list('email', flat=True))
+                enqueue_email(
+                    subject="Réponse à votre message",
+                    body=response,
+                    recipients=recipients,
+                )
+                count = pending.update(response=response, responded=True)
+            self.message_user(request, f"{count} réponse(s) mise(s) en file d'attente", messages.SUCCESS)
+            return None
+
+        # Seules les cases cochées de la page sont renvoyées : avec "Tout sélectionner",
+        # la sélection est refaite à partir des filtres de la liste (query string)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': "Répondre aux messages sélectionnés",
+            'opts': self.model._meta,
+            'selected_count': queryset.count(),
+            'pending_count': pending.count(),
+            'select_across': request.POST.get('select_across') == '1',
+            'selected': request.POST.getlist(admin.helpers.ACTION_CHECKBOX_NAME),
+            'action_checkbox_name': admin.helpers.ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(request, 'admin/analysis/contactmessage/bulk_reply.html', context)
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('to', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to', 'subject')
+    readonly_fields = ('subject', 'body', 'from_email', 'to', 'attempts', 'claimed_at',
+                       'last_error', 'created_at', 'sent_at')
+
+@admin.register(ProfileArtifact)
+class ProfileArtifactAdmin(admin.ModelAdmin):
+    list_display = ('path', 'mode', 'duration_ms', 'status_code', 'user', 'created_at', 'downloads')
+    list_filter = ('mode', 'created_at')
+    search_fields = ('path',)
+    ordering = ('-created_at',)
+    fields = ('path', 'user', 'mode', 'status_code', 'duration_ms', 'samples', 'created_at', 'downloads', 'summary')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description="Téléchargements")
+    def downloads(self, obj):
+        if obj.mode == "cprofile":
+            return format_html('<a href="{}">pstats</a>', reverse('admin:analysis_profileartifact_pstats', args=[obj.pk]))
+        return format_html('<a href="{}">collapsed stacks</a>', reverse('admin:analysis_profileartifact_collapsed', args=[obj.pk]))
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/collapsed/', self.admin_site.admin_view(self.collapsed_view), name='analysis_profileartifact_collapsed'),
+            path('<int:pk>/pstats/', self.admin_site.admin_view(self.pstats_view), name='analysis_profileartifact_pstats'),
+        ] + super().get_urls()
+
+    def collapsed_view(self, request, pk):
+        """Collapsed stacks, e.g. flamegraph.pl profile.txt > profile.svg"""
+        artifact = get_object_or_404(ProfileArtifact, pk=pk)
+        response = HttpResponse(artifact.collapsed, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="profile-{pk}.txt"'
+        return response
+
+    def pstats_view(self, request, pk):
+        """cProfile dump, e.g. snakeviz profile.prof"""
+        artifact = get_object_or_404(ProfileArtifact, pk=pk)
+        response = HttpResponse(bytes(artifact.pstats or b''), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{pk}.prof"'
+        return response
 # Register your models here.
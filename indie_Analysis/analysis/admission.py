@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+
+# Header telling how a limited request was served: admitted, stale or rejected
+ADMISSION_HEADER = "X-DataPlay-Admission"
+
+# Headers of a page replayed with it when it is served stale
+STALE_HEADERS = ("Content-Type", "Vary", "Cache-Control")
+
+def get_route_limits():
+    """Admission limits per URL name: limit (concurrent requests), queue (waiting requests), timeout (seconds)"""
+    return getattr(settings, "DATAPLAY_ADMISSION_LIMITS", {})
+
+def get_retry_after():
+    return getattr(settings, "DATAPLAY_ADMISSION_RETRY_AFTER", 5)
+
+def get_stale_entries():
+    """Pages kept to be served stale when a route is saturated (0 = never serve stale pages)"""
+    return getattr(settings, "DATAPLAY_ADMISSION_STALE_ENTRIES", 256)
+
+class AdmissionController:
+    """
+    Concurrency limiter with a bounded wait queue
+    At most limit requests run at once, at most queue requests wait for a slot
+    (for timeout seconds at most), the others are rejected straight away
+    The counts are kept in memory: each server process (e.g. each gunicorn worker)
+    has its own controller, so a route runs up to limit requests per process
+    """
+
+    def __init__(self, limit, queue=0, timeout=10):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.counters = {'admitted': 0, 'rejected': 0, 'timed_out': 0, 'stale': 0}
+        self.max_waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed; False if the request is rejected"""
+        with self._condition:
+            if self.active < self.limit:
+                self.active += 1
+                self.counters['admitted'] += 1
+                return True
+            if self.waiting >= self.queue:
+                self.counters['rejected'] += 1
+                return False
+
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            try:
+                admitted = self._condition.wait_for(lambda: self.active < self.limit, self.timeout)
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                self.counters['timed_out'] += 1
+                return False
+            self.active += 1
+            self.counters['admitted'] += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def count_stale(self):
+        with self._condition:
+            self.counters['stale'] += 1
+
+    def metrics(self):
+        """
+        Current slots and queue depth, and counts of the requests admitted, rejected
+        (queue full), timed out in the queue, and not admitted but served a stale page
+        """
+        with self._condition:
+            return {
+                'limit': self.limit,
+                'queue': self.queue,
+                'active': self.active,
+                'waiting': self.waiting,
+                'max_waiting': self.max_waiting,
+                **self.counters,
+            }
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+def get_controller(route):
+    """Controller of a route (None if the route is not limited)"""
+    limits = get_route_limits().get(route)
+    if limits is None:
+        return None
+    with _controllers_lock:
+        if route not in _controllers:
+            _controllers[route] = AdmissionController(**limits)
+        return _controllers[route]
+
+def get_metrics():
+    """Metrics of every limited route"""
+    return {route: get_controller(route).metrics() for route in get_route_limits()}
+
+class StalePages:
+    """Last page served per (route, URL, user), kept to answer requests that were not admitted"""
+
+    def __init__(self):
+        self._pages = OrderedDict()  # key -> (content, headers, time)
+        self._lock = threading.Lock()
+
+    def put(self, key, response):
+        max_entries = get_stale_entries()
+        if not max_entries:
+            return
+        with self._lock:
+            headers = {name: response[name] for name in STALE_HEADERS if response.has_header(name)}
+            self._pages[key] = (response.content, headers, time.time())
+            self._pages.move_to_end(key)
+            while len(self._pages) > max_entries:
+                self._pages.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            return self._pages.get(key)
+
+stale_pages = StalePages()
+
+class ReleasingIterator:
+    """
+    Streaming body releasing an admission slot once it is consumed, fails or is closed
+    (the server closes the response even when the client goes away mid-download)
+    """
+
+    def __init__(self, chunks, controller):
+        self._chunks = iter(chunks)
+        self._controller = controller
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._controller.release()
+
+class AdmissionMiddleware:
+    """
+    Limit the concurrent requests of the expensive routes (DATAPLAY_ADMISSION_LIMITS),
+    per server process
+    Anonymous requests are not limited: the dashboards only redirect them to the login page
+    A request that cannot be admitted gets the last page served for the same URL and user
+    if there is one, a 503 with Retry-After otherwise
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            route = resolve(request.path_info).url_name
+        except Resolver404:
+            return self.get_response(request)
+        controller = get_controller(route)
+        if controller is None or not request.user.is_authenticated:
+            return self.get_response(request)
+
+        key = (route, request.get_full_path(), request.user.pk)
+        if not controller.acquire():
+            return self._not_admitted(controller, key)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            controller.release()
+            raise
+
+        if response.streaming:
+            # The body is produced while it is sent: the slot is held until then
+            response.streaming_content = ReleasingIterator(response.streaming_content, controller)
+        else:
+            controller.release()
+            if request.method == "GET" and response.status_code == 200:
+                stale_pages.put(key, response)
+        response[ADMISSION_HEADER] = "admitted"
+        return response
+
+    def _not_admitted(self, controller, key):
+        page = stale_pages.get(key)
+        if page is not None:
+            controller.count_stale()
+            content, headers, served_at = page
+            response = HttpResponse(content)
+            for name, value in headers.items():
+                response[name] = value
+            response["Age"] = str(int(time.time() - served_at))
+            response[ADMISSION_HEADER] = "stale"
+            return response
+
+        response = HttpResponse(
+            "Le serveur est très sollicité, réessayez dans quelques secondes.",
+            status=503,
+            content_type="text/plain; charset=utf-8",
+        )
+        response["Retry-After"] = str(get_retry_after())
+        response[ADMISSION_HEADER] = "rejected"
+        return response
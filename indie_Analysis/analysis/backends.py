@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+UserModel = get_user_model()
+
+def user_cache_key(user_id):
+    return f"auth_user:{user_id}"
+
+class EmailBackend(ModelBackend):
+    """
+    Log users in with their email (indexed lookup, see migration 0002)
+    Users are cached between requests so authenticated pages don't hit the database
+    """
+
+    def authenticate(self, request, username=None, password=None, email=None, **kwargs):
+        # Admin login uses the username
+        if email is None:
+            return super().authenticate(request, username=username, password=password, **kwargs)
+        if password is None:
+            return None
+
+        user = UserModel._default_manager.filter(email=email).order_by("pk").first()
+        if user is None:
+            # Hash anyway so unknown emails take as long as wrong passwords
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, getattr(settings, "DATAPLAY_USER_CACHE_SECONDS", 300))
+        return user
+
+@receiver(post_save, sender=UserModel)
+@receiver(post_delete, sender=UserModel)
+def invalidate_cached_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
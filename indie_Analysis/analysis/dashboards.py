@@ -0,0 +1,211 @@
+# Dashboard views (Q1-Q3, explorer, exports, JSON endpoints)
+# Imported on the first request of one of their routes, see views.lazy_view
+import functools
+from django.shortcuts import render
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.contrib.auth.decorators import login_required
+from statistical_analysis.q2_analysis import create_price_pie_chart,create_price_buckets,get_statistics,get_filter_options
+from statistical_analysis.q1_analysis import (
+    create_genre_popularity_weighted, 
+    create_genre_count_chart, 
+    create_top_tags_chart, 
+    create_genre_tag_heatmap,
+    get_q1_statistics
+)
+from statistical_analysis.q3_analysis import (
+    create_language_engagement_chart,
+    create_language_pie_chart,
+    create_cumulative_engagement_chart,
+    create_language_game_count_chart,
+    get_q3_statistics
+)
+from statistical_analysis.search import search_games
+from statistical_analysis.export import AGGREGATES, filter_games, iter_csv, iter_parquet, parquet_available
+from statistical_analysis.cooccurrence import get_cooccurrence
+from statistical_analysis.cube import DIMENSIONS, get_cube
+from statistical_analysis.explorer import SORT_KEYS, get_game_explorer
+from statistical_analysis.pipeline import compute
+from statistical_analysis.datasets import get_snapshots, use_snapshot
+
+
+def with_snapshot(view):
+    """Run a view on the dataset snapshot given by ?snapshot= (the default snapshot otherwise)"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        snapshot_id = request.GET.get('snapshot')
+        if snapshot_id and snapshot_id not in get_snapshots():
+            raise Http404("Unknown dataset snapshot")
+        with use_snapshot(snapshot_id):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+@login_required(login_url="/login-required/")
+@with_snapshot
+def q1(request):
+    """Q1 - Genres and Tags Analysis"""
+    context = {
+        'chart1': create_genre_popularity_weighted(),
+        'chart2': create_genre_count_chart(),
+        'chart3': create_top_tags_chart(),
+        'chart4': create_genre_tag_heatmap(),
+        'stats': get_q1_statistics()
+    }
+    return render(request, 'q1.html', context)
+
+@login_required(login_url="/login-required/")
+@with_snapshot
+def q2(request):
+    """Q2 - Price Analysis"""
+    genres = request.GET.getlist('genre')
+    languages = request.GET.getlist('language')
+    context = {
+        'chart1': create_price_pie_chart(),
+        'chart2': create_price_buckets(),
+        'stats': get_statistics(genres or None, languages or None),
+        'filters': get_filter_options(),
+        'selected_genres': genres,
+        'selected_languages': languages
+    }
+    return render(request, 'q2.html', context)
+
+@login_required(login_url="/login-required/")
+@with_snapshot
+def q3(request):
+    """Q3 - Language Engagement Analysis"""
+    context = {
+        'chart1': create_language_engagement_chart(),
+        'chart2': create_language_pie_chart(),
+        'chart3': create_cumulative_engagement_chart(),
+        'chart4': create_language_game_count_chart(),
+        'stats': get_q3_statistics()
+    }
+    return render(request, 'q3.html', context)
+
+@login_required(login_url="/login-required/")
+@with_snapshot
+def search(request):
+    """Game name search / autocomplete (JSON)"""
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    return JsonResponse({'query': query, 'results': search_games(query, limit)})
+
+@login_required(login_url="/login-required/")
+@with_snapshot
+def cooccurrence(request):
+    """
+    Top co-occurring pairs (JSON)
+    ?kind=tags|genre_tags, ?by=games|reviews, ?member= keeps the pairs of one tag or genre
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 200)
+    except ValueError:
+        limit = 20
+    kind = request.GET.get('kind', 'tags')
+    by = request.GET.get('by', 'games')
+    try:
+        pairs = get_cooccurrence().top_pairs(kind, by, limit, request.GET.get('member'))
+    except KeyError as error:
+        return JsonResponse({'error': error.args[0]}, status=400)
+    return JsonResponse({'kind': kind, 'by': by, 'pairs': pairs})
+
+@login_required(login_url="/login-required/")
+@with_snapshot
+def cube(request):
+    """
+    Genre x language x price bucket cube (JSON)
+    ?genre=&language=&price_bucket= select the cell (repeatable, absent = ALL),
+    ?drill= lists the cells for every value of one dimension
+    """
+    olap_cube = get_cube()
+    fixed = {dimension: request.GET.getlist(dimension) or None for dimension in DIMENSIONS}
+    drill = request.GET.get('drill')
+    try:
+        data = {'cell': olap_cube.cell(**fixed)}
+        if drill:
+            data['drill_down'] = olap_cube.drill_down(drill, **fixed)
+    except KeyError as error:
+        return JsonResponse({'error': error.args[0]}, status=400)
+    return JsonResponse({'filters': fixed, **data})
+
+@login_required(login_url="/login-required/")
+@with_snapshot
+def explorer(request):
+    """Game explorer: sorted and filtered game list, paginated with keyset cursors"""
+    game_explorer = get_game_explorer()
+    sort = request.GET.get('sort', 'total_reviews')
+    if sort not in SORT_KEYS:
+        sort = 'total_reviews'
+    descending = request.GET.get('order', 'desc') != 'asc'
+    filters = {name: request.GET.getlist(name) for name in ('genre', 'tag', 'language')}
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 200)
+    except ValueError:
+        limit = 50
+    try:
+        games, next_cursor = game_explorer.page(sort, descending, request.GET.get('cursor'), limit, **filters)
+    except ValueError:
+        raise Http404("Invalid cursor")
+
+    # Next page keeps every parameter but the cursor
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    if next_cursor:
+        params['cursor'] = next_cursor
+    context = {
+        'games': games,
+        'next_query': params.urlencode() if next_cursor else None,
+        'options': game_explorer.options(),
+        'sort': sort,
+        'order': 'desc' if descending else 'asc',
+        'selected': filters,
+        'sort_choices': [
+            ('total_reviews', 'Nombre de reviews'),
+            ('price_eur', 'Prix'),
+            ('metacritic_score', 'Score Metacritic'),
+        ],
+    }
+    return render(request, 'explorer.html', context)
+
+def _float_param(request, name):
+    try:
+        return float(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+
+@login_required(login_url="/login-required/")
+@with_snapshot
+def export(request, name):
+    """
+    Download an aggregate behind the charts, or the (filtered) game list, as CSV or Parquet
+    The file is streamed chunk by chunk
+    """
+    if name == 'games':
+        frame = compute('game_list')
+        positions = filter_games(
+            genres=request.GET.getlist('genre'),
+            languages=request.GET.getlist('language'),
+            min_price=_float_param(request, 'min_price'),
+            max_price=_float_param(request, 'max_price'),
+            segment=request.GET.get('segment'),
+        )
+    elif name in AGGREGATES:
+        frame, positions = AGGREGATES[name](), None
+    else:
+        raise Http404("Unknown export")
+
+    file_format = request.GET.get('format', 'csv')
+    if file_format == 'parquet':
+        if not parquet_available():
+            return HttpResponse("Export Parquet indisponible (pyarrow n'est pas installé)", status=501)
+        chunks, content_type = iter_parquet(frame, positions), 'application/vnd.apache.parquet'
+    elif file_format == 'csv':
+        chunks, content_type = iter_csv(frame, positions), 'text/csv; charset=utf-8'
+    else:
+        return HttpResponse("Format inconnu", status=400)
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{name}.{file_format}"'
+    return response
@@ -0,0 +1,93 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.utils import timezone
+from .models import OutboundEmail
+
+def enqueue_email(subject, body, recipients, from_email=None):
+    """Queue a mail for the send_queued_mail worker (one row per recipient)"""
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(subject=subject, body=body, from_email=from_email, to=recipient)
+        for recipient in recipients
+    ])
+
+def retry_delay(attempts):
+    """Exponential backoff: DATAPLAY_MAIL_RETRY_SECONDS, then twice as long each attempt"""
+    base = getattr(settings, "DATAPLAY_MAIL_RETRY_SECONDS", 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 24 * 3600))
+
+def claim_batch(batch_size):
+    """
+    Mark a batch of due mails as being sent and return them
+    Mails claimed by a worker that died are claimed again after DATAPLAY_MAIL_CLAIM_SECONDS
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, "DATAPLAY_MAIL_CLAIM_SECONDS", 600))
+    claimable = (
+        Q(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+        | Q(status=OutboundEmail.SENDING, claimed_at__lt=stale)
+    )
+    ids = list(
+        OutboundEmail.objects.filter(claimable)
+        .order_by("next_attempt_at")
+        .values_list("pk", flat=True)[:batch_size]
+    )
+
+    # The condition is checked again by the update, so concurrent workers never share a mail
+    OutboundEmail.objects.filter(claimable, pk__in=ids).update(status=OutboundEmail.SENDING, claimed_at=now)
+    return list(OutboundEmail.objects.filter(pk__in=ids, status=OutboundEmail.SENDING, claimed_at=now))
+
+def _failed(mail, error, max_attempts):
+    mail.attempts += 1
+    mail.last_error = str(error)
+    if mail.attempts >= max_attempts:
+        mail.status = OutboundEmail.FAILED
+    else:
+        mail.status = OutboundEmail.PENDING
+        mail.next_attempt_at = timezone.now() + retry_delay(mail.attempts)
+
+def send_queued_mail(batch_size=None, max_attempts=None, connection=None):
+    """
+    Send one batch of queued mail over a single connection
+    Failed mails are retried with backoff, up to max_attempts
+    Returns (sent, failed)
+    """
+    batch_size = batch_size or getattr(settings, "DATAPLAY_MAIL_BATCH_SIZE", 100)
+    max_attempts = max_attempts or getattr(settings, "DATAPLAY_MAIL_MAX_ATTEMPTS", 5)
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    connection = connection or get_connection(fail_silently=False)
+    sent = failed = 0
+    try:
+        connection.open()
+    except Exception as e:
+        # Server unreachable: the whole batch is retried later
+        for mail in batch:
+            _failed(mail, e, max_attempts)
+        failed = len(batch)
+    else:
+        try:
+            for mail in batch:
+                message = EmailMessage(mail.subject, mail.body, mail.from_email, [mail.to], connection=connection)
+                try:
+                    connection.send_messages([message])
+                except Exception as e:
+                    _failed(mail, e, max_attempts)
+                    failed += 1
+                else:
+                    mail.status = OutboundEmail.SENT
+                    mail.attempts += 1
+                    mail.sent_at = timezone.now()
+                    mail.last_error = ""
+                    sent += 1
+        finally:
+            connection.close()
+
+    OutboundEmail.objects.bulk_update(
+        batch, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"]
+    )
+    return sent, failed
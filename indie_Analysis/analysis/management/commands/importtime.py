@@ -0,0 +1,70 @@
+import os
+import re
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# One line of `python -X importtime`: self and cumulative time (us), indented module name
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+# Packages worth keeping out of the worker boot
+HEAVY_PACKAGES = ("pandas", "numpy", "plotly")
+
+
+def parse_importtime(output):
+    """Return (module, self us, cumulative us, depth) for every line of -X importtime output"""
+    imports = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return imports
+
+
+class Command(BaseCommand):
+    help = "Report the import time of the project in a fresh interpreter (python -X importtime)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "modules", nargs="*",
+            help="Modules imported after django.setup() (the root URLconf by default)",
+        )
+        parser.add_argument(
+            "--top", type=int, default=20,
+            help="Number of modules listed",
+        )
+        parser.add_argument(
+            "--sort", choices=["cumulative", "self"], default="cumulative",
+            help="Rank the modules by cumulative or self import time",
+        )
+
+    def handle(self, *args, **options):
+        modules = options["modules"] or [settings.ROOT_URLCONF]
+        code = "import django; django.setup()\n" + "".join(f"import {module}\n" for module in modules)
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", settings.SETTINGS_MODULE)}
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "Import failed")
+
+        imports = parse_importtime(result.stderr)
+        top_level = [entry for entry in imports if entry[3] == 0]
+        total = sum(cumulative for _, _, cumulative, _ in top_level)
+        self.stdout.write(f"Imported {len(imports)} modules in {total / 1000:.1f} ms ({', '.join(modules)})")
+
+        column = 1 if options["sort"] == "self" else 2
+        ranked = sorted(top_level if column == 2 else imports, key=lambda entry: -entry[column])
+        self.stdout.write(f"{'self ms':>9} {'cumul. ms':>10}  module")
+        for module, self_us, cumulative_us, _ in ranked[:options["top"]]:
+            self.stdout.write(f"{self_us / 1000:>9.1f} {cumulative_us / 1000:>10.1f}  {module}")
+
+        imported = {module for module, _, _, _ in imports}
+        heavy = [package for package in HEAVY_PACKAGES if package in imported]
+        if heavy:
+            self.stdout.write(self.style.WARNING(f"Heavy packages imported: {', '.join(heavy)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No heavy package imported"))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from statistical_analysis.datasets import get_snapshots, use_snapshot
+from statistical_analysis.ingest import CSV_SOURCES, clean_paths, get_clean_dir, sanitize_sources, source_path
+
+
+class Command(BaseCommand):
+    help = "Sanitize the dataset CSV files and report the records quarantined per file"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "sources", nargs="*",
+            help=f"Sources to sanitize: {', '.join(CSV_SOURCES)} (all by default)",
+        )
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Rebuild the sanitized files even if they are up to date",
+        )
+        parser.add_argument(
+            "--snapshot", default=None,
+            help="Dataset snapshot to sanitize (the default snapshot otherwise)",
+        )
+
+    def handle(self, *args, **options):
+        if get_clean_dir() is None:
+            raise CommandError("DATAPLAY_CLEAN_DIR is not set")
+
+        if options["snapshot"] and options["snapshot"] not in get_snapshots():
+            raise CommandError(f"Unknown dataset snapshot: {options['snapshot']}")
+
+        unknown = [name for name in options["sources"] if name not in CSV_SOURCES]
+        if unknown:
+            raise CommandError(f"Unknown CSV source: {', '.join(unknown)} (choose from {', '.join(CSV_SOURCES)})")
+
+        with use_snapshot(options["snapshot"]):
+            self.report(options["sources"] or list(CSV_SOURCES), options["force"])
+
+    def report(self, names, force):
+        results = sanitize_sources(names, force=force)
+
+        for name in names:
+            stats = results[name]
+            read = stats["rows_read"]
+            skipped = stats["rows_quarantined"]
+            percent = skipped / read * 100 if read else 0
+            self.stdout.write(
+                f"{source_path(name)}: {read:,} records, "
+                f"{skipped:,} quarantined ({percent:.2f}%), "
+                f"{stats['rows_padded']:,} padded, "
+                f"{stats['nulls_normalized']:,} nulls normalized"
+            )
+            if skipped:
+                self.stdout.write(f"  rejected records: {clean_paths(name)[1]}")
@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from analysis.mail import send_queued_mail
+
+
+class Command(BaseCommand):
+    help = "Send the queued outbound mail in batches over one SMTP connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Send the mail that is due and exit instead of polling",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="Mails sent per connection (DATAPLAY_MAIL_BATCH_SIZE by default)",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=5,
+            help="Seconds between two polls of the queue",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_mail(batch_size=options["batch_size"])
+            if sent or failed:
+                self.stdout.write(f"{sent} sent, {failed} failed")
+                # Keep going while the queue has mail due
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    # auth_user belongs to django.contrib.auth, so the index is added with SQL
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE INDEX IF NOT EXISTS auth_user_email_idx ON auth_user (email);",
+            reverse_sql="DROP INDEX IF EXISTS auth_user_email_idx;",
+        ),
+    ]
@@ -1,14 +1,75 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
 class ContactMessage(models.Model):
     nom = models.CharField(max_length=100, blank=True)
-    email = models.EmailField()
+    email = models.EmailField(db_index=True)
     message = models.TextField()
-    date_envoi = models.DateTimeField(auto_now_add=True)
+    date_envoi = models.DateTimeField(auto_now_add=True, db_index=True)
 
     # Nouveaux champs
     response = models.TextField(blank=True, null=True)
     responded = models.BooleanField(default=False)
 
+    class Meta:
+        # Boîte de réception : filtre sur "responded", tri par date
+        indexes = [models.Index(fields=["responded", "-date_envoi"])]
+
     def __str__(self):
         return f"{self.email} - {self.date_envoi.strftime('%Y-%m-%d %H:%M')}"
+
+class OutboundEmail(models.Model):
+    """Mail waiting to be sent by the send_queued_mail worker"""
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "En attente"),
+        (SENDING, "En cours d'envoi"),
+        (SENT, "Envoyé"),
+        (FAILED, "Échec"),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.to} - {self.subject} ({self.status})"
+
+class ProfileArtifact(models.Model):
+    """Profile of one dashboard request (see analysis.profiling.ProfilingMiddleware)"""
+    MODE_CHOICES = [
+        ("sample", "Échantillonnage"),
+        ("cprofile", "cProfile"),
+    ]
+
+    path = models.CharField(max_length=255)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    samples = models.PositiveIntegerField(default=0)
+    summary = models.TextField()
+    # Collapsed stacks ("outer;inner count"), for flamegraph.pl or speedscope
+    collapsed = models.TextField(blank=True)
+    # cProfile stats (marshal), readable with pstats.Stats
+    pstats = models.BinaryField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.path} - {self.created_at.strftime('%Y-%m-%d %H:%M')} ({self.duration_ms:.0f} ms)"
 # Create your models here.
@@ -0,0 +1,138 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from .models import ProfileArtifact
+
+# Query parameter / header asking for a profile (value: "sample" or "cprofile")
+PROFILE_PARAM = "profile"
+PROFILE_HEADER = "X-DataPlay-Profile"
+
+def get_profiled_paths():
+    return getattr(settings, "DATAPLAY_PROFILE_PATHS", ["/q1/", "/q2/", "/q3/"])
+
+def get_sample_interval():
+    return getattr(settings, "DATAPLAY_PROFILE_INTERVAL", 0.005)
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class Sampler:
+    """
+    Sampling profiler: a thread records the stack of another thread at a fixed interval
+    Stacks are kept in collapsed form ("outer;inner count"), ready for flamegraph.pl or speedscope
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def summary(self, limit=40):
+        """Functions with the most samples (inclusive and on top of the stack)"""
+        inclusive, own = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+
+        total = self.samples or 1
+        lines = [f"{self.samples} samples every {self.interval * 1000:g} ms", "", "   total    self  function"]
+        for frame, count in inclusive.most_common(limit):
+            lines.append(f"{count / total:7.1%} {own[frame] / total:7.1%}  {frame}")
+        return "\n".join(lines)
+
+def _profile_mode(request):
+    """Profiler asked for by the request (None = not profiled)"""
+    mode = request.GET.get(PROFILE_PARAM) or request.headers.get(PROFILE_HEADER)
+    if not mode:
+        return None
+    return "cprofile" if mode == "cprofile" else "sample"
+
+class ProfilingMiddleware:
+    """
+    Profile a dashboard request on demand (staff only)
+    ?profile=sample (or the X-DataPlay-Profile header) runs it under the sampling profiler,
+    ?profile=cprofile under cProfile; the result is saved as a ProfileArtifact
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = _profile_mode(request)
+        if (
+            mode is None
+            or request.path not in get_profiled_paths()
+            or not request.user.is_staff
+        ):
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+            duration = time.perf_counter() - start
+
+            # Dump first: pstats.Stats takes the stats away from the profiler
+            profiler.create_stats()
+            dump = marshal.dumps(profiler.stats)
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(40)
+            artifact = ProfileArtifact(summary=output.getvalue(), pstats=dump)
+        else:
+            sampler = Sampler(threading.get_ident(), get_sample_interval())
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                sampler.stop()
+            duration = time.perf_counter() - start
+            artifact = ProfileArtifact(
+                summary=sampler.summary(),
+                collapsed=sampler.collapsed(),
+                samples=sampler.samples,
+            )
+
+        artifact.path = request.get_full_path()[:255]
+        artifact.user = request.user
+        artifact.mode = mode
+        artifact.status_code = response.status_code
+        artifact.duration_ms = duration * 1000
+        artifact.save()
+
+        response[PROFILE_HEADER + "-Id"] = str(artifact.pk)
+        return response
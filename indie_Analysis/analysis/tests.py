@@ -1,3 +1,569 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import marshal
+import os
+import threading
+import time
+from datetime import timedelta
+from smtplib import SMTPRecipientsRefused
+from unittest import mock
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.http import HttpResponse
+from django.urls import reverse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import urlencode
+from statistical_analysis import q1_analysis
+from statistical_analysis.datasets import Snapshot, get_snapshots
+from statistical_analysis.export import iter_csv, parquet_available
+from statistical_analysis.object_cache import ObjectCache
+from util.chart_config import encode_array, encode_arrays, render_chart
+from . import admission
+from .admission import AdmissionController, AdmissionMiddleware
+from .backends import EmailBackend, user_cache_key
+from .mail import claim_batch, enqueue_email, retry_delay, send_queued_mail
+from .models import ContactMessage, OutboundEmail, ProfileArtifact
+from .profiling import ProfilingMiddleware
+
+
+class RecordingBackend(LocmemEmailBackend):
+    """locmem backend counting its connections, refusing the addresses in refused"""
+
+    def __init__(self, refused=(), unreachable=False, **kwargs):
+        super().__init__(**kwargs)
+        self.refused = set(refused)
+        self.unreachable = unreachable
+        self.opened = 0
+        self.closed = 0
+
+    def open(self):
+        if self.unreachable:
+            raise ConnectionRefusedError("Connection refused")
+        self.opened += 1
+
+    def close(self):
+        self.closed += 1
+
+    def send_messages(self, messages):
+        for message in messages:
+            refused = self.refused.intersection(message.to)
+            if refused:
+                raise SMTPRecipientsRefused({address: (550, b"Mailbox unavailable") for address in refused})
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    DATAPLAY_MAIL_RETRY_SECONDS=60,
+    DATAPLAY_MAIL_CLAIM_SECONDS=600,
+)
+class SendQueuedMailTests(TestCase):
+
+    def make_due(self, **filters):
+        OutboundEmail.objects.filter(**filters).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+    def test_batch_sent_over_one_connection(self):
+        enqueue_email("Sujet", "Message", ["a@example.com", "b@example.com", "c@example.com"])
+        connection = RecordingBackend()
+
+        self.assertEqual(send_queued_mail(connection=connection), (3, 0))
+        self.assertEqual((connection.opened, connection.closed), (1, 1))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ["a@example.com", "b@example.com", "c@example.com"])
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.SENT, attempts=1).count(), 3)
+        self.assertEqual(send_queued_mail(connection=connection), (0, 0))
+
+    def test_default_connection(self):
+        enqueue_email("Sujet", "Message", ["a@example.com"])
+        self.assertEqual(send_queued_mail(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_batch_size(self):
+        enqueue_email("Sujet", "Message", [f"user{i}@example.com" for i in range(5)])
+        self.assertEqual(send_queued_mail(batch_size=2, connection=RecordingBackend()), (2, 0))
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.PENDING).count(), 3)
+
+    def test_retry_delay(self):
+        self.assertEqual([retry_delay(attempts).total_seconds() for attempts in (1, 2, 3)], [60, 120, 240])
+        self.assertEqual(retry_delay(30), timedelta(hours=24))
+
+    def test_failed_mail_retried_with_backoff(self):
+        enqueue_email("Sujet", "Message", ["ok@example.com", "refused@example.com"])
+        connection = RecordingBackend(refused=["refused@example.com"])
+
+        before = timezone.now()
+        self.assertEqual(send_queued_mail(connection=connection), (1, 1))
+        retried = OutboundEmail.objects.get(to="refused@example.com")
+        self.assertEqual((retried.status, retried.attempts), (OutboundEmail.PENDING, 1))
+        self.assertIn("Mailbox unavailable", retried.last_error)
+        self.assertGreaterEqual(retried.next_attempt_at, before + timedelta(seconds=60))
+
+        # Not due yet
+        self.assertEqual(send_queued_mail(connection=connection), (0, 0))
+
+        self.make_due(to="refused@example.com")
+        before = timezone.now()
+        self.assertEqual(send_queued_mail(connection=connection), (0, 1))
+        retried.refresh_from_db()
+        self.assertEqual(retried.attempts, 2)
+        self.assertGreaterEqual(retried.next_attempt_at, before + timedelta(seconds=120))
+
+        self.make_due(to="refused@example.com")
+        connection.refused.clear()
+        self.assertEqual(send_queued_mail(connection=connection), (1, 0))
+        retried.refresh_from_db()
+        self.assertEqual((retried.status, retried.attempts, retried.last_error), (OutboundEmail.SENT, 3, ""))
+
+    def test_failed_after_max_attempts(self):
+        enqueue_email("Sujet", "Message", ["refused@example.com"])
+        connection = RecordingBackend(refused=["refused@example.com"])
+
+        for _ in range(3):
+            self.assertEqual(send_queued_mail(max_attempts=3, connection=connection), (0, 1))
+            self.make_due()
+        failed = OutboundEmail.objects.get()
+        self.assertEqual((failed.status, failed.attempts), (OutboundEmail.FAILED, 3))
+        self.assertEqual(send_queued_mail(max_attempts=3, connection=connection), (0, 0))
+
+    def test_unreachable_server_retries_the_batch(self):
+        enqueue_email("Sujet", "Message", ["a@example.com", "b@example.com"])
+        self.assertEqual(send_queued_mail(connection=RecordingBackend(unreachable=True)), (0, 2))
+        self.assertEqual(
+            OutboundEmail.objects.filter(status=OutboundEmail.PENDING, attempts=1, last_error="Connection refused").count(), 2
+        )
+
+    def test_claims_are_exclusive(self):
+        enqueue_email("Sujet", "Message", ["a@example.com", "b@example.com"])
+        self.assertEqual(len(claim_batch(10)), 2)
+        self.assertEqual(claim_batch(10), [])
+
+    def test_stale_claim_reclaimed(self):
+        enqueue_email("Sujet", "Message", ["stale@example.com", "fresh@example.com"])
+        now = timezone.now()
+        OutboundEmail.objects.filter(to="stale@example.com").update(
+            status=OutboundEmail.SENDING, claimed_at=now - timedelta(seconds=601)
+        )
+        OutboundEmail.objects.filter(to="fresh@example.com").update(
+            status=OutboundEmail.SENDING, claimed_at=now - timedelta(seconds=10)
+        )
+
+        self.assertEqual(send_queued_mail(connection=RecordingBackend()), (1, 0))
+        self.assertEqual([message.to for message in mail.outbox], [["stale@example.com"]])
+        self.assertEqual(OutboundEmail.objects.get(to="fresh@example.com").status, OutboundEmail.SENDING)
+
+
+class BulkReplyTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "motdepasse"))
+        ContactMessage.objects.bulk_create(
+            ContactMessage(email=f"user{i}@example.com", message="Bonjour", responded=i % 4 == 0)
+            for i in range(1200)
+        )
+        self.url = reverse("admin:analysis_contactmessage_changelist")
+
+    def test_select_across_sends_the_filters_not_the_keys(self):
+        # The changelist posts the checked rows of its page along with select_across
+        page_pks = list(ContactMessage.objects.values_list("pk", flat=True)[:100])
+        data = {'action': "bulk_reply", 'select_across': "1", 'index': "0", '_selected_action': page_pks}
+        page = self.client.post(self.url + "?responded__exact=0", data)
+        self.assertContains(page, "900 message(s) sans réponse parmi les 900 sélectionné(s)")
+        self.assertContains(page, 'name="select_across" value="1"')
+        self.assertContains(page, 'name="_selected_action"', count=100)
+
+        data.pop('index')
+        self.client.post(self.url + "?responded__exact=0", {**data, 'apply': "1", 'response': "Merci"})
+        self.assertEqual(ContactMessage.objects.filter(response="Merci").count(), 900)
+        self.assertEqual(OutboundEmail.objects.count(), 900)
+
+    def test_selected_keys(self):
+        pks = list(ContactMessage.objects.filter(responded=False).values_list("pk", flat=True)[:3])
+        data = {'action': "bulk_reply", 'select_across': "0", 'index': "0", '_selected_action': pks}
+        page = self.client.post(self.url, data)
+        self.assertContains(page, "3 message(s) sans réponse parmi les 3 sélectionné(s)")
+        self.assertContains(page, 'name="_selected_action"', count=3)
+
+        data.pop('index')
+        self.client.post(self.url, {**data, 'apply': "1", 'response': "Merci"})
+        self.assertEqual(sorted(ContactMessage.objects.filter(response="Merci").values_list("pk", flat=True)), sorted(pks))
+
+
+class EmailLoginTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("joueur", "joueur@example.com", "motdepasse")
+        self.url = reverse("connecter")
+
+    def login(self, password="motdepasse", next_url=None):
+        url = self.url if next_url is None else f"{self.url}?{urlencode({'next': next_url})}"
+        return self.client.post(url, {'email': "joueur@example.com", 'password': password})
+
+    def test_login_by_email(self):
+        self.assertRedirects(self.login(), reverse("home"), fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.pk)
+
+    def test_wrong_password_or_unknown_email(self):
+        self.assertContains(self.login("autre"), "Email ou mot de passe incorrect")
+        response = self.client.post(self.url, {'email': "inconnu@example.com", 'password': "motdepasse"})
+        self.assertContains(response, "Email ou mot de passe incorrect")
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_admin_login_by_username(self):
+        self.assertEqual(EmailBackend().authenticate(None, username="joueur", password="motdepasse"), self.user)
+
+    def test_next_on_this_site(self):
+        self.assertRedirects(self.login(next_url="/q2/?genre=RPG"), "/q2/?genre=RPG", fetch_redirect_response=False)
+
+    def test_off_site_next_rejected(self):
+        for next_url in ("https://evil.example/", "//evil.example/q1/", "javascript:alert(1)"):
+            with self.subTest(next_url=next_url):
+                self.assertRedirects(self.login(next_url=next_url), reverse("home"), fetch_redirect_response=False)
+
+    def test_user_cached_between_requests(self):
+        backend = EmailBackend()
+        self.assertEqual(backend.get_user(self.user.pk), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.get_user(self.user.pk).email, "joueur@example.com")
+
+    def test_cache_invalidated_on_save_and_delete(self):
+        backend = EmailBackend()
+        backend.get_user(self.user.pk)
+
+        self.user.email = "nouveau@example.com"
+        self.user.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(backend.get_user(self.user.pk).email, "nouveau@example.com")
+
+        pk = self.user.pk
+        self.user.delete()
+        self.assertIsNone(backend.get_user(pk))
+
+
+def slow_view(request):
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+    return HttpResponse("ok")
+
+
+@override_settings(DATAPLAY_PROFILE_PATHS=["/slow/"], DATAPLAY_PROFILE_INTERVAL=0.001)
+class ProfilingMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.middleware = ProfilingMiddleware(slow_view)
+        self.staff = User.objects.create_user("equipe", "equipe@example.com", "motdepasse", is_staff=True)
+
+    def get(self, path, user=None, **extra):
+        request = RequestFactory().get(path, **extra)
+        request.user = user or self.staff
+        return self.middleware(request)
+
+    def test_sampled_profile_saved(self):
+        response = self.get("/slow/?profile=sample")
+        artifact = ProfileArtifact.objects.get()
+        self.assertEqual(response["X-DataPlay-Profile-Id"], str(artifact.pk))
+        self.assertEqual((artifact.path, artifact.mode, artifact.status_code, artifact.user), ("/slow/?profile=sample", "sample", 200, self.staff))
+        self.assertGreater(artifact.samples, 0)
+        self.assertGreaterEqual(artifact.duration_ms, 50)
+        self.assertIn("slow_view", artifact.collapsed)
+        self.assertIn("slow_view", artifact.summary)
+
+    def test_cprofile_saved(self):
+        self.get("/slow/", HTTP_X_DATAPLAY_PROFILE="cprofile")
+        artifact = ProfileArtifact.objects.get()
+        self.assertEqual(artifact.mode, "cprofile")
+        self.assertIn("slow_view", artifact.summary)
+        stats = marshal.loads(bytes(artifact.pstats))
+        self.assertTrue(any(function == "slow_view" for _, _, function in stats))
+
+    def test_through_the_middleware_stack(self):
+        self.client.force_login(self.staff)
+        with override_settings(DATAPLAY_PROFILE_PATHS=[reverse("connecter")]):
+            response = self.client.get(reverse("connecter"), {'profile': "sample"})
+        self.assertEqual(response["X-DataPlay-Profile-Id"], str(ProfileArtifact.objects.get().pk))
+
+    def test_not_profiled(self):
+        member = User.objects.create_user("membre", "membre@example.com", "motdepasse")
+        self.assertEqual(self.get("/slow/").content, b"ok")
+        self.get("/slow/?profile=sample", user=member)
+        self.get("/slow/?profile=sample", user=AnonymousUser())
+        self.get("/other/?profile=sample")
+        self.assertFalse(ProfileArtifact.objects.exists())
+
+
+@override_settings(DATAPLAY_ADMISSION_LIMITS={'export': {'limit': 1, 'queue': 0, 'timeout': 0}})
+class ExportTests(TestCase):
+
+    def setUp(self):
+        admission._controllers.clear()
+        self.client.force_login(User.objects.create_user("joueur", "joueur@example.com", "motdepasse"))
+        self.games = pd.DataFrame({
+            'app_id': np.arange(1000),
+            'name': [f'Jeu "{i}", suite' for i in range(1000)],
+            'price_eur': np.arange(1000) / 10,
+        })
+        for target, value in (("compute", mock.Mock(return_value=self.games)),
+                              ("filter_games", mock.Mock(return_value=np.arange(0, 1000, 3)))):
+            patcher = mock.patch(f"analysis.dashboards.{target}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def export(self, **params):
+        return self.client.get(reverse("export", args=["games"]), params)
+
+    def test_csv_header_and_rows(self):
+        response = self.export(genre="RPG")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="games.csv"')
+        frame = pd.read_csv(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(frame.columns.tolist(), ["app_id", "name", "price_eur"])
+        self.assertEqual(len(frame), 334)
+        pd.testing.assert_frame_equal(frame, self.games.iloc[::3].reset_index(drop=True))
+
+    def test_csv_chunks(self):
+        chunks = list(iter_csv(self.games, np.arange(10, 35), chunk_rows=10))
+        self.assertEqual(len(chunks), 4)
+        frame = pd.read_csv(io.StringIO("".join(chunks)))
+        pd.testing.assert_frame_equal(frame, self.games.iloc[10:35].reset_index(drop=True))
+
+    def test_unknown_export_or_format(self):
+        self.assertEqual(self.client.get(reverse("export", args=["inconnu"])).status_code, 404)
+        self.assertEqual(self.export(format="xlsx").status_code, 400)
+        if not parquet_available():
+            self.assertEqual(self.export(format="parquet").status_code, 501)
+
+    def test_slot_held_until_the_body_is_sent(self):
+        controller = admission.get_controller("export")
+        response = self.export()
+        self.assertEqual(controller.metrics()["active"], 1)
+        self.assertEqual(self.export().status_code, 503)
+
+        b"".join(response.streaming_content)
+        self.assertEqual(controller.metrics()["active"], 0)
+        self.assertEqual(self.export()[admission.ADMISSION_HEADER], "admitted")
+
+    def test_slot_released_when_the_download_is_abandoned(self):
+        controller = admission.get_controller("export")
+        response = self.export()
+        next(iter(response.streaming_content))
+        response.close()
+        self.assertEqual(controller.metrics()["active"], 0)
+
+        # Closed before a single chunk was sent
+        self.export().close()
+        self.assertEqual(controller.metrics()["active"], 0)
+
+
+class SnapshotTests(SimpleTestCase):
+
+    def test_relative_paths_from_the_project_directory(self):
+        self.assertEqual(Snapshot("old", "dumps/2023").path, os.path.join(settings.BASE_DIR, "dumps", "2023"))
+        self.assertEqual(Snapshot("abs", "/srv/dumps").file("games.csv"), "/srv/dumps/games.csv")
+
+    @override_settings(DATAPLAY_SNAPSHOTS=None, DATAPLAY_DEFAULT_SNAPSHOT="current")
+    def test_default_snapshot(self):
+        self.assertEqual(get_snapshots()["current"].path, str(settings.BASE_DIR))
+
+
+class ObjectCacheTests(SimpleTestCase):
+
+    def test_cached_arrays_are_read_only(self):
+        cache = ObjectCache(max_bytes=10 ** 6)
+        frame = pd.DataFrame({'app_id': np.arange(10), 'name': ["Jeu"] * 10})
+        cache.set("games", {'games': frame, 'ids': np.arange(5)})
+        cached = cache.get("games")
+        with self.assertRaises(ValueError):
+            cached["ids"][0] = 1
+        with self.assertRaises(ValueError):
+            cached["games"].loc[0, "app_id"] = 1
+
+    def test_budget(self):
+        cache = ObjectCache(max_bytes=3000)
+        for key in ("a", "b", "c"):
+            cache.set(key, np.zeros(100))
+        cache.get("a")
+        cache.set("d", np.zeros(100))
+        self.assertEqual((cache.get("a") is None, cache.get("b") is None), (False, True))
+        self.assertLessEqual(cache.nbytes, 3000)
+
+        with self.assertLogs("statistical_analysis.object_cache", "WARNING"):
+            cache.set("big", np.zeros(1000))
+        self.assertIsNone(cache.get("big"))
+
+
+def decode_typed_array(value):
+    """Array a plotly.js typed-array spec stands for (lists are returned as arrays)"""
+    if not isinstance(value, dict):
+        return np.asarray(value)
+    array = np.frombuffer(base64.b64decode(value["bdata"]), dtype=np.dtype(value["dtype"]).newbyteorder("<"))
+    if "shape" in value:
+        array = array.reshape([int(length) for length in value["shape"].split(",")])
+    return array
+
+
+class ChartEncodingTests(SimpleTestCase):
+
+    def test_smallest_integer_dtype(self):
+        for values, dtype in (([0, 255], 'u1'), ([-1, 100], 'i1'), ([0, 70_000], 'i4'), ([0, 3_000_000_000], 'u4'), ([-1, 2**40], 'f8'), ([0.5], 'f8')):
+            with self.subTest(values=values):
+                self.assertEqual(encode_array(np.array(values))['dtype'], dtype)
+        self.assertEqual(encode_array(np.array([1.5], dtype=np.float32))['dtype'], 'f4')
+
+    def test_other_arrays_sent_as_lists(self):
+        self.assertEqual(encode_array(pd.Series(["RPG", "Action"])), ["RPG", "Action"])
+        self.assertEqual(encode_array(np.array([True, False])), [True, False])
+
+    def test_render_chart_encodes_nested_arrays(self):
+        trace = {'type': "bar", 'x': pd.Index(["a", "b"]), 'y': pd.Series([3, 4]), 'marker': {'color': np.array([0.1, 0.2])}}
+        encoded = encode_arrays(trace)
+        self.assertEqual(encoded['x'], ["a", "b"])
+        np.testing.assert_array_equal(decode_typed_array(encoded['y']), [3, 4])
+        np.testing.assert_array_equal(decode_typed_array(encoded['marker']['color']), [0.1, 0.2])
+
+        html = render_chart([trace], {'title': {'text': "Test"}}, "test-chart")
+        self.assertIn('"bdata"', html)
+        self.assertIn('id="test-chart"', html)
+
+    def test_typed_arrays_round_trip(self):
+        for values in (np.arange(6), np.arange(6).reshape(2, 3) * 1000, np.linspace(0, 1, 12).reshape(3, 4), np.array([-1, 2**40])):
+            decoded = decode_typed_array(encode_array(values))
+            self.assertEqual(decoded.shape, values.shape)
+            np.testing.assert_array_equal(decoded, values)
+        self.assertEqual(encode_array(pd.Series(["a", "b"])), ["a", "b"])
+        self.assertEqual(encode_array(np.array([[True, False]])), [[True, False]])
+
+    def test_genre_tag_heatmap_keeps_its_shape(self):
+        genres, tags = ["Action", "RPG", "Puzzle"], ["Pixel", "Retro", "Horror", "Co-op"]
+        reviews = pd.DataFrame(np.arange(12).reshape(3, 4) * 1000, index=genres, columns=tags)
+        games = pd.DataFrame(np.arange(12).reshape(3, 4), index=genres, columns=tags)
+        cooccurrence = mock.Mock()
+        cooccurrence.frame.side_effect = lambda kind, measure: reviews if measure == "reviews" else games
+        nodes = {'cooccurrence': cooccurrence, 'tag_counts': pd.Series([9, 8, 7, 6], index=tags)}
+
+        with mock.patch.object(q1_analysis, "compute", nodes.__getitem__):
+            html = q1_analysis.create_genre_tag_heatmap()
+        start = html.index('"genre-tag-heatmap",') + len('"genre-tag-heatmap",')
+        trace = json.JSONDecoder().raw_decode(html[start:].lstrip())[0][0]
+
+        # Most engaged genres on top
+        order = ["Action", "RPG", "Puzzle"]
+        self.assertEqual((trace["x"], trace["y"]), (tags, order))
+        np.testing.assert_array_equal(decode_typed_array(trace["z"]), reviews.loc[order].to_numpy())
+        np.testing.assert_array_equal(decode_typed_array(trace["customdata"]), games.loc[order].to_numpy())
+
+
+class AdmissionControllerTests(SimpleTestCase):
+
+    def test_limit_and_queue(self):
+        controller = AdmissionController(limit=2, queue=1, timeout=5)
+        self.assertTrue(controller.acquire())
+        self.assertTrue(controller.acquire())
+
+        # The third request waits for a slot, the fourth finds the queue full
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(controller.acquire()))
+        waiter.start()
+        while controller.metrics()["waiting"] == 0:
+            threading.Event().wait(0.01)
+        self.assertFalse(controller.acquire())
+        controller.release()
+        waiter.join()
+
+        self.assertEqual(results, [True])
+        metrics = controller.metrics()
+        self.assertEqual(
+            {name: metrics[name] for name in ("active", "waiting", "max_waiting", "admitted", "rejected", "timed_out")},
+            {'active': 2, 'waiting': 0, 'max_waiting': 1, 'admitted': 3, 'rejected': 1, 'timed_out': 0},
+        )
+
+    def test_timeout(self):
+        controller = AdmissionController(limit=1, queue=1, timeout=0.05)
+        self.assertTrue(controller.acquire())
+        self.assertFalse(controller.acquire())
+        self.assertEqual(controller.metrics()["timed_out"], 1)
+        controller.release()
+        self.assertTrue(controller.acquire())
+
+
+@override_settings(
+    DATAPLAY_ADMISSION_LIMITS={'explorer': {'limit': 1, 'queue': 0, 'timeout': 1}},
+    DATAPLAY_ADMISSION_RETRY_AFTER=7,
+)
+class AdmissionMiddlewareTests(TestCase):
+
+    def setUp(self):
+        admission._controllers.clear()
+        admission.stale_pages = admission.StalePages()
+        self.user = User.objects.create_user("joueur", password="motdepasse")
+        self.factory = RequestFactory()
+        self.middleware = AdmissionMiddleware(self.view)
+
+    def view(self, request):
+        response = HttpResponse("page", content_type="text/html")
+        response["Vary"] = "Cookie"
+        response["Cache-Control"] = "private, max-age=60"
+        return response
+
+    def request(self, path="/explorer/", user=None):
+        request = self.factory.get(path)
+        request.user = user or self.user
+        return request
+
+    def test_admitted(self):
+        response = self.middleware(self.request())
+        self.assertEqual(response[admission.ADMISSION_HEADER], "admitted")
+        self.assertEqual(admission.get_controller("explorer").metrics()["active"], 0)
+
+    def test_anonymous_requests_not_limited(self):
+        controller = admission.get_controller("explorer")
+        self.assertTrue(controller.acquire())
+        try:
+            response = self.middleware(self.request(user=AnonymousUser()))
+        finally:
+            controller.release()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header(admission.ADMISSION_HEADER))
+        self.assertEqual(controller.metrics()["rejected"], 0)
+
+    def test_routes_without_limit(self):
+        response = self.middleware(self.request("/q1/"))
+        self.assertFalse(response.has_header(admission.ADMISSION_HEADER))
+
+    def test_rejected_then_stale(self):
+        controller = admission.get_controller("explorer")
+        self.middleware(self.request())
+        self.assertTrue(controller.acquire())
+        try:
+            stale = self.middleware(self.request())
+            rejected = self.middleware(self.request("/explorer/?genre=RPG"))
+        finally:
+            controller.release()
+
+        self.assertEqual((stale.status_code, stale.content, stale[admission.ADMISSION_HEADER]), (200, b"page", "stale"))
+        self.assertIn("Age", stale)
+        self.assertEqual(
+            (stale["Content-Type"], stale["Vary"], stale["Cache-Control"]),
+            ("text/html", "Cookie", "private, max-age=60"),
+        )
+        self.assertEqual((rejected.status_code, rejected["Retry-After"]), (503, "7"))
+        self.assertEqual(rejected[admission.ADMISSION_HEADER], "rejected")
+        self.assertEqual(controller.metrics()["stale"], 1)
+
+    def test_stale_pages_kept_per_user(self):
+        controller = admission.get_controller("explorer")
+        self.middleware(self.request())
+        other = User.objects.create_user("autre", password="motdepasse")
+        self.assertTrue(controller.acquire())
+        try:
+            response = self.middleware(self.request(user=other))
+        finally:
+            controller.release()
+        self.assertEqual(response.status_code, 503)
 
-# Create your tests here.
@@ -6,9 +6,15 @@ urlpatterns = [path('', views.home, name = "home"),
                path("login/",views.login, name = "connecter"),
                path("logout/", auth_views.LogoutView.as_view(next_page='home'), name="logout"),
                path("register/", views.register, name="register"),
-               path("q1/",views.q1,name="q1"),
-               path("q2/", views.q2, name = "q2"),
-               path("q3/", views.q3, name = "q3"),
+               path("q1/",views.lazy_view("analysis.dashboards.q1"),name="q1"),
+               path("q2/", views.lazy_view("analysis.dashboards.q2"), name = "q2"),
+               path("q3/", views.lazy_view("analysis.dashboards.q3"), name = "q3"),
+               path("search/", views.lazy_view("analysis.dashboards.search"), name = "search"),
+               path("cooccurrence/", views.lazy_view("analysis.dashboards.cooccurrence"), name = "cooccurrence"),
+               path("cube/", views.lazy_view("analysis.dashboards.cube"), name = "cube"),
+               path("explorer/", views.lazy_view("analysis.dashboards.explorer"), name = "explorer"),
+               path("export/<str:name>/", views.lazy_view("analysis.dashboards.export"), name = "export"),
+               path("admission/metrics/", views.admission_metrics, name = "admission_metrics"),
                path("reset-password/", auth_views.PasswordResetView.as_view(template_name="registration/password_reset_form.html"), name="password_reset"),
                path("reset-password/done/", auth_views.PasswordResetDoneView.as_view(), name="password_reset_done"),
                path("reset-password-confirm/<uidb64>/<token>/", auth_views.PasswordResetConfirmView.as_view(), name="password_reset_confirm"),
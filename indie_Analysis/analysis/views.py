@@ -1,27 +1,33 @@
 from django.shortcuts import render,redirect
-from django.http import HttpResponse
-from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login as auth_login, authenticate
 from django.contrib.auth.models import User
 from django.contrib import messages
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.utils.module_loading import import_string
+from .admission import get_metrics
 from .models import ContactMessage
-from statistical_analysis.q2_analysis import create_price_pie_chart,create_price_buckets,get_statistics
-from statistical_analysis.q1_analysis import (
-    create_genre_popularity_weighted, 
-    create_genre_count_chart, 
-    create_top_tags_chart, 
-    get_q1_statistics
-)
-from statistical_analysis.q3_analysis import (
-    create_language_engagement_chart,
-    create_language_pie_chart,
-    create_cumulative_engagement_chart,
-    create_language_game_count_chart,
-    get_q3_statistics
-)
 
 
+def lazy_view(path):
+    """
+    View imported on its first request
+    Keeps the analytics stack (pandas, NumPy, Plotly) out of the worker boot
+    and of the pages that do not need it
+    """
+    view = None
+
+    def wrapper(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(path)
+        return view(request, *args, **kwargs)
+    wrapper.__name__ = path.rsplit('.', 1)[-1]
+    wrapper.__qualname__ = wrapper.__name__
+    wrapper.__module__ = path.rsplit('.', 1)[0]
+    return wrapper
+
 # Create your views here.
 def home(request):
     return render(request, "index.html")
@@ -35,56 +41,26 @@ def login(request):
         email = request.POST.get("email")
         password = request.POST.get("password")
         
-          # Find user by email
-        # try:
-        user_obj = User.objects.get(email=email)
-        user = authenticate(request, username=user_obj.email, password=password)
+        # Find user by email (indexed, see analysis.backends.EmailBackend)
+        user = authenticate(request, email=email, password=password)
             
         if user is not None:
-                auth_login(request, user)
-                # Redirect to the page they were trying to access, or home
-                next_url = request.GET.get('next', 'home')
-                return redirect(next_url)
+            auth_login(request, user)
+            # Redirect to the page they were trying to access, or home
+            next_url = request.GET.get('next')
+            if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+                next_url = 'home'
+            return redirect(next_url)
         else:
-                messages.error(request, "Email ou mot de passe incorrect")
-        # except User.DoesNotExist:
-        #     messages.error(request, "Email ou mot de passe incorrect")
+            messages.error(request, "Email ou mot de passe incorrect")
     
     return render(request, "connecter.html")
 
-# Protected Analysis Page
-@login_required(login_url="/login-required/")
-def q1(request):
-    """Q1 - Genres and Tags Analysis"""
-    context = {
-        'chart1': create_genre_popularity_weighted(),
-        'chart2': create_genre_count_chart(),
-        'chart3': create_top_tags_chart(),
-        'stats': get_q1_statistics()
-    }
-    return render(request, 'q1.html', context)
-
-@login_required(login_url="/login-required/")
-def q2(request):
-    """Q2 - Price Analysis"""
-    context = {
-        'chart1': create_price_pie_chart(),
-        'chart2': create_price_buckets(),
-        'stats': get_statistics()
-    }
-    return render(request, 'q2.html', context)
-
-@login_required(login_url="/login-required/")
-def q3(request):
-    """Q3 - Language Engagement Analysis"""
-    context = {
-        'chart1': create_language_engagement_chart(),
-        'chart2': create_language_pie_chart(),
-        'chart3': create_cumulative_engagement_chart(),
-        'chart4': create_language_game_count_chart(),
-        'stats': get_q3_statistics()
-    }
-    return render(request, 'q3.html', context)
+def admission_metrics(request):
+    """Queue depth and rejections of the admission-controlled routes (JSON, staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': "Réservé à l'équipe"}, status=403)
+    return JsonResponse({'routes': get_metrics()})
 
 #Registration 
 def register(request):
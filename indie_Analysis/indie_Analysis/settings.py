@@ -47,6 +47,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'analysis.admission.AdmissionMiddleware',
+    'analysis.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -101,6 +103,15 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Users log in with their email (indexed lookup) and are cached between requests
+# (other worker processes see changes to a user after at most DATAPLAY_USER_CACHE_SECONDS)
+AUTHENTICATION_BACKENDS = ['analysis.backends.EmailBackend']
+DATAPLAY_USER_CACHE_SECONDS = 300
+
+# Sessions are read from the cache and fall back to the database on a miss
+# Use 'django.contrib.sessions.backends.signed_cookies' to keep them in the cookie instead
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -126,4 +137,77 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+DEFAULT_FROM_EMAIL = "votre.email@example.com"  # à remplacer
+
+# Outbound mail queue (sent by manage.py send_queued_mail): mails per connection,
+# attempts before giving up, first retry delay (doubled each attempt) and
+# seconds after which a mail claimed by a dead worker is sent again
+DATAPLAY_MAIL_BATCH_SIZE = 100
+DATAPLAY_MAIL_MAX_ATTEMPTS = 5
+DATAPLAY_MAIL_RETRY_SECONDS = 60
+DATAPLAY_MAIL_CLAIM_SECONDS = 600
+
+
+# On-demand profiling of dashboard requests by staff users (?profile=sample or ?profile=cprofile)
+# and interval between two samples of the sampling profiler, in seconds
+DATAPLAY_PROFILE_PATHS = ["/q1/", "/q2/", "/q3/"]
+DATAPLAY_PROFILE_INTERVAL = 0.005
+
+# Admission control of the expensive routes (by URL name): concurrent requests, requests
+# waiting for a slot and seconds they may wait. Requests over the limit get the last page
+# served for the same URL and user (up to DATAPLAY_ADMISSION_STALE_ENTRIES pages kept),
+# or a 503 asking to retry after DATAPLAY_ADMISSION_RETRY_AFTER seconds.
+# The limits apply per process, not across the gunicorn workers: with N workers a route
+# may run up to N x limit requests at once
+DATAPLAY_ADMISSION_LIMITS = {
+    'q1': {'limit': 2, 'queue': 8, 'timeout': 15},
+    'q2': {'limit': 2, 'queue': 8, 'timeout': 15},
+    'q3': {'limit': 2, 'queue': 8, 'timeout': 15},
+    'explorer': {'limit': 4, 'queue': 16, 'timeout': 10},
+    'cube': {'limit': 4, 'queue': 16, 'timeout': 10},
+    'cooccurrence': {'limit': 4, 'queue': 16, 'timeout': 10},
+    'export': {'limit': 2, 'queue': 4, 'timeout': 10},
+}
+DATAPLAY_ADMISSION_RETRY_AFTER = 5
+DATAPLAY_ADMISSION_STALE_ENTRIES = 256
+
+# Statistical analysis pipeline
+# Dataset snapshots: version ID -> directory holding games.csv, genres.csv, tags.csv and reviews.csv
+# (pick one with ?snapshot=<ID> on the dashboards, the default one otherwise)
+# Relative directories are taken from BASE_DIR, not from the working directory
+DATAPLAY_SNAPSHOTS = {"current": BASE_DIR}
+DATAPLAY_DEFAULT_SNAPSHOT = "current"
+
+# Memory the loaded dataset frames may use in the in-process object cache
+# before the least recently used ones are evicted (None = no limit)
+DATAPLAY_OBJECT_CACHE_BYTES = 1024 ** 3
+
+# Memory the computed frames of all loaded snapshots may use before the least
+# recently used snapshots are evicted (None = no limit)
+DATAPLAY_SNAPSHOT_MEMORY_BYTES = 2 * 1024 ** 3
+
+# Directory where derived frames are checkpointed between restarts (None = disabled)
+DATAPLAY_CHECKPOINT_DIR = None
+
+# CSV ingest: worker processes (None = one per core) and size above which a file is split into shards
+DATAPLAY_INGEST_WORKERS = None
+DATAPLAY_INGEST_SHARD_BYTES = 64 * 1024 * 1024
+
+# Aggregations over relations run in blocks of rows holding about this many pairs
+DATAPLAY_AGGREGATE_BLOCK_PAIRS = 256 * 1024
+
+# Sanitized copies of the CSV files, parsed with the fast engine ('c' or 'pyarrow')
+# None = parse the raw files with the python engine
+DATAPLAY_CLEAN_DIR = BASE_DIR / "clean_data"
+DATAPLAY_CSV_ENGINE = "c"
+
+# Dated exchange rates used to convert prices to EUR (None = statistical_analysis/exchange_rates.csv)
+# and the date at which prices are converted (None = the dataset capture date, Dec 31, 2024)
+DATAPLAY_EXCHANGE_RATES_FILE = None
+DATAPLAY_PRICE_DATE = None
+
+# Memory-mapped review metrics store (one sub-directory per dataset version)
+DATAPLAY_METRICS_DIR = BASE_DIR / "metrics_store"
 
+# Build the top tags and games-per-language charts from Count-Min / HyperLogLog sketches
+DATAPLAY_SKETCH_MODE = False
@@ -0,0 +1,94 @@
+# analysis/cooccurrence.py
+
+import numpy as np
+import pandas as pd
+from .incidence import build_incidence
+from .pipeline import node, compute
+
+# Measures of each pair: number of games having both, and their total reviews
+MEASURES = ("games", "reviews")
+
+class Cooccurrence:
+    """
+    Co-occurrence of tags with tags and of genres with tags
+    Built from game x tag and game x genre incidence matrices (same rows) as
+    dense Gram products, per pair: games having both and their total reviews
+    """
+
+    def __init__(self, tag_matrix, genre_matrix, reviews):
+        self.tags = list(tag_matrix.column_labels)
+        self.genres = list(genre_matrix.column_labels)
+        self.tag_tag = {
+            'games': tag_matrix.product(tag_matrix),
+            'reviews': tag_matrix.product(tag_matrix, weights=reviews),
+        }
+        self.genre_tag = {
+            'games': genre_matrix.product(tag_matrix),
+            'reviews': genre_matrix.product(tag_matrix, weights=reviews),
+        }
+
+    def kinds(self):
+        """Pair kinds: name -> (row members, column members, measures)"""
+        return {
+            'tags': (self.tags, self.tags, self.tag_tag),
+            'genre_tags': (self.genres, self.tags, self.genre_tag),
+        }
+
+    def top_pairs(self, kind="tags", by="games", n=20, member=None):
+        """
+        The n pairs with the highest measure, as dicts (first, second, games, reviews)
+        Tag pairs are unordered (each pair once, a tag is not paired with itself)
+        member keeps the pairs including that tag or genre
+        """
+        if kind not in self.kinds():
+            raise KeyError(f"Unknown pair kind: {kind}")
+        if by not in MEASURES:
+            raise KeyError(f"Unknown measure: {by}")
+        rows, columns, measures = self.kinds()[kind]
+
+        candidates = np.ones(measures[by].shape, dtype=bool)
+        if kind == "tags":
+            candidates = np.triu(candidates, k=1)
+        if member is not None:
+            selected = np.zeros(measures[by].shape, dtype=bool)
+            if member in rows:
+                selected[rows.index(member), :] = True
+            if member in columns:
+                selected[:, columns.index(member)] = True
+            candidates &= selected
+        candidates &= measures['games'] > 0
+
+        flat = np.flatnonzero(candidates)
+        values = measures[by].ravel()[flat]
+        if len(flat) > n:
+            best = np.argpartition(-values, n)[:n]
+            flat, values = flat[best], values[best]
+        flat = flat[np.argsort(-values, kind="stable")]
+
+        first, second = np.unravel_index(flat, measures[by].shape)
+        return [
+            {
+                'first': rows[i],
+                'second': columns[j],
+                'games': int(measures['games'][i, j]),
+                'reviews': float(measures['reviews'][i, j]),
+            }
+            for i, j in zip(first.tolist(), second.tolist())
+        ]
+
+    def frame(self, kind, by="games"):
+        """Whole matrix of a measure as a DataFrame"""
+        rows, columns, measures = self.kinds()[kind]
+        return pd.DataFrame(measures[by], index=rows, columns=columns)
+
+@node('cooccurrence', deps=['q1_data', 'tag_matrix', 'metrics_store'])
+def cooccurrence_node(data, tags, store):
+    genres_clean = data['genres_clean']
+    app_ids = np.union1d(genres_clean["app_id"].unique(), tags.row_labels)
+    tag_matrix = build_incidence(*tags.pairs(), row_labels=app_ids)
+    genre_matrix = build_incidence(genres_clean["app_id"], genres_clean["genre_normalized"], row_labels=app_ids)
+    reviews = np.nan_to_num(store.lookup(app_ids, "total", fill=0))
+    return Cooccurrence(tag_matrix, genre_matrix, reviews)
+
+def get_cooccurrence():
+    return compute('cooccurrence')
@@ -0,0 +1,175 @@
+# analysis/cube.py
+
+import itertools
+import numpy as np
+import pandas as pd
+from .pipeline import node, compute
+from .q2_analysis import BUCKET_ORDER
+
+# Dimensions of the cube, in axis order
+DIMENSIONS = ("genre", "language", "price_bucket")
+
+class OlapCube:
+    """
+    Genre x language x price bucket cube of game counts, review totals and price sums
+    Each axis has one extra position (the last) holding the ALL marginal, and every
+    cell counts distinct games, so roll-ups are exact even for games in several genres
+    The games of each genre and language are kept to answer filters with several
+    genres or languages, where adding cells would count a game more than once
+    """
+
+    def __init__(self, members, games, reviews, price_sum, rows, postings):
+        self.members = members
+        self.positions = {
+            dimension: {value: position for position, value in enumerate(values)}
+            for dimension, values in members.items()
+        }
+        self.games = games
+        self.reviews = reviews
+        self.price_sum = price_sum
+        # Per game: price bucket code, review total and price; axis position -> rows
+        self.rows = rows
+        self.postings = postings
+
+    def _axis(self, dimension, value):
+        """Positions on an axis of a value, a list of values, or None (ALL)"""
+        if value is None or (not isinstance(value, str) and len(value) == 0):
+            return [len(self.members[dimension])]
+        values = [value] if isinstance(value, str) else list(dict.fromkeys(value))
+        try:
+            return [self.positions[dimension][v] for v in values]
+        except KeyError as error:
+            raise KeyError(f"Unknown {dimension}: {error.args[0]}") from None
+
+    def cell(self, genre=None, language=None, price_bucket=None):
+        """
+        Measures of one cell (None = ALL)
+        A game has a single price bucket, so several buckets are answered by adding
+        cells; several genres or languages are answered from the matching games,
+        each counted once (O(m log m) for m matching games)
+        """
+        axes = [
+            self._axis("genre", genre),
+            self._axis("language", language),
+            self._axis("price_bucket", price_bucket),
+        ]
+        if len(axes[0]) > 1 or len(axes[1]) > 1:
+            return self._distinct_cell(*axes)
+        index = np.ix_(*axes)
+        return self._measures(
+            int(self.games[index].sum()),
+            float(self.reviews[index].sum()),
+            float(self.price_sum[index].sum()),
+        )
+
+    def _distinct_cell(self, genres, languages, price_buckets):
+        # Rows having any selected value of each dimension, each row once
+        rows = None
+        for dimension, positions in (("genre", genres), ("language", languages)):
+            if positions != [len(self.members[dimension])]:
+                matching = np.unique(np.concatenate([self.postings[dimension][p] for p in positions]))
+                rows = matching if rows is None else np.intersect1d(rows, matching, assume_unique=True)
+        if price_buckets != [len(self.members["price_bucket"])]:
+            rows = rows[np.isin(self.rows["price_bucket"][rows], price_buckets)]
+        return self._measures(
+            len(rows),
+            float(self.rows["reviews"][rows].sum()),
+            float(self.rows["price"][rows].sum()),
+        )
+
+    def drill_down(self, dimension, **fixed):
+        """Measures for every value of dimension, the other dimensions fixed as in cell()"""
+        if dimension not in DIMENSIONS:
+            raise KeyError(f"Unknown dimension: {dimension}")
+        rows = []
+        for value in self.members[dimension]:
+            row = self.cell(**{**fixed, dimension: value})
+            rows.append({dimension: value, **row})
+        return rows
+
+    def roll_up(self, dimension, **fixed):
+        """Measures of the cell with dimension aggregated to ALL"""
+        return self.cell(**{**fixed, dimension: None})
+
+    @staticmethod
+    def _measures(games, reviews, price_sum):
+        return {
+            'games': games,
+            'total_reviews': reviews,
+            'price_sum': price_sum,
+            'avg_reviews': reviews / games if games else 0.0,
+            'avg_price': price_sum / games if games else 0.0,
+        }
+
+def build_cube(df_prices, genres_df, language_matrix, reviews_total):
+    """Aggregate every cuboid (all subsets of the dimensions) into dense arrays"""
+    base = pd.DataFrame({
+        'app_id': df_prices["app_id"].to_numpy(dtype=np.int64),
+        'price_bucket': df_prices["price_bucket"].cat.codes.to_numpy(),
+        'reviews': reviews_total,
+        'price': df_prices["price_eur"].to_numpy(),
+    })
+    genres = genres_df[["app_id", "genre_normalized"]].drop_duplicates()
+    language_app_ids, language_values = language_matrix.pairs()
+    members = {
+        'genre': sorted(genres["genre_normalized"].unique()),
+        'language': list(language_matrix.column_labels),
+        'price_bucket': list(BUCKET_ORDER),
+    }
+
+    # Dimension values as codes (position on the axis)
+    genres = pd.DataFrame({
+        'app_id': genres["app_id"].to_numpy(dtype=np.int64),
+        'genre': pd.Categorical(genres["genre_normalized"], categories=members['genre']).codes,
+    })
+    languages = pd.DataFrame({
+        'app_id': language_app_ids.astype(np.int64),
+        'language': language_matrix.indices,
+    })
+
+    shape = tuple(len(members[dimension]) + 1 for dimension in DIMENSIONS)
+    games = np.zeros(shape, dtype=np.int64)
+    reviews = np.zeros(shape)
+    price_sum = np.zeros(shape)
+
+    for size in range(len(DIMENSIONS) + 1):
+        for dimensions in itertools.combinations(DIMENSIONS, size):
+            frame = base
+            if "genre" in dimensions:
+                frame = frame.merge(genres, on="app_id")
+            if "language" in dimensions:
+                frame = frame.merge(languages, on="app_id")
+            if "price_bucket" in dimensions:
+                frame = frame[frame["price_bucket"] >= 0]
+
+            # Axis positions of each row, the ALL position for the other dimensions
+            coordinates = [
+                frame[dimension].to_numpy(dtype=np.int64) if dimension in dimensions
+                else np.full(len(frame), length - 1, dtype=np.int64)
+                for dimension, length in zip(DIMENSIONS, shape)
+            ]
+            flat = np.ravel_multi_index(coordinates, shape)
+            total = int(np.prod(shape))
+            games += np.bincount(flat, minlength=total).reshape(shape)
+            reviews += np.bincount(flat, weights=frame["reviews"].to_numpy(), minlength=total).reshape(shape)
+            price_sum += np.bincount(flat, weights=frame["price"].to_numpy(), minlength=total).reshape(shape)
+
+    rows = {column: base[column].to_numpy() for column in ("price_bucket", "reviews", "price")}
+    positions = pd.DataFrame({'row': np.arange(len(base)), 'app_id': base["app_id"].to_numpy()})
+    postings = {}
+    for dimension, frame in (("genre", genres), ("language", languages)):
+        matches = positions.merge(frame, on="app_id")
+        groups = dict(tuple(matches.groupby(dimension)["row"]))
+        postings[dimension] = [
+            np.sort(groups[position].to_numpy()) if position in groups else np.empty(0, dtype=np.int64)
+            for position in range(len(members[dimension]))
+        ]
+    return OlapCube(members, games, reviews, price_sum, rows, postings)
+
+@node('cube', deps=['price_frame', 'metrics_store', 'q1_data', 'language_matrix'])
+def cube_node(df_prices, store, q1_data, language_matrix):
+    reviews_total = np.nan_to_num(store.lookup(df_prices["app_id"], "total", fill=0))
+    return build_cube(df_prices, q1_data['genres_clean'], language_matrix, reviews_total)
+
+def get_cube():
+    return compute('cube')
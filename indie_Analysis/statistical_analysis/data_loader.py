@@ -1,24 +1,15 @@
 # analysis/data_loader.py
 
+import hashlib
 import pandas as pd
-import numpy as np
 import re
-from django.core.cache import cache
+from .datasets import get_snapshot
+from .exchange_rates import convert_to_eur
+from .ingest import CSV_SOURCES
+from .object_cache import dataset_cache
 
-# Exchange rates (as of Dec 31, 2024)
-EXCHANGE_RATES_TO_EUR = {
-    'EUR': 1.0, 'USD': 1 / 1.0389, 'GBP': 1 / 0.82918,
-    'JPY': 1 / 163.06, 'CAD': 1 / 1.4785, 'AUD': 1 / 1.6631,
-    'CHF': 1 / 0.9367, 'CNY': 1 / 7.5496, 'SEK': 1 / 11.4840,
-    'NZD': 1 / 1.8417, 'MXN': 1 / 21.2110, 'SGD': 1 / 1.4159,
-    'HKD': 1 / 8.0726, 'NOK': 1 / 11.8500, 'KRW': 1 / 1518.82,
-    'TRY': 1 / 36.7285, 'RUB': 1 / 103.50, 'INR': 1 / 89.05,
-    'BRL': 1 / 6.32, 'ZAR': 1 / 19.2520, 'DKK': 1 / 7.4578,
-    'PLN': 1 / 4.2625, 'THB': 1 / 35.54, 'MYR': 1 / 4.67,
-    'HUF': 1 / 410.25, 'CZK': 1 / 25.185, 'ILS': 1 / 3.82,
-    'CLP': 1 / 1023.50, 'PHP': 1 / 60.85, 'AED': 1 / 3.814,
-    'COP': 1 / 4562.00, 'SAR': 1 / 3.896, 'VND': 1 / 26380,
-}
+# Source files of the dataset (relative to the snapshot directory)
+DATASET_FILES = tuple(source['path'] for source in CSV_SOURCES.values())
 
 def extract_price_and_currency(x):
     """Extract price and currency from price_overview field"""
@@ -37,51 +28,50 @@ def extract_price_and_currency(x):
     except Exception:
         return None, None
 
-def convert_to_eur(row):
-    """Convert price to EUR using exchange rates"""
-    if row['price'] == 0:
-        return 0.0
-    if pd.isna(row['price']) or pd.isna(row['currency']):
-        return 0.0
-    rate = EXCHANGE_RATES_TO_EUR.get(row['currency'])
-    if rate is None:
-        return 0.0
-    return round(row['price'] * rate, 2)
+def clean_column_names(df):
+    """
+    Return df with the quotes and spaces stripped from its column names
+    The data is shared with df (the raw frames are shared by every loader and must not be modified)
+    """
+    return df.set_axis(df.columns.str.strip().str.replace('"', '', regex=False), axis=1, copy=False)
+
+def get_dataset_files():
+    """Paths of the dataset files in the active snapshot"""
+    snapshot = get_snapshot()
+    return tuple(snapshot.file(name) for name in DATASET_FILES)
+
+def get_dataset_version(files=DATASET_FILES):
+    """
+    Return a version string for the dataset files of the active snapshot
+    Built from the snapshot ID, size and modification time, so it changes whenever a CSV is replaced
+    """
+    return get_snapshot().version(files)
+
+def dataset_cache_key(name):
+    """Cache key namespaced by the snapshot and version of the dataset"""
+    version = hashlib.sha1(get_dataset_version().encode("utf-8")).hexdigest()[:16]
+    return f"{name}:{get_snapshot().id}:{version}"
 
-def load_games_data(use_cache=True):
+def load_raw_games_data(sources, use_cache=True):
     """
-    Load and preprocess games data
-    Uses Django cache to avoid reloading CSV on every request
+    Preprocess the games data of the raw sources, with prices in their original currency
+    Uses the in-process object cache to avoid reprocessing it on every request
     """
-    cache_key = 'games_dataframe'
+    cache_key = dataset_cache_key('games_raw_dataframe')
     
     if use_cache:
-        df = cache.get(cache_key)
+        df = dataset_cache.get(cache_key)
         if df is not None:
             return df
     
-    # Load CSV
-    df = pd.read_csv(
-        "games.csv",
-        sep=',',
-        quotechar='"',
-        escapechar='\\',
-        on_bad_lines="skip",
-        engine='python'
-    )
-    
     # Clean column names
-    df.columns = df.columns.str.strip().str.replace('"', '', regex=False)
+    df = clean_column_names(sources['games'])
     
     # Extract price and currency
     df[["price", "currency"]] = df["price_overview"].apply(
         lambda x: pd.Series(extract_price_and_currency(x))
     )
-    
-    # Convert to EUR
     df.loc[df['is_free'] == 1, 'price'] = 0
-    df['price_eur'] = df.apply(convert_to_eur, axis=1)
-    df['price_eur'] = df['price_eur'].fillna(0)
     df['price'] = df['price'].fillna(0)
     
     # Filter games only
@@ -89,6 +79,18 @@ def load_games_data(use_cache=True):
     
     # Cache for 1 hour
     if use_cache:
-        cache.set(cache_key, df_games, 3600)
+        dataset_cache.set(cache_key, df_games, 3600)
     
-    return df_games
\ No newline at end of file
+    return df_games
+
+def add_price_eur(df_games):
+    """
+    Return the games data with prices converted to EUR
+    Only the price_eur column is computed, the other columns are shared with df_games
+    """
+    price_eur = pd.Series(
+        convert_to_eur(df_games['price'], df_games['currency']),
+        index=df_games.index,
+        name='price_eur'
+    )
+    return pd.concat([df_games, price_eur], axis=1, copy=False)
@@ -0,0 +1,79 @@
+# analysis/datasets.py
+
+import contextlib
+import contextvars
+import os
+import threading
+from django.conf import settings
+
+# Snapshots registered at runtime (in addition to DATAPLAY_SNAPSHOTS)
+_registered = {}
+_registered_lock = threading.Lock()
+
+# Snapshot used by the current request / thread (None = the default snapshot)
+_active = contextvars.ContextVar("dataplay_snapshot", default=None)
+
+class Snapshot:
+    """A dump of the dataset: a version ID and the directory holding its CSV files"""
+
+    def __init__(self, snapshot_id, path):
+        self.id = snapshot_id
+        # Relative to the project directory, whatever the working directory of the process
+        self.path = os.path.normpath(os.path.join(settings.BASE_DIR, path))
+
+    def __repr__(self):
+        return f"Snapshot({self.id!r}, {self.path!r})"
+
+    def file(self, name):
+        """Path of one of the dataset files in this snapshot"""
+        return os.path.join(self.path, name)
+
+    def version(self, files):
+        """
+        Version string of the snapshot files
+        Starts with the snapshot ID, then the size and modification time of each file
+        """
+        parts = [self.id]
+        for name in files:
+            path = self.file(name)
+            try:
+                stat = os.stat(path)
+                parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+            except OSError:
+                parts.append(f"{path}:missing")
+        return "|".join(parts)
+
+def get_default_snapshot_id():
+    return getattr(settings, "DATAPLAY_DEFAULT_SNAPSHOT", "current")
+
+def get_snapshots():
+    """All known snapshots: snapshot ID -> Snapshot"""
+    configured = getattr(settings, "DATAPLAY_SNAPSHOTS", None) or {get_default_snapshot_id(): settings.BASE_DIR}
+    snapshots = {snapshot_id: Snapshot(snapshot_id, path) for snapshot_id, path in configured.items()}
+    with _registered_lock:
+        snapshots.update(_registered)
+    return snapshots
+
+def register_snapshot(snapshot_id, path):
+    """Add a snapshot at runtime (e.g. a dump downloaded after startup)"""
+    snapshot = Snapshot(snapshot_id, path)
+    with _registered_lock:
+        _registered[snapshot_id] = snapshot
+    return snapshot
+
+def get_snapshot(snapshot_id=None):
+    """Return a snapshot by ID (the active snapshot by default)"""
+    snapshot_id = snapshot_id or _active.get() or get_default_snapshot_id()
+    snapshots = get_snapshots()
+    if snapshot_id not in snapshots:
+        raise KeyError(f"Unknown dataset snapshot: {snapshot_id}")
+    return snapshots[snapshot_id]
+
+@contextlib.contextmanager
+def use_snapshot(snapshot_id):
+    """Run the loaders and the pipeline on another snapshot inside a with block"""
+    token = _active.set(get_snapshot(snapshot_id).id)
+    try:
+        yield
+    finally:
+        _active.reset(token)
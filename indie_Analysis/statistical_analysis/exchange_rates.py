@@ -0,0 +1,88 @@
+# analysis/exchange_rates.py
+
+import os
+import threading
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+# Dated exchange rates: one row per (date, currency), per_eur = units of currency for 1 EUR
+DEFAULT_RATES_FILE = os.path.join(os.path.dirname(__file__), "exchange_rates.csv")
+
+# Date the dataset was captured (prices are converted at this date by default)
+DATASET_CAPTURE_DATE = "2024-12-31"
+
+_rate_table = {'version': None, 'data': None}
+_rate_table_lock = threading.Lock()
+
+def get_rates_file():
+    return getattr(settings, "DATAPLAY_EXCHANGE_RATES_FILE", None) or DEFAULT_RATES_FILE
+
+def get_rate_table_version():
+    """Version of the rate table (changes whenever the file is updated)"""
+    path = get_rates_file()
+    stat = os.stat(path)
+    return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def get_price_date():
+    """
+    Date at which prices are converted
+    Defaults to the date the dataset was captured, so prices match the snapshot
+    """
+    price_date = getattr(settings, "DATAPLAY_PRICE_DATE", None)
+    return pd.Timestamp(price_date or DATASET_CAPTURE_DATE)
+
+def load_rate_table():
+    """
+    Load the rate table, sorted by date, with the rate to EUR of each row
+    Loaded once per version of the file
+    """
+    version = get_rate_table_version()
+    with _rate_table_lock:
+        if _rate_table['version'] != version:
+            rates = pd.read_csv(get_rates_file(), parse_dates=["date"])
+            rates["date"] = rates["date"].astype("datetime64[ns]")
+            rates["currency"] = rates["currency"].str.strip().str.upper()
+            rates["rate_to_eur"] = 1 / rates["per_eur"]
+            _rate_table['data'] = (
+                rates[["date", "currency", "rate_to_eur"]]
+                .sort_values("date", kind="stable")
+                .reset_index(drop=True)
+            )
+            _rate_table['version'] = version
+        return _rate_table['data']
+
+def convert_to_eur(prices, currencies, dates=None, rates=None):
+    """
+    Convert prices to EUR with the latest rate of each currency known at each date
+    Vectorized as-of join per currency, unknown currencies and missing prices give 0
+    Returns a numpy array aligned with prices
+    """
+    if rates is None:
+        rates = load_rate_table()
+    if dates is None:
+        dates = get_price_date()
+
+    prices = np.asarray(prices, dtype=float)
+    if np.ndim(dates) == 0:
+        dates = np.full(len(prices), pd.Timestamp(dates).to_datetime64())
+    frame = pd.DataFrame({
+        'date': pd.to_datetime(np.asarray(dates)).astype("datetime64[ns]"),
+        'currency': pd.Series(currencies, dtype=object).fillna("").to_numpy(),
+        'row': np.arange(len(prices)),
+    })
+
+    left = frame.sort_values("date", kind="stable")
+    merged = pd.merge_asof(left, rates, on="date", by="currency", direction="backward")
+    
+    # Dates before the first known rate use the earliest rate of the currency
+    missing = merged["rate_to_eur"].isna().to_numpy()
+    if missing.any():
+        earliest = pd.merge_asof(left[missing], rates, on="date", by="currency", direction="forward")
+        merged.loc[missing, "rate_to_eur"] = earliest["rate_to_eur"].to_numpy()
+    merged = merged.sort_values("row")
+    
+    rate = merged["rate_to_eur"].to_numpy(dtype=float)
+    price_eur = np.round(prices * rate, 2)
+    price_eur[np.isnan(price_eur) | (prices == 0)] = 0.0
+    return price_eur
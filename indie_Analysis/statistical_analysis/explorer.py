@@ -0,0 +1,190 @@
+# analysis/explorer.py
+
+import base64
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from .pipeline import node, compute
+
+# Sortable columns of the explorer
+SORT_KEYS = ("price_eur", "total_reviews", "metacritic_score")
+
+# Filter sets whose matching positions are kept per sort order (least recently used evicted)
+FILTER_CACHE_ENTRIES = 32
+
+def encode_cursor(key, app_id):
+    """Opaque cursor: the sort key and app_id of the last row of a page"""
+    raw = json.dumps([key, app_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Return (key, app_id) of a cursor, raises ValueError if it is invalid"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key, app_id = json.loads(raw)
+        return float(key), int(app_id)
+    except (TypeError, ValueError) as error:
+        raise ValueError("Invalid cursor") from error
+
+def _postings(row_ids, values):
+    """Value -> sorted row positions having that value"""
+    frame = pd.DataFrame({'row': row_ids, 'value': values}).dropna()
+    frame = frame[frame["row"] >= 0].drop_duplicates()
+    return {
+        value: np.sort(rows.to_numpy(dtype=np.int64))
+        for value, rows in frame.groupby("value", sort=True)["row"]
+    }
+
+def _matrix_rows(row_ids, matrix):
+    """Row positions and values of the entries of an incidence matrix"""
+    app_ids, values = matrix.pairs()
+    return row_ids(app_ids), values
+
+class GameExplorer:
+    """
+    Game list with presorted indexes for keyset pagination
+    - one order per (sort key, direction): row positions sorted by (key, app_id),
+      with the sorted keys, so a cursor is found with a binary search
+    - posting lists of row positions per genre, tag and language for the filters
+    - rank of each row in each order, to map the rows matching a filter set to their
+      positions in the order (computed once per filter set, then cached)
+    Missing values sort last in both directions
+    """
+
+    def __init__(self, games, genres, tag_matrix, language_matrix):
+        self.games = games
+        self.app_ids = games["app_id"].to_numpy(dtype=np.int64)
+
+        self.orders = {}
+        for column in SORT_KEYS:
+            values = games[column].to_numpy(dtype=np.float64)
+            for descending in (False, True):
+                keys = -values if descending else values.copy()
+                keys[np.isnan(keys)] = np.inf
+                order = np.lexsort((self.app_ids, keys))
+                ranks = np.empty(len(order), dtype=np.int64)
+                ranks[order] = np.arange(len(order))
+                self.orders[column, descending] = (order, keys[order], self.app_ids[order], ranks)
+
+        # Rows of each app_id (first occurrence)
+        rows = pd.Series(np.arange(len(games)), index=self.app_ids)
+        rows = rows[~rows.index.duplicated()]
+        def row_ids(app_ids):
+            return rows.reindex(np.asarray(app_ids, dtype=np.int64)).fillna(-1).to_numpy(dtype=np.int64)
+
+        self.filters = {
+            'genre': _postings(row_ids(genres["app_id"]), genres["genre_normalized"].to_numpy()),
+            'tag': _postings(*_matrix_rows(row_ids, tag_matrix)),
+            'language': _postings(*_matrix_rows(row_ids, language_matrix)),
+        }
+        self._positions = OrderedDict()
+        self._positions_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.games)
+
+    def options(self):
+        """Values each filter accepts"""
+        return {name: list(postings) for name, postings in self.filters.items()}
+
+    def _rows(self, filters):
+        """Rows matching every filter (any of its values), sorted"""
+        rows = None
+        for name, values in filters:
+            postings = self.filters[name]
+            matching = np.unique(np.concatenate(
+                [postings.get(value, np.empty(0, dtype=np.int64)) for value in values]
+            ))
+            rows = matching if rows is None else np.intersect1d(rows, matching, assume_unique=True)
+        return rows
+
+    def _matching_positions(self, order_key, filters):
+        """
+        Positions in the sort order of the rows matching the filters, sorted
+        None if there is no filter. Cached per (order, filter set), so the pages
+        after the first one only cost a binary search
+        """
+        filters = tuple(sorted(
+            (name, tuple(sorted(set(values)))) for name, values in filters.items() if values
+        ))
+        if not filters:
+            return None
+        key = (order_key, filters)
+        with self._positions_lock:
+            positions = self._positions.get(key)
+            if positions is not None:
+                self._positions.move_to_end(key)
+                return positions
+
+        ranks = self.orders[order_key][3]
+        positions = np.sort(ranks[self._rows(filters)])
+        with self._positions_lock:
+            self._positions[key] = positions
+            while len(self._positions) > FILTER_CACHE_ENTRIES:
+                self._positions.popitem(last=False)
+        return positions
+
+    def _start(self, order_key, cursor):
+        # Position in the sort order right after the cursor row
+        if cursor is None:
+            return 0
+        _, keys, app_ids, _ = self.orders[order_key]
+        key, app_id = decode_cursor(cursor)
+        low = np.searchsorted(keys, key, side="left")
+        high = np.searchsorted(keys, key, side="right")
+        return int(low + np.searchsorted(app_ids[low:high], app_id, side="right"))
+
+    def page(self, sort="total_reviews", descending=True, cursor=None, limit=50, **filters):
+        """
+        One page of games in sort order, after the cursor row
+        Returns (rows as dicts, cursor of the next page or None)
+        The cost depends on the page size, not on how far the page is nor on how
+        rare the filtered values are
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        order_key = (sort, descending)
+        order = self.orders[order_key][0]
+        position = self._start(order_key, cursor)
+        positions = self._matching_positions(order_key, filters)
+
+        if positions is None:
+            selected = order[position:position + limit + 1]
+        else:
+            first = np.searchsorted(positions, position)
+            selected = order[positions[first:first + limit + 1]]
+
+        has_next = len(selected) > limit
+        rows = self.games.iloc[selected[:limit]]
+        next_cursor = None
+        if has_next:
+            last = int(selected[limit - 1])
+            key = self.games[sort].iat[last]
+            key = np.inf if pd.isna(key) else (-key if descending else key)
+            next_cursor = encode_cursor(float(key), int(self.app_ids[last]))
+
+        columns = [
+            [None if pd.isna(value) else value for value in rows[column].tolist()]
+            for column in rows.columns
+        ]
+        records = [dict(zip(rows.columns, values)) for values in zip(*columns)]
+        return records, next_cursor
+
+@node('game_explorer', deps=['game_list', 'metrics_store', 'q1_data', 'tag_matrix', 'language_matrix'])
+def game_explorer_node(game_list, store, q1_data, tag_matrix, language_matrix):
+    """Explorer over the game list with the review metrics of each game"""
+    app_ids = game_list["app_id"]
+    games = pd.DataFrame({
+        'app_id': game_list["app_id"].to_numpy(),
+        'name': game_list["name"].to_numpy(),
+        'price_eur': game_list["price_eur"].to_numpy(),
+        'price_bucket': game_list["price_bucket"].to_numpy(),
+        'total_reviews': store.lookup(app_ids, "total"),
+        'metacritic_score': store.lookup(app_ids, "metacritic_score"),
+    })
+    return GameExplorer(games, q1_data['genres_clean'], tag_matrix, language_matrix)
+
+def get_game_explorer():
+    return compute('game_explorer')
@@ -0,0 +1,146 @@
+# analysis/export.py
+
+import numpy as np
+import pandas as pd
+from .pipeline import node, compute
+from .q2_analysis import BUCKET_ORDER
+
+# Rows written per CSV chunk / Parquet row group
+CHUNK_ROWS = 50_000
+
+def parquet_available():
+    """Parquet export needs pyarrow (optional dependency)"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+# Aggregates behind the Q1-Q3 charts: name -> function returning a DataFrame
+
+def _genre_popularity():
+    return compute('genre_popularity')
+
+def _genre_counts():
+    return compute('genre_counts').rename_axis('genre').reset_index(name='games')
+
+def _tag_counts():
+    return compute('tag_counts').rename_axis('tag').reset_index(name='games')
+
+def _price_buckets():
+    counts = compute('price_frame')["price_bucket"].value_counts().reindex(BUCKET_ORDER, fill_value=0)
+    return counts.rename_axis('price_bucket').reset_index(name='games')
+
+def _language_engagement():
+    return compute('language_share').rename(columns={'language_normalized': 'language', 'total': 'total_reviews'})
+
+def _language_game_counts():
+    return compute('language_game_counts').rename_axis('language').reset_index(name='games')
+
+AGGREGATES = {
+    'genre_popularity': _genre_popularity,
+    'genre_counts': _genre_counts,
+    'tag_counts': _tag_counts,
+    'price_buckets': _price_buckets,
+    'language_engagement': _language_engagement,
+    'language_game_counts': _language_game_counts,
+}
+
+@node('game_list', deps=['games_raw', 'price_frame'])
+def game_list_node(df_games, df_prices):
+    """Exported columns of every game (same rows as the price frame)"""
+    return pd.DataFrame({
+        'app_id': df_prices["app_id"].to_numpy(),
+        'name': df_games["name"].to_numpy(),
+        'price_eur': df_prices["price_eur"].to_numpy(),
+        'is_free': df_prices["is_free"].to_numpy(),
+        'price_bucket': df_prices["price_bucket"].to_numpy(),
+    }, copy=False)
+
+def filter_games(genres=None, languages=None, min_price=None, max_price=None, segment=None):
+    """
+    Positions of the games matching the filters in the game list
+    genres / languages: games having any of the values, segment: "free" or "paid"
+    """
+    df_prices = compute('price_frame')
+    app_ids = df_prices["app_id"].to_numpy()
+    mask = np.ones(len(df_prices), dtype=bool)
+
+    if genres:
+        genres_clean = compute('q1_data')['genres_clean']
+        matching = genres_clean.loc[genres_clean["genre_normalized"].isin(genres), "app_id"]
+        mask &= np.isin(app_ids, matching.to_numpy())
+    if languages:
+        mask &= np.isin(app_ids, compute('language_matrix').rows_with(languages))
+
+    price_eur = df_prices["price_eur"].to_numpy()
+    if min_price is not None:
+        mask &= price_eur >= min_price
+    if max_price is not None:
+        mask &= price_eur <= max_price
+    if segment == "free":
+        mask &= df_prices["is_free"].to_numpy()
+    elif segment == "paid":
+        mask &= df_prices["is_paid"].to_numpy()
+
+    return np.flatnonzero(mask)
+
+def iter_chunks(frame, positions=None, chunk_rows=CHUNK_ROWS):
+    """Yield the rows of frame (or the rows at positions) in slices of chunk_rows"""
+    total = len(frame) if positions is None else len(positions)
+    for start in range(0, total, chunk_rows):
+        if positions is None:
+            yield frame.iloc[start:start + chunk_rows]
+        else:
+            yield frame.iloc[positions[start:start + chunk_rows]]
+
+def iter_csv(frame, positions=None, chunk_rows=CHUNK_ROWS):
+    """Yield the CSV text of frame chunk by chunk (header first)"""
+    yield ",".join(map(str, frame.columns)) + "\n"
+    for chunk in iter_chunks(frame, positions, chunk_rows):
+        yield chunk.to_csv(header=False, index=False)
+
+class _ChunkSink:
+    """Write-only file collecting the bytes written since the last drain"""
+
+    def __init__(self):
+        self.buffer = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.buffer)
+        self.buffer = []
+        return data
+
+def iter_parquet(frame, positions=None, chunk_rows=CHUNK_ROWS):
+    """Yield a Parquet file of frame, one row group per chunk (requires pyarrow)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for chunk in iter_chunks(frame, positions, chunk_rows):
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is None:
+        writer = pq.ParquetWriter(sink, pa.Schema.from_pandas(frame, preserve_index=False))
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,121 @@
+# analysis/incidence.py
+
+import numpy as np
+import pandas as pd
+
+# Row pairs expanded at a time by IncidenceMatrix.product
+PRODUCT_BLOCK_PAIRS = 4_000_000
+
+class IncidenceMatrix:
+    """
+    Sparse 0/1 matrix in CSR layout (numpy arrays, no scipy)
+    Row i lists the columns of row_labels[i] in indices[indptr[i]:indptr[i + 1]]
+    Each (row, column) pair is stored once
+    """
+
+    def __init__(self, indptr, indices, row_labels, column_labels):
+        self.indptr = indptr
+        self.indices = indices
+        self.row_labels = row_labels
+        self.column_labels = column_labels
+
+    @property
+    def shape(self):
+        return len(self.row_labels), len(self.column_labels)
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+    def row_ids(self):
+        """Row of every stored entry"""
+        return np.repeat(np.arange(len(self.row_labels)), np.diff(self.indptr))
+
+    def pairs(self):
+        """Row label and column label of every stored entry"""
+        return self.row_labels[self.row_ids()], self.column_labels[self.indices]
+
+    def rows_with(self, columns):
+        """Labels of the rows having any of the given column labels"""
+        selected = np.isin(self.column_labels, list(columns))
+        return self.row_labels[np.unique(self.row_ids()[selected[self.indices]])]
+
+    def rmatvec(self, values):
+        """Transposed product: sum of values of the rows having each column"""
+        values = np.asarray(values, dtype=np.float64)
+        return np.bincount(self.indices, weights=values[self.row_ids()], minlength=self.shape[1])
+
+    def column_nnz(self):
+        """Number of rows having each column"""
+        return np.bincount(self.indices, minlength=self.shape[1])
+
+    def rows(self, start, end):
+        """Rows start to end as a new matrix (arrays are shared, not copied)"""
+        indptr = self.indptr[start:end + 1]
+        return IncidenceMatrix(
+            indptr - indptr[0],
+            self.indices[indptr[0]:indptr[-1]],
+            self.row_labels[start:end],
+            self.column_labels,
+        )
+
+    def product(self, other, weights=None, block_pairs=PRODUCT_BLOCK_PAIRS):
+        """
+        Dense transposed product self.T @ diag(weights) @ other (rows must be aligned)
+        Cell (i, j) is the sum of the weights (1 by default) of the rows having
+        column i of self and column j of other. Each row is expanded into the pairs
+        of its entries, a block of rows at a time
+        """
+        if not np.array_equal(self.row_labels, other.row_labels):
+            raise ValueError("The matrices must have the same rows")
+        columns = self.shape[1] * other.shape[1]
+        result = np.zeros(columns)
+        self_counts = np.diff(self.indptr)
+        other_counts = np.diff(other.indptr)
+        pairs = np.cumsum(self_counts * other_counts)
+
+        start = 0
+        while start < len(self_counts):
+            limit = (pairs[start - 1] if start else 0) + block_pairs
+            end = max(int(np.searchsorted(pairs, limit, side="right")), start + 1)
+            rows = np.arange(start, end)
+
+            # Entries of self in the block, each repeated once per entry of other in its row
+            entry_rows = np.repeat(rows, self_counts[start:end])
+            entries = np.arange(self.indptr[start], self.indptr[end])
+            repeats = other_counts[entry_rows]
+            left = self.indices[np.repeat(entries, repeats)]
+
+            # Matching entries of other: its row offset plus the rank within the repeat group
+            group_starts = np.repeat(np.cumsum(repeats) - repeats, repeats)
+            ranks = np.arange(len(left)) - group_starts
+            right = other.indices[np.repeat(other.indptr[entry_rows], repeats) + ranks]
+
+            row_weights = None if weights is None else np.repeat(np.asarray(weights, dtype=np.float64)[entry_rows], repeats)
+            result += np.bincount(left.astype(np.int64) * other.shape[1] + right, weights=row_weights, minlength=columns)
+            start = end
+
+        return result.reshape(self.shape[1], other.shape[1])
+
+def build_incidence(row_values, column_values, row_labels=None):
+    """
+    Incidence matrix of a relation given as pairs (rows and columns sorted,
+    pairs with a missing value dropped, duplicate pairs stored once)
+    row_labels fixes the rows (e.g. to align several matrices), pairs of other rows are dropped
+    """
+    pairs = pd.DataFrame({'row': row_values, 'column': column_values}).dropna()
+    if row_labels is None:
+        row_codes, row_labels = pd.factorize(pairs["row"], sort=True)
+    else:
+        row_labels = pd.Index(row_labels)
+        row_codes = row_labels.get_indexer(pairs["row"])
+        pairs, row_codes = pairs[row_codes >= 0], row_codes[row_codes >= 0]
+    column_codes, column_labels = pd.factorize(pairs["column"], sort=True)
+
+    # Sort by (row, column) and drop duplicate pairs
+    keys = np.unique(row_codes.astype(np.int64) * len(column_labels) + column_codes)
+    rows, columns = np.divmod(keys, len(column_labels)) if len(column_labels) else (keys, keys)
+
+    indptr = np.zeros(len(row_labels) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(row_labels)), out=indptr[1:])
+    return IncidenceMatrix(indptr, columns.astype(np.int32), np.asarray(row_labels), np.asarray(column_labels))
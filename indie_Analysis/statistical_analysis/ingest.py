@@ -0,0 +1,373 @@
+# analysis/ingest.py
+
+import csv
+import io
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from django.conf import settings
+from .datasets import get_snapshot
+from .sanitizer import CLEAN_OPTIONS, is_fresh, read_stats, sanitize_csv
+
+# CSV sources of the dataset (file names inside a snapshot) and how to parse them
+CSV_SOURCES = {
+    'games': {
+        'path': "games.csv",
+        'options': dict(
+            sep=',',
+            quotechar='"',
+            escapechar='\\',
+            on_bad_lines="skip",
+            engine='python'
+        ),
+    },
+    'genres': {
+        'path': "genres.csv",
+        'options': dict(
+            sep=",",
+            quotechar='"',
+            engine="python"
+        ),
+    },
+    'tags': {
+        'path': "tags.csv",
+        'options': dict(
+            sep=",",
+            quotechar='"',
+            engine="python"
+        ),
+    },
+    'reviews': {
+        'path': "reviews.csv",
+        'options': dict(
+            sep=",",
+            engine="python",
+            quoting=3,
+            escapechar="\\",
+            on_bad_lines="skip",
+            encoding="utf-8",
+        ),
+    },
+}
+
+# Files are scanned in blocks of this size when looking for record boundaries
+SCAN_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Bytes read from the head of a sharded file to infer the column types of every shard
+DTYPE_SAMPLE_BYTES = 1024 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_worker_count():
+    """Number of worker processes used for ingest (defaults to the number of cores)"""
+    workers = getattr(settings, "DATAPLAY_INGEST_WORKERS", None)
+    return max(1, workers or os.cpu_count() or 1)
+
+def get_shard_size():
+    """Files larger than this are split into byte-range shards"""
+    return getattr(settings, "DATAPLAY_INGEST_SHARD_BYTES", 64 * 1024 * 1024)
+
+def get_clean_dir():
+    """Directory of the sanitized CSV files (None = parse the raw files with the python engine)"""
+    return getattr(settings, "DATAPLAY_CLEAN_DIR", None)
+
+def get_csv_engine():
+    """Parser used for sanitized files: 'c' or 'pyarrow'"""
+    return getattr(settings, "DATAPLAY_CSV_ENGINE", "c")
+
+def source_path(name):
+    """Path of the raw file of a source in the active snapshot"""
+    return get_snapshot().file(CSV_SOURCES[name]['path'])
+
+def clean_paths(name):
+    """Return the sanitized file and the quarantine file of a source (one directory per snapshot)"""
+    clean_dir = os.path.join(get_clean_dir(), get_snapshot().id)
+    return (
+        os.path.join(clean_dir, f"{name}.csv"),
+        os.path.join(clean_dir, f"{name}.rejects.csv"),
+    )
+
+def _get_pool():
+    """Return the shared process pool (created on first use)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=get_worker_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+def _quote_settings(options):
+    """Return (quotechar, escapechar) as bytes, quotechar is None when quoting is disabled"""
+    if options.get('quoting') == 3:
+        return None, None
+    quotechar = options.get('quotechar', '"').encode()
+    escapechar = options.get('escapechar')
+    return quotechar, escapechar.encode() if escapechar else None
+
+def _escaped_quotes(quotechar, escapechar):
+    """Pattern of a quote escaped by an odd run of escape characters"""
+    escape, quote = re.escape(escapechar), re.escape(quotechar)
+    return re.compile(b"(?<!" + escape + b")(?:" + escape + escape + b")*" + escape + quote)
+
+def _count_quotes(block, quotechar, escapechar, escaped_first):
+    """
+    Count the quotes of a block that toggle the quoted state
+    A quote is escaped when an odd number of escape characters precede it
+    (an even run such as \\\\" escapes the escape characters, not the quote)
+    escaped_first tells whether the previous block ended on an unpaired escape character
+    """
+    count = block.count(quotechar)
+    if escapechar:
+        count -= len(_escaped_quotes(quotechar, escapechar).findall(block))
+        if escaped_first:
+            # The leading run of escape characters is one longer than it looks
+            run = len(block) - len(block.lstrip(escapechar))
+            if block[run:run + 1] == quotechar:
+                count += 1 if run % 2 else -1
+    return count
+
+def _ends_escaped(block, escapechar, escaped_first):
+    """Whether a block ends on an unpaired escape character (escaping the next byte)"""
+    run = len(block) - len(block.rstrip(escapechar))
+    if run == len(block) and escaped_first:
+        run += 1
+    return run % 2 == 1
+
+def find_record_boundaries(path, shards, quotechar=b'"', escapechar=None):
+    """
+    Split a CSV file into byte ranges that start and end on record boundaries
+    A newline only ends a record when it is outside a quoted field
+    Returns a list of (start, end) offsets, the header line is excluded
+    """
+    size = os.path.getsize(path)
+
+    with open(path, "rb") as f:
+        header_end = len(f.readline())
+        if shards <= 1 or size - header_end <= 0:
+            return [(header_end, size)]
+
+        step = (size - header_end) // shards
+        targets = [header_end + step * i for i in range(1, shards)]
+        boundaries = [header_end]
+
+        f.seek(0)
+        block_start = 0
+        in_quotes = False
+        escaped_first = False
+
+        while targets:
+            block = f.read(SCAN_BLOCK_SIZE)
+            if not block:
+                break
+            block_end = block_start + len(block)
+
+            while targets and targets[0] < block_end:
+                pos = max(targets[0], boundaries[-1]) - block_start
+                newline = block.find(b"\n", pos)
+                if newline == -1:
+                    # Keep looking in the next block
+                    targets[0] = block_end
+                    break
+
+                if quotechar is not None:
+                    quotes = _count_quotes(block[:newline], quotechar, escapechar, escaped_first)
+                    if (quotes % 2 == 1) != in_quotes:
+                        targets[0] = block_start + newline + 1
+                        continue
+
+                boundaries.append(block_start + newline + 1)
+                targets.pop(0)
+
+            if quotechar is not None:
+                quotes = _count_quotes(block, quotechar, escapechar, escaped_first)
+                in_quotes = (quotes % 2 == 1) != in_quotes
+                escaped_first = escapechar is not None and _ends_escaped(block, escapechar, escaped_first)
+            block_start = block_end
+
+    boundaries = sorted(set(b for b in boundaries if b < size))
+    return list(zip(boundaries, boundaries[1:] + [size]))
+
+def _read_header(path, options):
+    """Read the column names of a CSV file"""
+    if options.get('engine') == 'pyarrow':
+        with open(path, newline='', encoding='utf-8') as f:
+            return next(csv.reader(f))
+    return list(pd.read_csv(path, nrows=0, **options).columns)
+
+def _parse_file(path, options):
+    return pd.read_csv(path, **options)
+
+def _infer_dtypes(path, start, columns, options):
+    """
+    Infer the column types of a sharded file once, from its first records
+    Numeric columns are read as float by every shard (a later shard may have
+    missing values), other inferred columns (e.g. text) keep the sampled type
+    Returns the dtype mapping of the shards and the columns sampled as integers
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(DTYPE_SAMPLE_BYTES)
+    sample = pd.read_csv(io.BytesIO(data[:data.rfind(b"\n") + 1]), header=None, names=columns, **options)
+    if len(data) == DTYPE_SAMPLE_BYTES:
+        # The last record read may be cut
+        sample = sample.iloc[:-1]
+    if sample.empty:
+        return None, []
+
+    dtypes = {}
+    integers = []
+    for column, dtype in sample.dtypes.items():
+        if pd.api.types.is_integer_dtype(dtype):
+            dtypes[column] = "float64"
+            integers.append(column)
+        elif pd.api.types.is_float_dtype(dtype):
+            dtypes[column] = "float64"
+        elif pd.api.types.is_object_dtype(dtype):
+            dtypes[column] = object
+    return dtypes, integers
+
+def _parse_shard(path, start, end, columns, options, dtypes=None):
+    """Parse the records between two byte offsets of a CSV file, with the types of the file"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    try:
+        return pd.read_csv(io.BytesIO(data), header=None, names=columns, dtype=dtypes, **options)
+    except (ValueError, TypeError):
+        # A value that does not fit the sampled type: this shard infers its numeric types
+        text_dtypes = {column: dtype for column, dtype in (dtypes or {}).items() if dtype is object}
+        return pd.read_csv(io.BytesIO(data), header=None, names=columns, dtype=text_dtypes, **options)
+
+def _restore_integers(frame, integers):
+    """Turn the columns sampled as integers back into integers when no value is missing"""
+    for column in integers:
+        values = frame[column]
+        if pd.api.types.is_float_dtype(values) and values.notna().all() and (values % 1 == 0).all():
+            frame[column] = values.astype("int64")
+    return frame
+
+def _source_file(name):
+    """Return the file to parse for a source and its read options"""
+    if get_clean_dir() is None:
+        return source_path(name), CSV_SOURCES[name]['options']
+    return clean_paths(name)[0], dict(CLEAN_OPTIONS, engine=get_csv_engine())
+
+def _plan_file(path, options):
+    """
+    Return the parse tasks of a CSV file (one per shard) and the columns
+    to turn back into integers once the shards are concatenated
+    """
+    size = os.path.getsize(path)
+    shards = min(get_worker_count(), -(-size // get_shard_size()))
+    if shards <= 1:
+        return [(_parse_file, (path, options))], []
+
+    quotechar, escapechar = _quote_settings(options)
+    columns = _read_header(path, options)
+    boundaries = find_record_boundaries(path, shards, quotechar, escapechar)
+    dtypes, integers = _infer_dtypes(path, boundaries[0][0], columns, options)
+    tasks = [
+        (_parse_shard, (path, start, end, columns, options, dtypes))
+        for start, end in boundaries
+    ]
+    return tasks, integers
+
+def _plan(name):
+    """Return the parse tasks of a source and its integer columns (see _plan_file)"""
+    return _plan_file(*_source_file(name))
+
+def sanitize_sources(names, force=False):
+    """
+    Sanitize the raw files of several sources (in parallel), skipping fresh ones
+    Returns a dict name -> statistics of the pass
+    """
+    stale = [
+        name for name in names
+        if force or not is_fresh(source_path(name), clean_paths(name)[0])
+    ]
+    tasks = [
+        (source_path(name), *clean_paths(name), CSV_SOURCES[name]['options'])
+        for name in stale
+    ]
+
+    if get_worker_count() <= 1 or len(tasks) <= 1:
+        for args in tasks:
+            sanitize_csv(*args)
+    else:
+        pool = _get_pool()
+        for future in [pool.submit(sanitize_csv, *args) for args in tasks]:
+            future.result()
+
+    return {name: read_stats(clean_paths(name)[0]) for name in names}
+
+def read_csv_sources(names):
+    """
+    Parse several CSV sources concurrently
+    Raw files are sanitized first when DATAPLAY_CLEAN_DIR is set
+    Large files are split into shards parsed in parallel, then concatenated in order
+    Returns a dict name -> DataFrame
+    """
+    if get_clean_dir() is not None:
+        sanitize_sources(names)
+
+    plans = {}
+    integers = {}
+    for name in names:
+        plans[name], integers[name] = _plan(name)
+
+    if get_worker_count() <= 1 or sum(len(tasks) for tasks in plans.values()) <= 1:
+        parts = {
+            name: [func(*args) for func, args in tasks]
+            for name, tasks in plans.items()
+        }
+    else:
+        pool = _get_pool()
+        futures = {
+            name: [pool.submit(func, *args) for func, args in tasks]
+            for name, tasks in plans.items()
+        }
+        parts = {
+            name: [future.result() for future in name_futures]
+            for name, name_futures in futures.items()
+        }
+
+    return {
+        name: frames[0] if len(frames) == 1 else _restore_integers(pd.concat(frames, ignore_index=True), integers[name])
+        for name, frames in parts.items()
+    }
+
+def read_csv_source(name):
+    """Parse a single CSV source (sharded when it is large)"""
+    return read_csv_sources([name])[name]
+
+def _map_shard(parse, args, integers, func, func_args):
+    """Parse one shard and return func(frame, *func_args), the frame itself is not sent back"""
+    return func(_restore_integers(parse(*args), integers), *func_args)
+
+def map_csv_source(name, func, *args, path=None):
+    """
+    Apply func(frame, *args) to every shard of a source in the process pool
+    Only the results travel back, so the file is never held in memory at once
+    path parses another file in the format of the raw source (e.g. a delta
+    file holding only new rows)
+    Returns the results in shard order
+    """
+    if path is None:
+        if get_clean_dir() is not None:
+            sanitize_sources([name])
+        path, options = _source_file(name)
+    else:
+        options = CSV_SOURCES[name]['options']
+
+    tasks, integers = _plan_file(path, options)
+    if get_worker_count() <= 1 or len(tasks) <= 1:
+        return [_map_shard(parse, parse_args, integers, func, args) for parse, parse_args in tasks]
+    pool = _get_pool()
+    futures = [pool.submit(_map_shard, parse, parse_args, integers, func, args) for parse, parse_args in tasks]
+    return [future.result() for future in futures]
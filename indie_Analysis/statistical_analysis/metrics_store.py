@@ -0,0 +1,103 @@
+# analysis/metrics_store.py
+
+import hashlib
+import os
+import shutil
+import numpy as np
+from django.conf import settings
+from .datasets import get_snapshot
+
+# Review metrics kept in the store (one .npy file per column)
+METRIC_COLUMNS = ["positive", "negative", "total", "recommendations", "metacritic_score"]
+
+def get_store_root():
+    """Directory of the stores of the active snapshot"""
+    root = getattr(settings, "DATAPLAY_METRICS_DIR", None) or "metrics_store"
+    return os.path.join(root, get_snapshot().id)
+
+def store_path(version):
+    """Directory of the store built for a dataset version"""
+    key = hashlib.sha1(version.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(get_store_root(), key)
+
+def build_metrics_store(reviews_df, directory):
+    """
+    Write the review metrics as NumPy columns sorted by app_id
+    When an app_id appears several times, the last row wins
+    """
+    reviews = reviews_df.drop_duplicates(subset="app_id", keep="last").sort_values("app_id")
+
+    tmp_directory = f"{directory}.{os.getpid()}.tmp"
+    os.makedirs(tmp_directory, exist_ok=True)
+    np.save(os.path.join(tmp_directory, "app_id.npy"), reviews["app_id"].to_numpy(dtype=np.int64))
+    for column in METRIC_COLUMNS:
+        if column in reviews.columns:
+            values = reviews[column].to_numpy(dtype=np.float64)
+        else:
+            values = np.full(len(reviews), np.nan)
+        np.save(os.path.join(tmp_directory, f"{column}.npy"), values)
+
+    try:
+        os.rename(tmp_directory, directory)
+    except OSError:
+        # Another worker built the same store first
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+
+def remove_old_stores(keep):
+    """Delete the stores of other versions of the snapshot (open maps stay valid)"""
+    root = get_store_root()
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if path != keep and not name.endswith(".tmp"):
+            shutil.rmtree(path, ignore_errors=True)
+
+class MetricsStore:
+    """
+    Read-only review metrics, memory-mapped and indexed by sorted app_id
+    The pages are shared by every process that opens the same store
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.app_ids = np.load(os.path.join(directory, "app_id.npy"), mmap_mode="r")
+        self.columns = {
+            column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode="r")
+            for column in METRIC_COLUMNS
+        }
+
+    def __len__(self):
+        return len(self.app_ids)
+
+    def positions(self, app_ids):
+        """Return the positions of app_ids in the store and a mask of the ones found"""
+        app_ids = np.asarray(app_ids, dtype=np.int64)
+        positions = np.searchsorted(self.app_ids, app_ids)
+        positions = np.minimum(positions, max(len(self.app_ids) - 1, 0))
+        found = (self.app_ids[positions] == app_ids) if len(self.app_ids) else np.zeros(len(app_ids), bool)
+        return positions, found
+
+    def lookup(self, app_ids, column, fill=np.nan):
+        """Return a metric for many app_ids (fill where the game has no reviews)"""
+        positions, found = self.positions(app_ids)
+        values = np.full(len(positions), fill, dtype=np.float64)
+        values[found] = self.columns[column][positions[found]]
+        return values
+
+    def get(self, app_id):
+        """Return all metrics of one game, or None"""
+        positions, found = self.positions([app_id])
+        if not found[0]:
+            return None
+        return {column: float(values[positions[0]]) for column, values in self.columns.items()}
+
+def open_metrics_store(load_reviews, version):
+    """
+    Open the store of a dataset version, building it first if needed
+    load_reviews returns the reviews frame, it is only called to build the store
+    """
+    directory = store_path(version)
+    if not os.path.exists(os.path.join(directory, "app_id.npy")):
+        os.makedirs(get_store_root(), exist_ok=True)
+        build_metrics_store(load_reviews(), directory)
+        remove_old_stores(keep=directory)
+    return MetricsStore(directory)
@@ -0,0 +1,137 @@
+# analysis/object_cache.py
+
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+def value_nbytes(value, _seen=None):
+    """
+    Approximate memory held by a value (deep: strings in object columns are counted)
+    Objects reachable several times are counted once, memory-mapped arrays are not counted
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.memmap):
+        return 0
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            value_nbytes(k, seen) + value_nbytes(v, seen) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(value_nbytes(item, seen) for item in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + value_nbytes(vars(value), seen)
+    return sys.getsizeof(value)
+
+def freeze(value, _seen=None):
+    """
+    Make the numpy arrays of a value read-only (deep, like value_nbytes)
+    Writes to a shared value then raise instead of changing it for every caller
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return value
+    seen.add(id(value))
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        for array in value._mgr.arrays:
+            freeze(array, seen)
+    elif isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, dict):
+        for item in value.values():
+            freeze(item, seen)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            freeze(item, seen)
+    return value
+
+class ObjectCache:
+    """
+    In-process cache handing out the stored objects themselves (no pickling)
+    Cached values are shared between callers, their numpy arrays are made read-only
+    Least recently used entries are evicted when their total size exceeds the budget
+    The budget only frees memory if the cache is the last owner of the evicted values
+    """
+
+    def __init__(self, max_bytes=None):
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, nbytes, expires_at)
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return getattr(settings, "DATAPLAY_OBJECT_CACHE_BYTES", None)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the cached values"""
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, _, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._pop(key)
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        """Store a value for timeout seconds (None = until evicted)"""
+        nbytes = value_nbytes(value)
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            self._pop(key)
+            max_bytes = self.max_bytes
+            if max_bytes is not None and nbytes > max_bytes:
+                # Larger than the whole budget: not cached
+                logger.warning("Not caching %s: %d bytes, over the %d bytes budget", key, nbytes, max_bytes)
+                return
+            self._entries[key] = (freeze(value), nbytes, expires_at)
+            self._nbytes += nbytes
+            while max_bytes is not None and self._nbytes > max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def _pop(self, key):
+        # Called with _lock held
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._nbytes -= entry[1]
+
+# Loaded dataset frames, shared by all requests of the process
+dataset_cache = ObjectCache()
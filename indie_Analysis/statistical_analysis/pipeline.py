@@ -0,0 +1,282 @@
+# analysis/pipeline.py
+
+import hashlib
+import importlib
+import inspect
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from .data_loader import get_dataset_files, get_dataset_version
+from .datasets import get_snapshot, use_snapshot
+from .object_cache import value_nbytes
+
+# Registered derived frames: name -> Node
+NODES = {}
+
+# Modules declaring nodes, imported when a node is not registered yet
+NODE_MODULES = (
+    "statistical_analysis.q1_analysis",
+    "statistical_analysis.q2_analysis",
+    "statistical_analysis.q3_analysis",
+    "statistical_analysis.search",
+    "statistical_analysis.sketches",
+    "statistical_analysis.quantiles",
+    "statistical_analysis.export",
+    "statistical_analysis.explorer",
+    "statistical_analysis.cube",
+    "statistical_analysis.cooccurrence",
+)
+
+# Computed values: (snapshot ID, name) -> (dataset version, value)
+_results = {}
+_results_lock = threading.Lock()
+_node_locks = {}
+
+# Approximate bytes held by each computed value, and by each snapshot
+# (snapshots ordered from least to most recently used)
+_value_bytes = {}
+_snapshot_bytes = OrderedDict()
+
+# Content hash of the dataset files, per dataset version
+_source_hashes = {}
+
+# Format of the checkpoint files, bumped to discard every checkpoint written before
+CHECKPOINT_FORMAT = 2
+
+class Node:
+    """A named derived frame computed from its dependencies"""
+
+    def __init__(self, name, func, deps=(), checkpoint=False, code_version=None, versioned_by=(), code=(), warm=False):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.checkpoint = checkpoint
+        # Computed in the background as soon as one of its dependencies is
+        self.warm = warm
+        # Source of the node function and of the functions it calls, plus the explicit version
+        self.code_version = _source_code_hash((func,) + tuple(code), code_version)
+        # Extra inputs besides the dataset (e.g. the exchange rates), as version functions
+        self.versioned_by = tuple(versioned_by)
+
+    def __repr__(self):
+        return f"Node({self.name!r}, deps={self.deps!r})"
+
+def _source_code_hash(funcs, code_version=None):
+    """Hash the source code of a node function and of the functions it calls"""
+    digest = hashlib.sha1()
+    for func in funcs:
+        try:
+            source = inspect.getsource(func)
+        except (OSError, TypeError):
+            source = f"{func.__module__}.{func.__qualname__}"
+        digest.update(source.encode("utf-8"))
+    if code_version is not None:
+        digest.update(f"version:{code_version}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def node(name, deps=(), checkpoint=False, code_version=None, versioned_by=(), code=(), warm=False):
+    """
+    Register a derived frame in the pipeline
+    The decorated function receives the values of its dependencies, in order
+    versioned_by lists functions returning the version of other inputs of the node
+    code lists the functions called by the node (e.g. a loader), their source is part
+    of the code version, code_version can be bumped when something else changes
+    warm nodes are computed in a background thread once a dependency is computed,
+    so the first request needing them does not pay for the build
+    """
+    def decorator(func):
+        NODES[name] = Node(name, func, deps, checkpoint, code_version, versioned_by, code, warm)
+        return func
+    return decorator
+
+def _node_lock(key):
+    with _results_lock:
+        if key not in _node_locks:
+            _node_locks[key] = threading.RLock()
+        return _node_locks[key]
+
+def compute(name):
+    """
+    Return the value of a node for the active snapshot (see datasets.use_snapshot)
+    Each node is computed at most once per dataset version
+    """
+    snapshot_id = get_snapshot().id
+    with _results_lock:
+        if snapshot_id in _snapshot_bytes:
+            _snapshot_bytes.move_to_end(snapshot_id)
+    return _compute(name, snapshot_id, get_dataset_version(), {})
+
+def _get_node(name):
+    if name not in NODES:
+        for module in NODE_MODULES:
+            importlib.import_module(module)
+    if name not in NODES:
+        raise KeyError(f"Unknown pipeline node: {name}")
+    return NODES[name]
+
+def _input_versions(name, memo):
+    """
+    Versions of the extra inputs of a node and of its dependencies
+    memo maps the nodes and version functions already seen to their versions,
+    so each version function is called once per compute() (e.g. one stat of the rates file)
+    """
+    if name not in memo:
+        current = _get_node(name)
+        versions = []
+        for version_func in current.versioned_by:
+            if version_func not in memo:
+                memo[version_func] = str(version_func())
+            versions.append(memo[version_func])
+        for dep in current.deps:
+            versions.extend(_input_versions(dep, memo))
+        memo[name] = versions
+    return memo[name]
+
+def _compute(name, snapshot_id, version, memo):
+    key = (snapshot_id, name)
+    node_version = "|".join([version] + _input_versions(name, memo))
+    cached = _results.get(key)
+    if cached is not None and cached[0] == node_version:
+        return cached[1]
+
+    with _node_lock(key):
+        # Another thread may have computed it while we were waiting
+        cached = _results.get(key)
+        if cached is not None and cached[0] == node_version:
+            return cached[1]
+
+        # The checkpoint key only depends on the versions of the dependencies,
+        # so they are only computed when the checkpoint is missing
+        current = NODES[name]
+        path = _checkpoint_path(current, version)
+        value = _read_checkpoint(path)
+        if value is None:
+            inputs = [_compute(dep, snapshot_id, version, memo) for dep in current.deps]
+            value = current.func(*inputs)
+            _write_checkpoint(path, value)
+
+        _store(key, node_version, value)
+
+    _warm_dependents(name, snapshot_id)
+    return value
+
+def _warm_dependents(name, snapshot_id):
+    """Start computing the warm nodes that depend on name, in the background"""
+    for other in list(NODES.values()):
+        if other.warm and name in other.deps:
+            threading.Thread(
+                target=_warm, args=(other.name, snapshot_id), daemon=True, name=f"warm-{other.name}",
+            ).start()
+
+def _warm(name, snapshot_id):
+    with use_snapshot(snapshot_id):
+        compute(name)
+
+def invalidate(name=None):
+    """Forget computed values (all nodes when name is None), in every snapshot"""
+    with _results_lock:
+        keys = [key for key in _results if name is None or key[1] == name]
+        for key in keys:
+            _forget(key)
+
+# Memory budget
+
+def get_memory_budget():
+    """Bytes the computed values of all snapshots may hold (None = no limit)"""
+    return getattr(settings, "DATAPLAY_SNAPSHOT_MEMORY_BYTES", None)
+
+def _forget(key):
+    # Called with _results_lock held
+    _results.pop(key, None)
+    size = _value_bytes.pop(key, 0)
+    snapshot_id = key[0]
+    if snapshot_id in _snapshot_bytes:
+        _snapshot_bytes[snapshot_id] -= size
+        if not any(k[0] == snapshot_id for k in _results):
+            del _snapshot_bytes[snapshot_id]
+
+def _store(key, node_version, value):
+    """Keep a computed value, then evict least recently used snapshots over the budget"""
+    size = value_nbytes(value)
+    snapshot_id = key[0]
+    with _results_lock:
+        _forget(key)
+        _results[key] = (node_version, value)
+        _value_bytes[key] = size
+        _snapshot_bytes[snapshot_id] = _snapshot_bytes.get(snapshot_id, 0) + size
+        _snapshot_bytes.move_to_end(snapshot_id)
+
+        budget = get_memory_budget()
+        while budget is not None and sum(_snapshot_bytes.values()) > budget:
+            # The snapshot being computed is never evicted
+            victims = [other for other in _snapshot_bytes if other != snapshot_id]
+            if not victims:
+                break
+            for other_key in [k for k in _results if k[0] == victims[0]]:
+                _forget(other_key)
+
+def memory_usage():
+    """Approximate bytes held per snapshot, least recently used first"""
+    with _results_lock:
+        return dict(_snapshot_bytes)
+
+# Checkpoints
+
+def _checkpoint_dir():
+    return getattr(settings, "DATAPLAY_CHECKPOINT_DIR", None)
+
+def _source_hash(version):
+    """Hash the content of the dataset files (computed once per dataset version)"""
+    if version not in _source_hashes:
+        digest = hashlib.sha1()
+        for path in get_dataset_files():
+            if not os.path.exists(path):
+                continue
+            digest.update(os.path.basename(path).encode("utf-8"))
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        _source_hashes[version] = digest.hexdigest()
+    return _source_hashes[version]
+
+def checkpoint_key(name, version):
+    """
+    Key of a node checkpoint
+    Combines the source hash with the code version of the node and of its dependencies
+    """
+    current = NODES[name]
+    digest = hashlib.sha1()
+    digest.update(f"format:{CHECKPOINT_FORMAT}".encode("utf-8"))
+    digest.update(_source_hash(version).encode("utf-8"))
+    digest.update(f"{name}:{current.code_version}".encode("utf-8"))
+    for version_func in current.versioned_by:
+        digest.update(str(version_func()).encode("utf-8"))
+    for dep in current.deps:
+        digest.update(checkpoint_key(dep, version).encode("utf-8"))
+    return digest.hexdigest()
+
+def _checkpoint_path(current, version):
+    directory = _checkpoint_dir()
+    if not directory or not current.checkpoint:
+        return None
+    return os.path.join(directory, f"{current.name}-{checkpoint_key(current.name, version)}.pkl")
+
+def _read_checkpoint(path):
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+def _write_checkpoint(path, value):
+    if path is None:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
@@ -2,9 +2,13 @@
 
 import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-from django.core.cache import cache
-from util.chart_config import COLORS, get_base_layout, get_axis_style
+from .data_loader import clean_column_names, dataset_cache_key, get_dataset_version
+from .incidence import build_incidence
+from .metrics_store import open_metrics_store
+from .object_cache import dataset_cache
+from .pipeline import node, compute
+from .sketches import get_sketches, sketch_mode_enabled
+from util.chart_config import COLORS, get_base_layout, get_axis_style, render_chart
 
 # Excluded genres and canonical mappings
 EXCLUDED_GENRES = {
@@ -39,61 +43,29 @@ def normalize_genre(raw_genre):
                 return canonical
     return None
 
-def load_q1_data():
-    """Load and process genres, tags, and reviews data"""
-    cache_key = 'q1_data'
-    cached = cache.get(cache_key)
-    if cached:
-        return cached
-    
-    # Load CSVs
-    df = pd.read_csv(
-        "games.csv",
-        sep=',',
-        quotechar='"',
-        escapechar='\\',
-        on_bad_lines="skip",
-        engine='python'
-    )
-    
-    genres_df = pd.read_csv(
-        "genres.csv",
-        sep=",",
-        quotechar='"',
-        engine="python"
-    )
-    
-    tags_df = pd.read_csv(
-        "tags.csv",
-        engine="python",
-        sep=",",
-        quotechar='"'
-    )
-    
-    reviews_df = pd.read_csv(
-        "reviews.csv",
-        sep=",",
-        engine="python",
-        quoting=3,
-        escapechar="\\",
-        on_bad_lines="skip",
-        encoding="utf-8",
-    )
+def load_q1_data(sources, use_cache=True):
+    """
+    Process the genres data of the raw sources
+    Reviews are served by the metrics store, tags by the game x tag matrix
+    """
+    cache_key = dataset_cache_key('q1_data')
+    if use_cache:
+        cached = dataset_cache.get(cache_key)
+        if cached is not None:
+            return cached
     
     # Clean column names
-    df.columns = df.columns.str.strip().str.replace('"', '', regex=False)
-    reviews_df.columns = reviews_df.columns.str.replace('"', '', regex=False)
+    df = clean_column_names(sources['games'])
+    genres_df = sources['genres']
     
-    # Clean genres and tags
-    genres_df["genre"] = genres_df["genre"].str.strip()
-    tags_df["tag"] = tags_df["tag"].str.strip()
+    # Clean genres
+    genres_df = genres_df.assign(genre=genres_df["genre"].str.strip())
     
     # Get only games
     df_games = df[df["type"] == "game"][["app_id", "name"]].copy()
     
-    # Merge with genres and tags
+    # Merge with genres
     genres_indie = genres_df.merge(df_games, on="app_id", how="inner")
-    tags_indie = tags_df.merge(df_games, on="app_id", how="inner")
     
     # Filter and normalize genres
     genres_filtered = genres_indie[
@@ -102,7 +74,31 @@ def load_q1_data():
     genres_filtered["genre_normalized"] = genres_filtered["genre"].apply(normalize_genre)
     genres_clean = genres_filtered.dropna(subset=["genre_normalized"])
     
-    # Clean reviews data
+    # Cache for 1 hour
+    result = {
+        'genres_clean': genres_clean
+    }
+    if use_cache:
+        dataset_cache.set(cache_key, result, 3600)
+    
+    return result
+
+def load_tags_data(sources, app_ids):
+    """
+    Return the tags of the games (app_ids) from the raw sources
+    Only used to build the game x tag matrix, the frame itself is not cached
+    """
+    tags_df = sources['tags']
+    tags_df = tags_df[tags_df["app_id"].isin(app_ids)]
+    return tags_df.assign(tag=tags_df["tag"].str.strip())
+
+def load_reviews_data(sources):
+    """
+    Clean the reviews data of the raw sources
+    Only used to build the metrics store, the frame itself is not cached
+    """
+    reviews_df = clean_column_names(sources['reviews'])
+    
     for col in reviews_df.columns:
         reviews_df[col] = (
             reviews_df[col]
@@ -120,33 +116,35 @@ def load_q1_data():
     reviews_df = reviews_df.dropna(subset=["app_id"])
     reviews_df["app_id"] = reviews_df["app_id"].astype(int)
     
-    # Cache for 1 hour
-    result = {
-        'genres_clean': genres_clean,
-        'tags_indie': tags_indie,
-        'reviews_df': reviews_df
-    }
-    cache.set(cache_key, result, 3600)
-    
-    return result
+    return reviews_df
 
-def create_genre_popularity_weighted():
-    """Create chart showing genre popularity weighted by engagement (reviews)"""
-    data = load_q1_data()
+# Derived frames (computed once per dataset version)
+
+@node('q1_data', deps=['raw_sources'], checkpoint=True, code=[load_q1_data, normalize_genre])
+def q1_data_node(sources):
+    return load_q1_data(sources, use_cache=False)
+
+@node('metrics_store')
+def metrics_store_node():
+    """
+    Review metrics indexed by app_id (memory-mapped, shared between workers)
+    The raw sources are only computed when the store of the dataset version is not built yet
+    """
+    return open_metrics_store(lambda: load_reviews_data(compute('raw_sources')), get_dataset_version())
+
+@node('genre_popularity', deps=['q1_data', 'metrics_store'])
+def genre_popularity_node(data, store):
+    """Genre popularity weighted by engagement, most reviewed first"""
     genres_clean = data['genres_clean']
-    reviews_df = data['reviews_df']
-    
-    # Merge genres with reviews
-    genres_with_reviews = genres_clean.merge(
-        reviews_df[["app_id", "total"]],
-        on="app_id",
-        how="left"
-    )
     
-    genres_with_reviews["total"] = genres_with_reviews["total"].fillna(0)
+    # Look up the reviews of each game
+    genres_with_reviews = pd.DataFrame({
+        'genre_normalized': genres_clean["genre_normalized"].to_numpy(),
+        'app_id': genres_clean["app_id"].to_numpy(),
+        'total': np.nan_to_num(store.lookup(genres_clean["app_id"], "total", fill=0)),
+    })
     
-    # Calculate popularity
-    genre_popularity = (
+    return (
         genres_with_reviews
         .groupby("genre_normalized")
         .agg(
@@ -154,18 +152,38 @@ def create_genre_popularity_weighted():
             total_reviews=("total", "sum"),
             avg_reviews_per_game=("total", "mean")
         )
-        .sort_values("total_reviews", ascending=True)
+        .sort_values("total_reviews", ascending=False)
         .reset_index()
     )
+
+@node('genre_counts', deps=['q1_data'])
+def genre_counts_node(data):
+    """Number of games per genre, most common first"""
+    return data['genres_clean']["genre_normalized"].value_counts()
+
+@node('tag_matrix', deps=['raw_sources', 'games_raw'], code=[load_tags_data])
+def tag_matrix_node(sources, df_games):
+    """Game x tag incidence matrix (CSR, one entry per game and tag)"""
+    tags_df = load_tags_data(sources, df_games["app_id"])
+    return build_incidence(tags_df["app_id"], tags_df["tag"])
+
+@node('tag_counts', deps=['tag_matrix'])
+def tag_counts_node(matrix):
+    """Number of games per tag, most common first"""
+    counts = pd.Series(matrix.column_nnz(), index=pd.Index(matrix.column_labels, name="tag"), name="count")
+    return counts.sort_values(ascending=False, kind="stable")
+
+def create_genre_popularity_weighted():
+    """Create chart showing genre popularity weighted by engagement (reviews)"""
+    genre_popularity = compute('genre_popularity').sort_values("total_reviews", ascending=True)
     
     # Create colors - highlight top 3
     colors = [COLORS['primary_blue']] * len(genre_popularity)
     for i in range(max(0, len(colors) - 3), len(colors)):
         colors[i] = COLORS['accent_blue']
     
-    fig = go.Figure()
-    
-    fig.add_trace(go.Bar(
+    trace = dict(
+        type='bar',
         y=genre_popularity["genre_normalized"],
         x=genre_popularity["total_reviews"],
         orientation='h',
@@ -179,7 +197,7 @@ def create_genre_popularity_weighted():
         hovertemplate='<b>%{y}</b><br>' +
                       'Total Reviews: %{x:,}<br>' +
                       '<extra></extra>',
-    ))
+    )
     
     layout = get_base_layout('Popularité des Genres Indie (Pondérée par l\'Engagement)', height=600)
     layout['xaxis'] = get_axis_style('Nombre total de reviews (engagement des joueurs)')
@@ -187,21 +205,12 @@ def create_genre_popularity_weighted():
     layout['showlegend'] = False
     layout['margin'] = dict(t=80, b=60, l=150, r=100)
     
-    fig.update_layout(**layout)
-    
-    return fig.to_html(include_plotlyjs='cdn', div_id='genre-weighted-chart')
+    return render_chart([trace], layout, 'genre-weighted-chart')
 
 def create_genre_count_chart():
     """Create chart showing genre popularity by game count"""
-    data = load_q1_data()
-    genres_clean = data['genres_clean']
-    
     # Count games per genre
-    genre_counts = (
-        genres_clean["genre_normalized"]
-        .value_counts()
-        .reset_index()
-    )
+    genre_counts = compute('genre_counts').reset_index()
     genre_counts.columns = ["genre", "game_count"]
     genre_counts = genre_counts.sort_values("game_count", ascending=True)
     
@@ -210,9 +219,8 @@ def create_genre_count_chart():
               for i in range(len(genre_counts))]
     colors[-1] = COLORS['accent_blue']  # Highlight top genre
     
-    fig = go.Figure()
-    
-    fig.add_trace(go.Bar(
+    trace = dict(
+        type='bar',
         y=genre_counts["genre"],
         x=genre_counts["game_count"],
         orientation='h',
@@ -226,7 +234,7 @@ def create_genre_count_chart():
         hovertemplate='<b>%{y}</b><br>' +
                       'Nombre de jeux: %{x:,}<br>' +
                       '<extra></extra>',
-    ))
+    )
     
     layout = get_base_layout('Popularité des Genres de Jeux Indie', height=600)
     layout['xaxis'] = get_axis_style('Nombre de jeux indie')
@@ -234,21 +242,18 @@ def create_genre_count_chart():
     layout['showlegend'] = False
     layout['margin'] = dict(t=80, b=60, l=150, r=100)
     
-    fig.update_layout(**layout)
-    
-    return fig.to_html(include_plotlyjs='cdn', div_id='genre-count-chart')
+    return render_chart([trace], layout, 'genre-count-chart')
 
 def create_top_tags_chart():
     """Create chart showing top 20 most popular tags"""
-    data = load_q1_data()
-    tags_indie = data['tags_indie']
-    
-    # Count tags
-    tag_counts = (
-        tags_indie["tag"]
-        .value_counts()
-        .reset_index()
-    )
+    # Count tags (estimated from the sketches in sketch mode)
+    error_bound = None
+    if sketch_mode_enabled():
+        sketches = get_sketches()
+        tag_counts = sketches.top_tags(20).reset_index()
+        error_bound, probability = sketches.tag_error()
+    else:
+        tag_counts = compute('tag_counts').reset_index()
     tag_counts.columns = ["tag", "game_count"]
     top_tags = tag_counts.head(20)
     
@@ -257,9 +262,8 @@ def create_top_tags_chart():
     colors = [COLORS['accent_blue'] if count > max_count * 0.7 
               else COLORS['primary_blue'] for count in top_tags["game_count"]]
     
-    fig = go.Figure()
-    
-    fig.add_trace(go.Bar(
+    trace = dict(
+        type='bar',
         x=top_tags["tag"],
         y=top_tags["game_count"],
         marker=dict(
@@ -272,53 +276,83 @@ def create_top_tags_chart():
         hovertemplate='<b>%{x}</b><br>' +
                       'Nombre de jeux: %{y:,}<br>' +
                       '<extra></extra>',
-    ))
+    )
+    
+    title = 'Top 20 des Tags les Plus Populaires'
+    if error_bound is not None:
+        # Count-Min never undercounts: the true count is at most error_bound below the estimate
+        trace['error_y'] = dict(
+            type='constant', symmetric=False, value=0, valueminus=error_bound,
+            color=COLORS['text_light'], thickness=1,
+        )
+        trace['hovertemplate'] = ('<b>%{x}</b><br>' +
+                                  'Nombre de jeux (estimé): %{y:,}<br>' +
+                                  f'Surestimation max: {error_bound:,.0f} (probabilité {probability:.1%})<br>' +
+                                  '<extra></extra>')
+        title += f' (estimation Count-Min, ≤ {error_bound:,.0f} jeux en trop)'
     
-    layout = get_base_layout('Top 20 des Tags les Plus Populaires', height=600)
+    layout = get_base_layout(title, height=600)
     layout['xaxis'] = get_axis_style('Tag', grid=False)
     layout['xaxis']['tickangle'] = -45
     layout['yaxis'] = get_axis_style('Nombre de jeux indie')
     layout['showlegend'] = False
     layout['margin'] = dict(t=80, b=150, l=60, r=40)
     
-    fig.update_layout(**layout)
-    
-    return fig.to_html(include_plotlyjs='cdn', div_id='tags-chart')
+    return render_chart([trace], layout, 'tags-chart')
 
-def get_q1_statistics():
-    """Calculate Q1 statistics"""
-    data = load_q1_data()
-    genres_clean = data['genres_clean']
-    tags_indie = data['tags_indie']
-    reviews_df = data['reviews_df']
-    
-    # Merge for weighted stats
-    genres_with_reviews = genres_clean.merge(
-        reviews_df[["app_id", "total"]],
-        on="app_id",
-        how="left"
+def create_genre_tag_heatmap(top_tags=15):
+    """Create heatmap of the engagement of the games pairing each genre with the top tags"""
+    cooccurrence = compute('cooccurrence')
+    tags = compute('tag_counts').index[:top_tags]
+    reviews = cooccurrence.frame('genre_tags', 'reviews')[tags]
+    games = cooccurrence.frame('genre_tags', 'games')[tags]
+    
+    # Most engaged genres on top
+    order = reviews.sum(axis=1).sort_values(ascending=True).index
+    reviews, games = reviews.loc[order], games.loc[order]
+    
+    trace = dict(
+        type='heatmap',
+        z=reviews.to_numpy(),
+        x=list(tags),
+        y=list(order),
+        customdata=games.to_numpy(),
+        colorscale=[[0, COLORS['bg_dark']], [0.5, COLORS['primary_blue']], [1, COLORS['accent_blue']]],
+        colorbar=dict(title=dict(text='Reviews', font=dict(color=COLORS['text_light'])), tickfont=dict(color=COLORS['text_light'])),
+        hovertemplate='<b>%{y} × %{x}</b><br>' +
+                      'Total Reviews: %{z:,}<br>' +
+                      'Nombre de jeux: %{customdata:,}<br>' +
+                      '<extra></extra>',
     )
-    genres_with_reviews["total"] = genres_with_reviews["total"].fillna(0)
     
-    genre_popularity = (
-        genres_with_reviews
-        .groupby("genre_normalized")
-        .agg(
-            games_count=("app_id", "nunique"),
-            total_reviews=("total", "sum")
-        )
-        .sort_values("total_reviews", ascending=False)
-    )
+    layout = get_base_layout('Genres × Tags : Engagement des Jeux Combinant les Deux', height=600)
+    layout['xaxis'] = get_axis_style('Tag', grid=False)
+    layout['xaxis']['tickangle'] = -45
+    layout['yaxis'] = get_axis_style('Genre', grid=False)
+    layout['margin'] = dict(t=80, b=150, l=150, r=40)
     
-    genre_counts = genres_clean["genre_normalized"].value_counts()
-    tag_counts = tags_indie["tag"].value_counts()
+    return render_chart([trace], layout, 'genre-tag-heatmap')
+
+def get_q1_statistics():
+    """Calculate Q1 statistics"""
+    genre_popularity = compute('genre_popularity')
+    genre_counts = compute('genre_counts')
+    
+    # Tag figures are estimated from the sketches in sketch mode
+    if sketch_mode_enabled():
+        sketches = get_sketches()
+        tag_counts = sketches.top_tags(1)
+        total_tags = sketches.distinct_tag_count()
+    else:
+        tag_counts = compute('tag_counts')
+        total_tags = len(tag_counts)
     
     return {
         'total_genres': len(genre_counts),
-        'total_tags': len(tag_counts),
+        'total_tags': total_tags,
         'most_popular_genre': genre_counts.index[0] if len(genre_counts) > 0 else "N/A",
         'most_popular_tag': tag_counts.index[0] if len(tag_counts) > 0 else "N/A",
-        'most_engaged_genre': genre_popularity.index[0] if len(genre_popularity) > 0 else "N/A",
+        'most_engaged_genre': genre_popularity["genre_normalized"].iloc[0] if len(genre_popularity) > 0 else "N/A",
         'top_genre_count': int(genre_counts.iloc[0]) if len(genre_counts) > 0 else 0,
         'top_tag_count': int(tag_counts.iloc[0]) if len(tag_counts) > 0 else 0,
     }
\ No newline at end of file
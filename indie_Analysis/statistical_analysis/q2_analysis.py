@@ -2,60 +2,90 @@
 
 import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-from .data_loader import load_games_data
-from util.chart_config import COLORS, get_base_layout, get_axis_style
+from .data_loader import extract_price_and_currency, load_raw_games_data, add_price_eur
+from .exchange_rates import get_price_date, get_rate_table_version
+from .ingest import CSV_SOURCES, read_csv_sources
+from .pipeline import node, compute
+from .quantiles import get_price_sketches
+from util.chart_config import COLORS, get_base_layout, get_axis_style, render_chart
+
+# Price buckets (one scheme shared by every Q2 chart)
+PRICE_BINS = [5, 10, 15, 20, 30]
+PRICE_LABELS = ["€0–4.99", "€5–9.99", "€10–14.99", "€15–19.99", "€20–29.99", "€30+"]
+BUCKET_ORDER = ["Free"] + PRICE_LABELS
+
+def _read_only(values):
+    """Return a read-only numpy array"""
+    values = np.array(values)
+    values.setflags(write=False)
+    return values
+
+def build_price_frame(df_games):
+    """
+    Build the Q2 price frame from the games data
+    Buckets are computed with one vectorized pass, the games data is not modified
+    """
+    price_eur = df_games["price_eur"].to_numpy(dtype=float)
+    is_free = (df_games["is_free"] == True).to_numpy()
+    is_paid = (df_games["is_free"] == False).to_numpy() & (price_eur > 0)
+    
+    # -1 = no bucket, 0 = Free, 1.. = paid price ranges
+    codes = np.full(len(price_eur), -1, dtype=np.int8)
+    codes[is_free] = 0
+    codes[is_paid] = np.searchsorted(PRICE_BINS, price_eur[is_paid], side="right") + 1
+    
+    return pd.DataFrame({
+        'app_id': _read_only(df_games["app_id"]),
+        'price_eur': _read_only(price_eur),
+        'is_free': _read_only(is_free),
+        'is_paid': _read_only(is_paid),
+        'price_bucket': pd.Categorical.from_codes(codes, categories=BUCKET_ORDER),
+    }, copy=False)
+
+# Derived frames (computed once per dataset version)
+
+@node('raw_sources')
+def raw_sources_node():
+    """
+    Frames of every CSV source, parsed concurrently in one pass over the files
+    Shared by the loaders, which must not modify them; it is only computed when
+    one of the checkpointed frames built from it is missing
+    """
+    return read_csv_sources(list(CSV_SOURCES))
+
+@node('games_raw', deps=['raw_sources'], checkpoint=True, code=[load_raw_games_data, extract_price_and_currency])
+def games_raw_node(sources):
+    # The pipeline owns the frame: a copy in the object cache would count against
+    # its byte budget without ever freeing memory
+    return load_raw_games_data(sources, use_cache=False)
+
+@node('games', deps=['games_raw'], versioned_by=[get_rate_table_version, get_price_date])
+def games_node(df_games):
+    """Games with prices in EUR, re-priced whenever the exchange rates or the price date change"""
+    return add_price_eur(df_games)
+
+@node('price_frame', deps=['games'])
+def price_frame_node(df_games):
+    return build_price_frame(df_games)
 
 def prepare_q2_data():
-    """Prepare data for Q2 price analysis"""
-    df_games = load_games_data()
-    
-    # Create price buckets
-    df_games.loc[df_games["is_free"] == True, "price_bucket"] = "Free"
-    
-    paid_mask = (df_games["is_free"] == False) & (df_games["price_eur"] > 0)
-    bins = [0, 5, 10, 15, 20, 30, np.inf]
-    labels = ["€0–4.99", "€5–9.99", "€10–14.99", "€15–19.99", "€20–29.99", "€30+"]
-    
-    df_games.loc[paid_mask, "price_bucket"] = pd.cut(
-        df_games.loc[paid_mask, "price_eur"],
-        bins=bins,
-        labels=labels,
-        right=False
-    )
-    
-    return df_games, paid_mask
+    """
+    Prepare data for Q2 price analysis
+    Returns the shared price frame and the paid games mask (both read-only)
+    """
+    df_prices = compute('price_frame')
+    return df_prices, df_prices["is_paid"].to_numpy()
 
 def create_price_pie_chart():
     """Create pie chart showing price distribution by range"""
-    df_games, paid_mask = prepare_q2_data()
+    df_prices, paid_mask = prepare_q2_data()
     
-    # Define price ranges for paid games only
-    paid_games = df_games[paid_mask].copy()
-    
-    # Create buckets for pie chart
-    def categorize_price(price):
-        if price < 5:
-            return "€0-4.99"
-        elif price < 10:
-            return "€5-9.99"
-        elif price < 15:
-            return "€10-14.99"
-        elif price < 20:
-            return "€15-19.99"
-        elif price < 30:
-            return "€20-29.99"
-        else:
-            return "€30+"
-    
-    paid_games['price_category'] = paid_games['price_eur'].apply(categorize_price)
-    
-    # Count games in each category
-    category_counts = paid_games['price_category'].value_counts()
-    
-    # Order categories properly
-    category_order = ["€0-4.99", "€5-9.99", "€10-14.99", "€15-19.99", "€20-29.99", "€30+"]
-    category_counts = category_counts.reindex(category_order, fill_value=0)
+    # Count paid games in each category
+    category_counts = (
+        df_prices.loc[paid_mask, "price_bucket"]
+        .value_counts()
+        .reindex(PRICE_LABELS, fill_value=0)
+    )
     
     # Custom colors for each slice
     slice_colors = [
@@ -67,9 +97,8 @@ def create_price_pie_chart():
         '#87ceeb'                 # €30+
     ]
     
-    fig = go.Figure()
-    
-    fig.add_trace(go.Pie(
+    trace = dict(
+        type='pie',
         labels=category_counts.index,
         values=category_counts.values,
         marker=dict(
@@ -83,49 +112,37 @@ def create_price_pie_chart():
                       'Pourcentage: %{percent}<br>' +
                       '<extra></extra>',
         pull=[0.05, 0, 0, 0, 0, 0]  # Pull out the largest slice slightly
-    ))
+    )
     
-    fig.update_layout(
-        title={
-            'text': 'Répartition des Jeux Payants par Tranche de Prix',
-            'font': {'size': 20, 'color': COLORS['text_white'], 'family': 'Segoe UI'},
-            'x': 0.5,
-            'xanchor': 'center'
-        },
-        plot_bgcolor=COLORS['dark_blue'],
-        paper_bgcolor=COLORS['bg_dark'],
-        font=dict(family='Segoe UI', color=COLORS['text_light']),
-        height=600,
-        showlegend=True,
-        legend=dict(
-            orientation="v",
-            yanchor="middle",
-            y=0.5,
-            xanchor="left",
-            x=1.02,
-            font=dict(size=12, color=COLORS['text_light']),
-            bgcolor='rgba(0,0,0,0)'
-        ),
-        margin=dict(t=80, b=60, l=60, r=200)
+    layout = get_base_layout('Répartition des Jeux Payants par Tranche de Prix', height=600)
+    layout['showlegend'] = True
+    layout['legend'] = dict(
+        orientation="v",
+        yanchor="middle",
+        y=0.5,
+        xanchor="left",
+        x=1.02,
+        font=dict(size=12, color=COLORS['text_light']),
+        bgcolor='rgba(0,0,0,0)'
     )
+    layout['margin'] = dict(t=80, b=60, l=60, r=200)
     
-    return fig.to_html(include_plotlyjs='cdn', div_id='pie-chart')
+    return render_chart([trace], layout, 'pie-chart')
 
 def create_price_buckets():
     """Create bar chart of price range buckets"""
-    df_games, _ = prepare_q2_data()
+    df_prices, _ = prepare_q2_data()
     
-    bucket_order = ["Free", "€0–4.99", "€5–9.99", "€10–14.99", "€15–19.99", "€20–29.99", "€30+"]
-    bucket_counts = df_games["price_bucket"].value_counts().reindex(bucket_order)
+    bucket_order = BUCKET_ORDER
+    bucket_counts = df_prices["price_bucket"].value_counts().reindex(bucket_order)
     
     bar_colors = [
         COLORS['accent_blue'], COLORS['primary_blue'], COLORS['light_blue'],
         COLORS['primary_blue'], COLORS['light_blue'], COLORS['primary_blue'], COLORS['light_blue']
     ]
     
-    fig = go.Figure()
-    
-    fig.add_trace(go.Bar(
+    trace = dict(
+        type='bar',
         x=bucket_order,
         y=bucket_counts,
         marker=dict(color=bar_colors, line=dict(color=COLORS['accent_blue'], width=1.5)),
@@ -133,7 +150,7 @@ def create_price_buckets():
         textposition='outside',
         textfont=dict(size=12, color=COLORS['text_white']),
         hovertemplate='<b>Tranche:</b> %{x}<br><b>Nombre:</b> %{y:,}<br><extra></extra>',
-    ))
+    )
     
     layout = get_base_layout('Jeux Indés par Tranche de Prix')
     layout['xaxis'] = get_axis_style('Tranche de prix (EUR)', grid=False)
@@ -142,21 +159,40 @@ def create_price_buckets():
     layout['margin']['b'] = 100
     layout['showlegend'] = False
     
-    fig.update_layout(**layout)
-    
-    return fig.to_html(include_plotlyjs='cdn', div_id='buckets-chart')
+    return render_chart([trace], layout, 'buckets-chart')
+
+def get_filter_options():
+    """Genres and languages the price statistics can be filtered by"""
+    sketches = get_price_sketches()
+    return {'genres': sketches.genres, 'languages': sketches.languages}
 
-def get_statistics():
-    """Calculate price statistics"""
-    df_games, paid_mask = prepare_q2_data()
-    paid_prices = df_games.loc[paid_mask, "price_eur"]
+def get_statistics(genre=None, language=None):
+    """
+    Calculate price statistics, optionally for some genres and languages
+    Quantiles come from the prebuilt price sketches (a filter with several values
+    is answered from the distinct matching games, each counted once)
+    """
+    sketches = get_price_sketches()
+    all_games = sketches.query(genre, language)
+    free = sketches.query(genre, language, "free")
+    paid = sketches.query(genre, language, "paid")
+    
+    if paid.n:
+        p25, median, p75, p90 = paid.quantiles([0.25, 0.5, 0.75, 0.9])
+        under_10 = paid.rank(10)
+    else:
+        p25 = median = p75 = p90 = 0.0
+        under_10 = 0
     
     return {
-        'total_games': len(df_games),
-        'free_games': int((df_games['is_free'] == True).sum()),
-        'paid_games': int(paid_mask.sum()),
-        'median_price': float(paid_prices.median()),
-        'average_price': float(paid_prices.mean()),
-        'under_10': int(((paid_prices > 0) & (paid_prices < 10)).sum()),
-        'percent_under_10': float((((paid_prices > 0) & (paid_prices < 10)).sum() / paid_mask.sum() * 100) if paid_mask.sum() > 0 else 0)
-    }
\ No newline at end of file
+        'total_games': all_games.n,
+        'free_games': free.n,
+        'paid_games': paid.n,
+        'median_price': float(median),
+        'average_price': float(paid.mean()) if paid.n else 0.0,
+        'p25_price': float(p25),
+        'p75_price': float(p75),
+        'p90_price': float(p90),
+        'under_10': under_10,
+        'percent_under_10': float(under_10 / paid.n * 100) if paid.n else 0.0
+    }
@@ -3,10 +3,13 @@
 import pandas as pd
 import numpy as np
 import re
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from django.core.cache import cache
-from util.chart_config import COLORS, get_base_layout, get_axis_style
+from .data_loader import clean_column_names, dataset_cache_key
+from .incidence import build_incidence
+from .partitioned import column_aggregates
+from .object_cache import dataset_cache
+from .pipeline import node, compute
+from .sketches import DatasetSketches, get_sketches, sketch_mode_enabled
+from util.chart_config import COLORS, get_base_layout, get_axis_style, hline, render_chart
 
 # Canonical language mappings
 CANONICAL_LANGUAGES = {
@@ -57,44 +60,13 @@ def normalize_language(lang):
                 return canonical
     return "Other"
 
-def load_q3_data():
-    """Load and process language and engagement data"""
-    cache_key = 'q3_data'
-    cached = cache.get(cache_key)
-    if cached:
-        return cached
-    
-    # Load CSVs
-    games_df = pd.read_csv(
-        "games.csv",
-        sep=",",
-        quotechar='"',
-        escapechar="\\",
-        engine="python",
-        on_bad_lines="skip"
-    )
-    
-    reviews_df = pd.read_csv(
-        "reviews.csv",
-        sep=",",
-        engine="python",
-        quoting=3,
-        escapechar="\\",
-        on_bad_lines="skip",
-        encoding="utf-8",
-    )
-    
-    # Clean column names
-    games_df.columns = games_df.columns.str.strip().str.replace('"', '', regex=False)
-    reviews_df.columns = reviews_df.columns.str.replace('"', '', regex=False)
-    
-    # Clean reviews data
-    reviews_df["app_id"] = reviews_df["app_id"].astype(str).str.replace('"', '', regex=False)
-    reviews_df["total"] = reviews_df["total"].astype(str).str.replace('"', '', regex=False)
-    reviews_df["app_id"] = pd.to_numeric(reviews_df["app_id"], errors="coerce")
-    reviews_df["total"] = pd.to_numeric(reviews_df["total"], errors="coerce")
-    reviews_df = reviews_df.dropna(subset=["app_id"])
-    reviews_df["app_id"] = reviews_df["app_id"].astype(int)
+def split_languages(games_df):
+    """
+    Split the languages of the games of a frame read from games.csv
+    Returns (app_ids, languages) with one entry per game and language string;
+    each distinct string is cleaned and normalized once
+    """
+    games_df = clean_column_names(games_df)
     
     # Keep only games
     games_df = games_df[games_df["type"] == "game"]
@@ -102,65 +74,106 @@ def load_q3_data():
     games_df = games_df.dropna(subset=["languages"])
     
     # Clean language strings
-    games_df["languages"] = (
+    languages = (
         games_df["languages"]
         .str.replace(r"<.*?>", "", regex=True)
         .str.replace("*", "", regex=False)
+        .str.split(",")
+        .dropna()
     )
     
-    # Split languages into rows
-    languages_df = (
-        games_df
-        .assign(language=games_df["languages"].str.split(","))
-        .explode("language")
-    )
-    
-    languages_df["language"] = languages_df["language"].str.strip()
-    languages_df["language_clean"] = languages_df["language"].apply(clean_language)
-    languages_df["language_normalized"] = languages_df["language_clean"].apply(normalize_language)
-    
-    # Merge with reviews
-    languages_reviews = languages_df.merge(
-        reviews_df[["app_id", "total"]],
-        on="app_id",
-        how="left"
-    )
-    languages_reviews["total"] = languages_reviews["total"].fillna(0)
+    # Flatten the lists, normalizing the distinct strings only
+    app_ids = np.repeat(games_df.loc[languages.index, "app_id"].to_numpy(), languages.str.len().to_numpy())
+    strings = np.concatenate(languages.to_numpy()) if len(languages) else np.empty(0, dtype=object)
+    codes, distinct = pd.factorize(strings)
+    normalized = pd.Series(distinct, dtype=object).str.strip().apply(clean_language).apply(normalize_language)
+    return app_ids, normalized.to_numpy(dtype=object)[codes]
+
+def sketch_languages(games_df):
+    """Sketches of the languages of a shard of games.csv"""
+    app_ids, languages = split_languages(games_df)
+    sketches = DatasetSketches()
+    sketches.update_languages(languages, app_ids.astype(np.int64))
+    return sketches
+
+def load_q3_data(sources, use_cache=True):
+    """
+    Return the languages of the games of the raw sources as a game x language incidence matrix
+    Rows are the games with a languages field (reviews come from the metrics store)
+    """
+    cache_key = dataset_cache_key('q3_data')
+    if use_cache:
+        cached = dataset_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
+    # Build the matrix from the split strings
+    app_ids, languages = split_languages(sources['games'])
+    language_matrix = build_incidence(app_ids, languages, row_labels=np.unique(app_ids))
     
     # Cache for 1 hour
     result = {
-        'languages_df': languages_df,
-        'languages_reviews': languages_reviews
+        'language_matrix': language_matrix
     }
-    cache.set(cache_key, result, 3600)
+    if use_cache:
+        dataset_cache.set(cache_key, result, 3600)
     
     return result
 
-def create_language_engagement_chart():
-    """Create horizontal bar chart showing language engagement share"""
-    data = load_q3_data()
-    languages_reviews = data['languages_reviews']
-    
-    # Calculate engagement
-    language_engagement = (
-        languages_reviews
-        .groupby("language_normalized")["total"]
-        .sum()
-        .sort_values(ascending=False)
-        .reset_index()
+# Derived frames (computed once per dataset version)
+
+@node('q3_data', deps=['raw_sources'], checkpoint=True, code=[load_q3_data, split_languages, clean_language, normalize_language])
+def q3_data_node(sources):
+    return load_q3_data(sources, use_cache=False)
+
+@node('language_matrix', deps=['q3_data'])
+def language_matrix_node(data):
+    """Game x language incidence matrix (CSR, one entry per game and language)"""
+    return data['language_matrix']
+
+@node('language_aggregates', deps=['language_matrix', 'metrics_store'])
+def language_aggregates_node(matrix, store):
+    """
+    Total reviews and distinct games per language
+    Engagement is the transposed matrix times the review totals of the games,
+    games per language the number of entries of each column
+    """
+    totals = np.nan_to_num(store.lookup(matrix.row_labels, "total", fill=0))
+    sums, counts = column_aggregates(matrix, totals)
+    return pd.DataFrame(
+        {'total': sums, 'games': counts},
+        index=pd.Index(matrix.column_labels, name="language_normalized"),
     )
-    
-    # Remove "Other" and calculate share
+
+@node('language_engagement', deps=['language_aggregates'])
+def language_engagement_node(language_aggregates):
+    """Total reviews per language, most engaged first"""
+    return language_aggregates["total"].sort_values(ascending=False)
+
+@node('language_share', deps=['language_engagement'])
+def language_share_node(language_engagement):
+    """Engagement share and cumulative share per language (without "Other")"""
     language_engagement_no_other = language_engagement[
-        language_engagement["language_normalized"] != "Other"
-    ]
+        language_engagement.index != "Other"
+    ].reset_index()
     total_engagement = language_engagement_no_other["total"].sum()
     language_engagement_no_other["share"] = (
         language_engagement_no_other["total"] / total_engagement * 100
     )
-    
+    language_engagement_no_other["cumulative_share"] = (
+        language_engagement_no_other["share"].cumsum()
+    )
+    return language_engagement_no_other
+
+@node('language_game_counts', deps=['language_aggregates'])
+def language_game_counts_node(language_aggregates):
+    """Number of distinct games per language, most common first"""
+    return language_aggregates["games"].rename("app_id").sort_values(ascending=False)
+
+def create_language_engagement_chart():
+    """Create horizontal bar chart showing language engagement share"""
     # Sort for plotting
-    language_engagement_no_other = language_engagement_no_other.sort_values("share", ascending=True)
+    language_engagement_no_other = compute('language_share').sort_values("share", ascending=True)
     
     # Create gradient colors
     colors = []
@@ -175,9 +188,8 @@ def create_language_engagement_chart():
         else:
             colors.append(COLORS['light_blue'])
     
-    fig = go.Figure()
-    
-    fig.add_trace(go.Bar(
+    trace = dict(
+        type='bar',
         y=language_engagement_no_other["language_normalized"],
         x=language_engagement_no_other["share"],
         orientation='h',
@@ -191,7 +203,7 @@ def create_language_engagement_chart():
         hovertemplate='<b>%{y}</b><br>' +
                       'Part d\'engagement: %{x:.2f}%<br>' +
                       '<extra></extra>',
-    ))
+    )
     
     layout = get_base_layout('Engagement des Jeux Indie par Langue', height=700)
     layout['xaxis'] = get_axis_style('Part de l\'engagement total (%)')
@@ -199,28 +211,12 @@ def create_language_engagement_chart():
     layout['showlegend'] = False
     layout['margin'] = dict(t=80, b=60, l=120, r=120)
     
-    fig.update_layout(**layout)
-    
-    return fig.to_html(include_plotlyjs='cdn', div_id='language-engagement-chart')
+    return render_chart([trace], layout, 'language-engagement-chart')
 
 def create_language_pie_chart():
     """Create pie chart showing top languages by engagement"""
-    data = load_q3_data()
-    languages_reviews = data['languages_reviews']
-    
-    # Calculate engagement
-    language_engagement = (
-        languages_reviews
-        .groupby("language_normalized")["total"]
-        .sum()
-        .sort_values(ascending=False)
-        .reset_index()
-    )
-    
     # Get top 10 languages (excluding "Other")
-    top_languages = language_engagement[
-        language_engagement["language_normalized"] != "Other"
-    ].head(10)
+    top_languages = compute('language_share').head(10)
     
     # Custom colors
     colors_list = [
@@ -236,9 +232,8 @@ def create_language_pie_chart():
         '#00d4ff'
     ]
     
-    fig = go.Figure()
-    
-    fig.add_trace(go.Pie(
+    trace = dict(
+        type='pie',
         labels=top_languages["language_normalized"],
         values=top_languages["total"],
         marker=dict(
@@ -252,65 +247,31 @@ def create_language_pie_chart():
                       'Pourcentage: %{percent}<br>' +
                       '<extra></extra>',
         pull=[0.05, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-    ))
-    
-    fig.update_layout(
-        title={
-            'text': 'Top 10 des Langues par Engagement',
-            'font': {'size': 20, 'color': COLORS['text_white'], 'family': 'Segoe UI'},
-            'x': 0.5,
-            'xanchor': 'center'
-        },
-        plot_bgcolor=COLORS['dark_blue'],
-        paper_bgcolor=COLORS['bg_dark'],
-        font=dict(family='Segoe UI', color=COLORS['text_light']),
-        height=600,
-        showlegend=True,
-        legend=dict(
-            orientation="v",
-            yanchor="middle",
-            y=0.5,
-            xanchor="left",
-            x=1.02,
-            font=dict(size=11, color=COLORS['text_light']),
-            bgcolor='rgba(0,0,0,0)'
-        ),
-        margin=dict(t=80, b=60, l=60, r=200)
     )
     
-    return fig.to_html(include_plotlyjs='cdn', div_id='language-pie-chart')
+    layout = get_base_layout('Top 10 des Langues par Engagement', height=600)
+    layout['showlegend'] = True
+    layout['legend'] = dict(
+        orientation="v",
+        yanchor="middle",
+        y=0.5,
+        xanchor="left",
+        x=1.02,
+        font=dict(size=11, color=COLORS['text_light']),
+        bgcolor='rgba(0,0,0,0)'
+    )
+    layout['margin'] = dict(t=80, b=60, l=60, r=200)
+    
+    return render_chart([trace], layout, 'language-pie-chart')
 
 def create_cumulative_engagement_chart():
     """Create line chart showing cumulative language engagement"""
-    data = load_q3_data()
-    languages_reviews = data['languages_reviews']
-    
-    # Calculate engagement
-    language_engagement = (
-        languages_reviews
-        .groupby("language_normalized")["total"]
-        .sum()
-        .sort_values(ascending=False)
-        .reset_index()
-    )
+    language_engagement_no_other = compute('language_share')
     
-    # Remove "Other" and calculate share
-    language_engagement_no_other = language_engagement[
-        language_engagement["language_normalized"] != "Other"
-    ]
-    total_engagement = language_engagement_no_other["total"].sum()
-    language_engagement_no_other["share"] = (
-        language_engagement_no_other["total"] / total_engagement * 100
-    )
-    language_engagement_no_other["cumulative_share"] = (
-        language_engagement_no_other["share"].cumsum()
-    )
-    
-    fig = go.Figure()
-    
-    # Add line
-    fig.add_trace(go.Scatter(
-        x=list(range(1, len(language_engagement_no_other) + 1)),
+    # Line
+    trace = dict(
+        type='scatter',
+        x=np.arange(1, len(language_engagement_no_other) + 1),
         y=language_engagement_no_other["cumulative_share"],
         mode='lines+markers',
         line=dict(color=COLORS['accent_blue'], width=3),
@@ -318,37 +279,31 @@ def create_cumulative_engagement_chart():
         hovertemplate='<b>Top %{x} langues</b><br>' +
                       'Engagement cumulé: %{y:.1f}%<br>' +
                       '<extra></extra>',
-    ))
+    )
     
-    # Add reference lines
-    fig.add_hline(y=50, line_dash="dash", line_color=COLORS['text_light'], 
-                  annotation_text="50%", annotation_position="right")
-    fig.add_hline(y=80, line_dash="dash", line_color=COLORS['text_light'], 
-                  annotation_text="80%", annotation_position="right")
+    # Reference lines
+    reference_lines = [hline(50, "50%"), hline(80, "80%")]
     
     layout = get_base_layout('Engagement Cumulé par Langue', height=600)
     layout['xaxis'] = get_axis_style('Nombre de langues (classées par engagement)')
     layout['yaxis'] = get_axis_style('Engagement cumulé (%)')
     layout['yaxis']['range'] = [0, 105]
     layout['showlegend'] = False
+    layout['shapes'] = [shape for shape, _ in reference_lines]
+    layout['annotations'] = [annotation for _, annotation in reference_lines]
     
-    fig.update_layout(**layout)
-    
-    return fig.to_html(include_plotlyjs='cdn', div_id='cumulative-chart')
+    return render_chart([trace], layout, 'cumulative-chart')
 
 def create_language_game_count_chart():
     """Create bar chart showing number of games per language"""
-    data = load_q3_data()
-    languages_df = data['languages_df']
-    
-    # Count games per language
-    language_game_counts = (
-        languages_df
-        .groupby("language_normalized")["app_id"]
-        .nunique()
-        .sort_values(ascending=False)
-        .reset_index()
-    )
+    # Count games per language (estimated from the sketches in sketch mode)
+    relative_error = None
+    if sketch_mode_enabled():
+        sketches = get_sketches()
+        language_game_counts = sketches.language_game_counts().reset_index()
+        relative_error = sketches.language_error()
+    else:
+        language_game_counts = compute('language_game_counts').reset_index()
     language_game_counts.columns = ["language", "game_count"]
     
     # Remove "Other" and get top 10
@@ -361,9 +316,8 @@ def create_language_game_count_chart():
               for i in range(len(top_languages))]
     colors[-1] = COLORS['accent_blue']  # Highlight top
     
-    fig = go.Figure()
-    
-    fig.add_trace(go.Bar(
+    trace = dict(
+        type='bar',
         y=top_languages["language"],
         x=top_languages["game_count"],
         orientation='h',
@@ -377,55 +331,54 @@ def create_language_game_count_chart():
         hovertemplate='<b>%{y}</b><br>' +
                       'Nombre de jeux: %{x:,}<br>' +
                       '<extra></extra>',
-    ))
+    )
     
-    layout = get_base_layout('Nombre de Jeux par Langue (Top 10)', height=600)
+    title = 'Nombre de Jeux par Langue (Top 10)'
+    if relative_error is not None:
+        # HyperLogLog standard error, relative to each estimate
+        trace['error_x'] = dict(
+            type='percent', value=relative_error * 100,
+            color=COLORS['text_light'], thickness=1,
+        )
+        trace['hovertemplate'] = ('<b>%{y}</b><br>' +
+                                  'Nombre de jeux (estimé): %{x:,}<br>' +
+                                  f'Erreur type: ±{relative_error:.2%}<br>' +
+                                  '<extra></extra>')
+        title += f' (estimation HyperLogLog, ±{relative_error:.1%})'
+    
+    layout = get_base_layout(title, height=600)
     layout['xaxis'] = get_axis_style('Nombre de jeux')
     layout['yaxis'] = get_axis_style('Langue', grid=False)
     layout['showlegend'] = False
     layout['margin'] = dict(t=80, b=60, l=120, r=100)
     
-    fig.update_layout(**layout)
-    
-    return fig.to_html(include_plotlyjs='cdn', div_id='language-count-chart')
+    return render_chart([trace], layout, 'language-count-chart')
 
 def get_q3_statistics():
     """Calculate Q3 statistics"""
-    data = load_q3_data()
-    languages_df = data['languages_df']
-    languages_reviews = data['languages_reviews']
+    language_matrix = compute('language_matrix')
     
-    # Total languages
-    total_languages = len(languages_df["language_normalized"].unique()) - 1  # Exclude "Other"
+    # Total languages (without "Other")
+    total_languages = len(language_matrix.column_labels) - int("Other" in language_matrix.column_labels)
     
     # Total games with language data
-    total_games = languages_df["app_id"].nunique()
-    
-    # Calculate engagement
-    language_engagement = (
-        languages_reviews
-        .groupby("language_normalized")["total"]
-        .sum()
-        .sort_values(ascending=False)
-    )
+    total_games = language_matrix.shape[0]
     
-    language_engagement_no_other = language_engagement[
-        language_engagement.index != "Other"
-    ]
-    total_engagement = language_engagement_no_other.sum()
+    # Engagement per language (without "Other")
+    language_share = compute('language_share')
     
     # Top language
-    top_language = language_engagement_no_other.index[0]
-    top_language_share = (language_engagement_no_other.iloc[0] / total_engagement * 100)
+    top_language = language_share["language_normalized"].iloc[0]
+    top_language_share = language_share["share"].iloc[0]
     
     # Count games per language
-    language_game_counts = languages_df.groupby("language_normalized")["app_id"].nunique()
+    language_game_counts = compute('language_game_counts')
     language_game_counts_no_other = language_game_counts[language_game_counts.index != "Other"]
     most_common_language = language_game_counts_no_other.idxmax()
     most_common_count = int(language_game_counts_no_other.max())
     
     # Calculate cumulative for top N
-    shares = (language_engagement_no_other / total_engagement * 100).values
+    shares = language_share["share"].values
     top_3_cumulative = shares[:3].sum()
     top_5_cumulative = shares[:5].sum()
     
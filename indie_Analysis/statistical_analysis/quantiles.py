@@ -0,0 +1,250 @@
+# analysis/quantiles.py
+
+import itertools
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from .pipeline import node, compute
+
+# Dimensions of the prebuilt price sketches (None = all values of a dimension)
+DIMENSIONS = ("genre", "language", "segment")
+SEGMENTS = ("free", "paid")
+
+# Multi-valued selections whose sketch is kept (least recently used evicted)
+SELECTION_CACHE_ENTRIES = 32
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang, Liberty)
+    Keeps O(k) items whatever the number of values, rank error about 1.65 / k
+    Sketches merge without loss of accuracy; count, sum, min and max are exact
+    """
+
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        # Compact the lowest full level until every level fits
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+
+            # Half of the (even number of) sorted items move up with twice the weight
+            items = np.sort(items)
+            odd = len(items) % 2
+            offset = int(self._rng.integers(2))
+            self.levels[level] = items[:odd]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[odd + offset::2]])
+            level = 0
+
+    def update(self, values):
+        """Add values (NaN are ignored)"""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.n += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        """Add the values summarized by another sketch"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    @classmethod
+    def merged(cls, sketches, k=200):
+        """New sketch summarizing all the given sketches"""
+        result = cls(k)
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+    def is_exact(self):
+        return len(self.levels) == 1
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], weights[order]
+
+    def quantiles(self, qs):
+        """Estimated quantiles (exact, interpolated like pandas, while nothing was compacted)"""
+        qs = np.asarray(qs, dtype=float)
+        if self.n == 0:
+            return np.full(len(qs), np.nan)
+        if self.is_exact():
+            return np.quantile(self.levels[0], qs)
+        items, weights = self._weighted_items()
+        cumulative = np.cumsum(weights)
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side="left")
+        return items[np.minimum(positions, len(items) - 1)]
+
+    def quantile(self, q):
+        return float(self.quantiles([q])[0])
+
+    def rank(self, value):
+        """Estimated number of values strictly below value"""
+        items, weights = self._weighted_items()
+        return int(round(weights[items < value].sum()))
+
+    def mean(self):
+        return self.total / self.n if self.n else math.nan
+
+    def __len__(self):
+        return self.n
+
+class PriceSketches:
+    """
+    Price quantile sketches for every combination of genre, language and segment
+    Each cell is keyed by (genre, language, segment), None meaning all values,
+    so a single-valued filter is answered by one prebuilt sketch
+    The rows of each genre and language are kept to answer multi-valued
+    filters from the distinct matching games
+    """
+
+    def __init__(self, cells, prices, segments, postings):
+        self.cells = cells
+        self.prices = prices
+        self.segments = segments
+        self.postings = postings
+        self.genres = sorted(postings['genre'])
+        self.languages = sorted(postings['language'])
+        self._selections = OrderedDict()
+        self._selections_lock = threading.Lock()
+
+    def query(self, genre=None, language=None, segment=None):
+        """
+        Sketch of the prices of the games matching the filters
+        Each filter is a value, a list of values or None (no filter); a game
+        matching several selected values of a filter counts once
+        """
+        selections = [
+            [None] if not value else ([value] if isinstance(value, str) else list(dict.fromkeys(value)))
+            for value in (genre, language, segment)
+        ]
+        keys = list(itertools.product(*selections))
+        if len(keys) == 1:
+            return self.cells.get(keys[0]) or KLLSketch()
+        return self._distinct_sketch(*selections)
+
+    def _distinct_sketch(self, genres, languages, segments):
+        """
+        Sketch of the distinct games matching multi-valued filters
+        Merging the prebuilt cells of the selected values would count a game once
+        per value it matches, so the prices of the matching rows are sketched:
+        O(m log m) for the m rows having a selected genre or language (O(n) for a
+        segment-only filter). Cached per selection, so a repeated query is free
+        """
+        key = tuple(None if values == [None] else tuple(sorted(values)) for values in (genres, languages, segments))
+        with self._selections_lock:
+            sketch = self._selections.get(key)
+            if sketch is not None:
+                self._selections.move_to_end(key)
+                return sketch
+
+        # Rows having any selected value of each filter, each row once
+        rows = None
+        for dimension, values in (("genre", genres), ("language", languages)):
+            if values != [None]:
+                postings = self.postings[dimension]
+                matching = np.unique(np.concatenate(
+                    [postings.get(value, np.empty(0, dtype=np.int64)) for value in values]
+                ))
+                rows = matching if rows is None else np.intersect1d(rows, matching, assume_unique=True)
+        prices = self.prices if rows is None else self.prices[rows]
+        if segments != [None]:
+            prices = prices[np.isin(self.segments if rows is None else self.segments[rows], segments)]
+        sketch = KLLSketch()
+        sketch.update(prices)
+
+        with self._selections_lock:
+            self._selections[key] = sketch
+            while len(self._selections) > SELECTION_CACHE_ENTRIES:
+                self._selections.popitem(last=False)
+        return sketch
+
+def _postings(base, members, column):
+    """Value -> row positions in base of the games having that value"""
+    rows = pd.Series(np.arange(len(base)), index=base["app_id"].to_numpy())
+    rows = rows[~rows.index.duplicated()]
+    positions = rows.reindex(members["app_id"].to_numpy()).to_numpy()
+    frame = pd.DataFrame({'row': positions, 'value': members[column].to_numpy()}).dropna()
+    return {
+        value: np.unique(group.to_numpy(dtype=np.int64))
+        for value, group in frame.groupby("value", sort=True)["row"]
+    }
+
+def build_price_sketches(df_prices, genres_df, language_matrix):
+    """Build one sketch per cell of every cuboid (all subsets of the dimensions)"""
+    segment = np.select([df_prices["is_free"], df_prices["is_paid"]], SEGMENTS, default="other")
+    base = pd.DataFrame({
+        'app_id': df_prices["app_id"].to_numpy(dtype=np.int64),
+        'price': df_prices["price_eur"].to_numpy(),
+        'segment': segment,
+    })
+    genres = genres_df[["app_id", "genre_normalized"]].drop_duplicates().rename(columns={'genre_normalized': 'genre'})
+    app_ids, language_values = language_matrix.pairs()
+    languages = pd.DataFrame({'app_id': app_ids, 'language': language_values})
+    genres["app_id"] = genres["app_id"].astype(np.int64)
+    languages["app_id"] = languages["app_id"].astype(np.int64)
+
+    cells = {}
+    for size in range(len(DIMENSIONS) + 1):
+        for dimensions in itertools.combinations(DIMENSIONS, size):
+            frame = base
+            if "genre" in dimensions:
+                frame = frame.merge(genres, on="app_id")
+            if "language" in dimensions:
+                frame = frame.merge(languages, on="app_id")
+            if not dimensions:
+                groups = [((), frame["price"])]
+            else:
+                groups = frame.groupby(list(dimensions), sort=False)["price"]
+            for values, prices in groups:
+                values = values if isinstance(values, tuple) else (values,)
+                cell = dict(zip(dimensions, values))
+                sketch = KLLSketch()
+                sketch.update(prices.to_numpy())
+                cells[tuple(cell.get(dimension) for dimension in DIMENSIONS)] = sketch
+
+    postings = {
+        'genre': _postings(base, genres, "genre"),
+        'language': _postings(base, languages, "language"),
+    }
+    return PriceSketches(cells, base["price"].to_numpy(), segment, postings)
+
+@node('price_sketches', deps=['price_frame', 'q1_data', 'language_matrix'])
+def price_sketches_node(df_prices, q1_data, language_matrix):
+    return build_price_sketches(df_prices, q1_data['genres_clean'], language_matrix)
+
+def get_price_sketches():
+    return compute('price_sketches')
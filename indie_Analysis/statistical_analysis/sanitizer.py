@@ -0,0 +1,149 @@
+# analysis/sanitizer.py
+
+import csv
+import json
+import os
+import sys
+
+# Bump when the repairs change, so existing sanitized files are rebuilt
+SANITIZER_VERSION = 1
+
+# Values used for NULL in the Steam dump (\N becomes N once the escape is removed)
+NULL_VALUES = {'\\N', 'N'}
+
+# Options to read a sanitized file (standard CSV, one record per line)
+CLEAN_OPTIONS = dict(sep=',', quotechar='"')
+
+csv.field_size_limit(sys.maxsize)
+
+def _reader_options(options):
+    """Translate pandas read_csv options into csv.reader options"""
+    reader_options = {
+        'delimiter': options.get('sep', ','),
+        'quotechar': options.get('quotechar', '"'),
+        'escapechar': options.get('escapechar'),
+        'quoting': options.get('quoting', csv.QUOTE_MINIMAL),
+        'strict': True,
+    }
+    if reader_options['quoting'] == csv.QUOTE_NONE:
+        reader_options.pop('quotechar')
+    return reader_options
+
+def _clean_field(value, strip_quotes):
+    """Repair a single field, returns (value, was_null)"""
+    if strip_quotes:
+        value = value.replace('"', '')
+    if value in NULL_VALUES:
+        return '', True
+    if '\n' in value or '\r' in value:
+        value = value.replace('\r\n', ' ').replace('\n', ' ').replace('\r', ' ')
+    return value, False
+
+def sanitize_csv(path, output_path, rejects_path, options):
+    """
+    Stream a raw CSV file into a clean one that the C and pyarrow parsers accept
+    - records with broken quoting or more fields than the header are quarantined
+      in rejects_path (these are the lines read_csv(on_bad_lines="skip") drops)
+    - records with missing fields are padded
+    - \\N and N nulls become empty fields, newlines inside fields become spaces
+    Returns the statistics of the pass
+    """
+    reader_options = _reader_options(options)
+    strip_quotes = reader_options['quoting'] == csv.QUOTE_NONE
+    encoding = options.get('encoding', 'utf-8')
+
+    stats = {
+        'version': SANITIZER_VERSION,
+        'source': path,
+        'source_size': os.path.getsize(path),
+        'source_mtime_ns': os.stat(path).st_mtime_ns,
+        'rows_read': 0,
+        'rows_written': 0,
+        'rows_padded': 0,
+        'rows_quarantined': 0,
+        'nulls_normalized': 0,
+    }
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    tmp_rejects_path = f"{rejects_path}.{os.getpid()}.tmp"
+
+    with open(path, newline='', encoding=encoding, errors='replace') as src, \
+            open(tmp_path, 'w', newline='', encoding='utf-8') as out, \
+            open(tmp_rejects_path, 'w', newline='', encoding='utf-8') as rejects:
+        reader = csv.reader(src, **reader_options)
+        writer = csv.writer(out, lineterminator='\n')
+        rejects_writer = csv.writer(rejects, lineterminator='\n')
+
+        header = [_clean_field(name, True)[0].strip() for name in next(reader)]
+        width = len(header)
+        writer.writerow(header)
+        rejects_writer.writerow(['line', 'reason', 'fields'])
+
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                # The reader resumes on the next line
+                stats['rows_read'] += 1
+                stats['rows_quarantined'] += 1
+                rejects_writer.writerow([reader.line_num, str(e), ''])
+                continue
+
+            # Blank lines are skipped by read_csv too
+            if not row:
+                continue
+            stats['rows_read'] += 1
+
+            if len(row) > width:
+                stats['rows_quarantined'] += 1
+                rejects_writer.writerow([
+                    reader.line_num,
+                    f"expected {width} fields, saw {len(row)}",
+                    options.get('sep', ',').join(row),
+                ])
+                continue
+            if len(row) < width:
+                stats['rows_padded'] += 1
+                row = row + [''] * (width - len(row))
+
+            clean_row = []
+            for value in row:
+                value, was_null = _clean_field(value, strip_quotes)
+                stats['nulls_normalized'] += was_null
+                clean_row.append(value)
+
+            writer.writerow(clean_row)
+            stats['rows_written'] += 1
+
+    os.replace(tmp_rejects_path, rejects_path)
+    os.replace(tmp_path, output_path)
+    with open(stats_path(output_path), 'w') as f:
+        json.dump(stats, f, indent=2)
+
+    return stats
+
+def stats_path(output_path):
+    return f"{output_path}.stats.json"
+
+def read_stats(output_path):
+    """Return the statistics of a previous pass, or None"""
+    try:
+        with open(stats_path(output_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def is_fresh(path, output_path):
+    """Check that a sanitized file exists and was built from the current source"""
+    stats = read_stats(output_path)
+    if stats is None or not os.path.exists(output_path):
+        return False
+    source = os.stat(path)
+    return (
+        stats.get('version') == SANITIZER_VERSION
+        and stats.get('source_size') == source.st_size
+        and stats.get('source_mtime_ns') == source.st_mtime_ns
+    )
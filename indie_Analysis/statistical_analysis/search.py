@@ -0,0 +1,141 @@
+# analysis/search.py
+
+import bisect
+import re
+import unicodedata
+from array import array
+import numpy as np
+from .pipeline import node, compute
+
+# Ranking weights
+PREFIX_BONUS = 2.0
+SUBSTRING_BONUS = 1.0
+
+# Trigram candidates are counted over every name once they outnumber
+# the names divided by this (see NameIndex.trigram_matches)
+DENSE_CANDIDATES = 2
+
+def normalize_name(name):
+    """Lowercase, strip accents and punctuation, collapse spaces"""
+    if not isinstance(name, str):
+        return ""
+    if not name.isascii():
+        name = unicodedata.normalize("NFKD", name)
+        name = "".join(c for c in name if not unicodedata.combining(c))
+    name = re.sub(r"[^\w\s]", " ", name.lower())
+    return re.sub(r"\s+", " ", name).strip()
+
+def trigrams(text):
+    """Set of trigrams of a normalized name (padded so short words have one)"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class NameIndex:
+    """
+    In-memory search index over game names
+    - a sorted list of normalized names for prefix (autocomplete) queries
+    - trigram posting lists (CSR layout) for fuzzy and substring queries
+    """
+
+    def __init__(self, app_ids, names):
+        self.app_ids = np.asarray(app_ids, dtype=np.int64)
+        self.names = list(names)
+        self.normalized = [normalize_name(name) for name in self.names]
+
+        # Prefix index
+        order = sorted(range(len(self.normalized)), key=self.normalized.__getitem__)
+        self.sorted_names = [self.normalized[i] for i in order]
+        self.sorted_positions = np.asarray(order, dtype=np.int64)
+
+        # Trigram index: trigram id -> positions[offsets[id]:offsets[id + 1]]
+        trigram_ids = {}
+        ids, positions = array('q'), array('q')
+        for position, name in enumerate(self.normalized):
+            grams = trigrams(name)
+            ids.extend(trigram_ids.setdefault(gram, len(trigram_ids)) for gram in grams)
+            positions.extend([position] * len(grams))
+
+        ids = np.frombuffer(ids, dtype=np.int64)
+        positions = np.frombuffer(positions, dtype=np.int64)
+        order = np.argsort(ids, kind="stable")
+        self.trigram_ids = trigram_ids
+        self.postings = positions[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(ids, minlength=len(trigram_ids)))])
+
+    def __len__(self):
+        return len(self.names)
+
+    def prefix_matches(self, query, limit):
+        """Positions of the names starting with query, in alphabetical order"""
+        start = bisect.bisect_left(self.sorted_names, query)
+        end = bisect.bisect_left(self.sorted_names, query + "\uffff", lo=start)
+        return self.sorted_positions[start:min(end, start + limit)]
+
+    def trigram_matches(self, query, limit):
+        """Positions of the names sharing the most trigrams with query, with their scores"""
+        grams = [self.trigram_ids[g] for g in trigrams(query) if g in self.trigram_ids]
+        if not grams:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        candidates = np.concatenate([self.postings[self.offsets[g]:self.offsets[g + 1]] for g in grams])
+        if len(candidates) > len(self.names) // DENSE_CANDIDATES:
+            # Common trigrams have postings of a large part of the names: one counting
+            # pass over the names (O(k + n)) is cheaper than sorting the candidates
+            counts = np.bincount(candidates, minlength=len(self.names))
+            positions = np.flatnonzero(counts)
+            counts = counts[positions]
+        else:
+            # Count the candidates only (not every name), sorting them costs O(k log k)
+            positions, counts = np.unique(candidates, return_counts=True)
+        
+        # Keep the names sharing most of the best match's trigrams
+        best_names = counts >= max(1, int(counts.max() * 0.6))
+        positions = positions[best_names]
+        scores = counts[best_names] / len(trigrams(query))
+        if len(positions) > limit:
+            best = np.argpartition(-scores, limit)[:limit]
+            positions, scores = positions[best], scores[best]
+        return positions, scores
+
+    def search(self, query, limit=10):
+        """
+        Return the best matches for query as dicts (app_id, name, score)
+        Prefix matches rank first, then substring matches, then trigram similarity
+        """
+        query = normalize_name(query)
+        if not query:
+            return []
+
+        scores = {}
+        for position in self.prefix_matches(query, limit):
+            scores[int(position)] = 1.0 + PREFIX_BONUS
+
+        # Autocomplete: enough names start with the query
+        if len(query) >= 3 and len(scores) < limit:
+            positions, similarity = self.trigram_matches(query, limit * 5)
+            for position, score in zip(positions.tolist(), similarity.tolist()):
+                name = self.normalized[position]
+                if name.startswith(query):
+                    score += PREFIX_BONUS
+                elif query in name:
+                    score += SUBSTRING_BONUS
+                scores[position] = max(scores.get(position, 0), score)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], len(self.normalized[item[0]])))
+        return [
+            {
+                'app_id': int(self.app_ids[position]),
+                'name': self.names[position],
+                'score': round(score, 3),
+            }
+            for position, score in ranked[:limit]
+        ]
+
+@node('name_index', deps=['games_raw'], warm=True)
+def name_index_node(df_games):
+    """Search index over the names of all games (built as soon as the games are loaded)"""
+    return NameIndex(df_games["app_id"], df_games["name"])
+
+def search_games(query, limit=10):
+    """Search games by name"""
+    return compute('name_index').search(query, limit)
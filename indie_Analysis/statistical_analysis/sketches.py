@@ -0,0 +1,244 @@
+# analysis/sketches.py
+
+import math
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .ingest import map_csv_source
+from .pipeline import node, compute
+
+def sketch_mode_enabled():
+    """Use sketches instead of exact counts for the top tags and language charts"""
+    return getattr(settings, "DATAPLAY_SKETCH_MODE", False)
+
+def hash_values(values):
+    """Stable 64-bit hashes of an array of values (same in every process)"""
+    values = np.asarray(values)
+    if values.dtype.kind in "USO":
+        values = values.astype(object)
+    return pd.util.hash_array(values)
+
+class CountMinSketch:
+    """
+    Count-Min sketch with a heavy-hitters list
+    Estimates never undercount, and overcount by at most epsilon * total
+    with probability 1 - delta
+    """
+
+    def __init__(self, epsilon=0.001, delta=0.001, heavy_hitters=100):
+        self.width = int(math.ceil(math.e / epsilon))
+        self.depth = int(math.ceil(math.log(1 / delta)))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.seeds = np.random.default_rng(0).integers(1, 2**63, size=self.depth, dtype=np.uint64) | np.uint64(1)
+        self.total = 0
+        self.capacity = heavy_hitters
+        self.candidates = {}
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def delta(self):
+        return math.exp(-self.depth)
+
+    def error_bound(self):
+        """Maximum overcount of any estimate (with probability 1 - delta)"""
+        return self.epsilon * self.total
+
+    def _columns(self, hashes):
+        # Multiply-shift hashing, one seed per row
+        return [((hashes * seed) >> np.uint64(32)) % np.uint64(self.width) for seed in self.seeds]
+
+    def update(self, values, counts=None):
+        """Add a chunk of values (optionally with counts)"""
+        values = np.asarray(values, dtype=object)
+        if len(values) == 0:
+            return
+        keys, inverse = np.unique(values, return_inverse=True)
+        weights = np.bincount(inverse, weights=counts, minlength=len(keys)).astype(np.int64)
+
+        hashes = hash_values(keys)
+        for row, columns in enumerate(self._columns(hashes)):
+            self.table[row] += np.bincount(columns.astype(np.int64), weights=weights, minlength=self.width).astype(np.int64)
+        self.total += int(weights.sum())
+
+        # Track the heaviest keys seen so far
+        estimates = self._estimate_hashes(hashes)
+        self.candidates.update(zip(keys.tolist(), estimates.tolist()))
+        if len(self.candidates) > self.capacity:
+            kept = sorted(self.candidates.items(), key=lambda item: -item[1])[:self.capacity]
+            self.candidates = dict(kept)
+
+    def merge(self, other):
+        """
+        Add the counts of another sketch built with the same parameters
+        The arrays are replaced, not updated in place, so readers never see half a merge
+        """
+        self.table = self.table + other.table
+        self.total += other.total
+        keys = list({**self.candidates, **other.candidates})
+        estimates = self._estimate_hashes(hash_values(np.asarray(keys, dtype=object))) if keys else []
+        kept = sorted(zip(keys, np.asarray(estimates).tolist()), key=lambda item: -item[1])[:self.capacity]
+        self.candidates = dict(kept)
+
+    def _estimate_hashes(self, hashes):
+        rows = [self.table[row][columns.astype(np.int64)] for row, columns in enumerate(self._columns(hashes))]
+        return np.min(rows, axis=0)
+
+    def estimate(self, value):
+        """Estimated count of a value"""
+        return int(self._estimate_hashes(hash_values([value]))[0])
+
+    def top(self, n):
+        """The n most frequent values as a Series (estimated counts)"""
+        ranked = sorted(self.candidates.items(), key=lambda item: (-item[1], item[0]))[:n]
+        return pd.Series(dict(ranked), dtype=np.int64)
+
+class HyperLogLog:
+    """Distinct count estimator, standard error 1.04 / sqrt(2 ** precision)"""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def update(self, values):
+        """Add a chunk of values"""
+        if len(values) == 0:
+            return
+        hashes = hash_values(values)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        remaining_bits = 64 - self.precision
+        rest = hashes & np.uint64((1 << remaining_bits) - 1)
+
+        # Position of the leftmost 1 bit in the remaining bits
+        _, exponent = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest == 0, remaining_bits + 1, remaining_bits - exponent + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        self.registers = np.maximum(self.registers, other.registers)
+
+    def count(self):
+        """Estimated number of distinct values"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+class DatasetSketches:
+    """
+    Constant-memory summaries of the tags and languages
+    Built from the raw sources, and updated shard by shard with new rows (delta
+    ingest) without recomputing
+    """
+
+    def __init__(self):
+        self.tags = CountMinSketch()
+        self.distinct_tags = HyperLogLog()
+        self.language_games = {}
+
+    def update_tags(self, tags):
+        tags = pd.Series(tags).dropna().to_numpy(dtype=object)
+        self.tags.update(tags)
+        self.distinct_tags.update(tags)
+
+    def update_languages(self, languages, app_ids):
+        languages = pd.Series(languages).to_numpy(dtype=object)
+        app_ids = np.asarray(app_ids)
+        for language in pd.unique(languages):
+            if language is None or (isinstance(language, float) and np.isnan(language)):
+                continue
+            if language not in self.language_games:
+                self.language_games[language] = HyperLogLog()
+            self.language_games[language].update(app_ids[languages == language])
+
+    def merge(self, other):
+        """Add the rows summarized by other (e.g. the sketches of one shard)"""
+        self.tags.merge(other.tags)
+        self.distinct_tags.merge(other.distinct_tags)
+        language_games = dict(self.language_games)
+        for language, hll in other.language_games.items():
+            if language in language_games:
+                language_games[language].merge(hll)
+            else:
+                language_games[language] = hll
+        self.language_games = language_games
+
+    def top_tags(self, n=20):
+        """Tags of the most games (estimated counts)"""
+        return self.tags.top(n)
+
+    def tag_error(self):
+        """Maximum overcount of the tag counts and the probability the bound holds"""
+        return self.tags.error_bound(), 1 - self.tags.delta
+
+    def distinct_tag_count(self):
+        return self.distinct_tags.count()
+
+    def language_game_counts(self):
+        """Distinct games per language (estimated), most common first"""
+        counts = {language: hll.count() for language, hll in self.language_games.items()}
+        return pd.Series(counts, dtype=np.int64).sort_values(ascending=False)
+
+    def language_error(self):
+        """Relative standard error of the games per language"""
+        hlls = list(self.language_games.values())
+        return hlls[0].relative_error() if hlls else 0.0
+
+def sketch_tags(frame, app_ids):
+    """
+    Sketches of a shard of tags.csv (rows of other apps than app_ids are ignored)
+    Tags are counted once per game, like the exact counts of the game x tag matrix;
+    a pair repeated in another shard or delta file is counted again
+    """
+    sketches = DatasetSketches()
+    frame = frame[frame["app_id"].isin(app_ids)]
+    pairs = pd.DataFrame({'app_id': frame["app_id"], 'tag': frame["tag"].str.strip()}).drop_duplicates()
+    sketches.update_tags(pairs["tag"])
+    return sketches
+
+def sketch_sources(sources, app_ids):
+    """Sketches of the tags of the games (app_ids) and of the languages, from the raw sources"""
+    # The Q3 module imports this one
+    from .q3_analysis import sketch_languages
+
+    sketches = sketch_tags(sources['tags'], np.asarray(app_ids, dtype=np.int64))
+    sketches.merge(sketch_languages(sources['games']))
+    return sketches
+
+def update_sketches(sketches, app_ids, delta=None):
+    """
+    Feed the tags and languages to sketches, shard by shard in the ingest pool
+    Each shard is sketched where it is parsed and only its sketches are merged,
+    no frame of the whole file is built
+    app_ids are the games whose tags are counted
+    delta maps 'tags' / 'games' to files of new rows in the format of the raw
+    sources: only these rows are added (e.g. after an incremental dump)
+    """
+    # The Q3 module imports this one
+    from .q3_analysis import sketch_languages
+
+    paths = delta if delta is not None else {'tags': None, 'games': None}
+    if 'tags' in paths:
+        for partial in map_csv_source('tags', sketch_tags, np.asarray(app_ids, dtype=np.int64), path=paths['tags']):
+            sketches.merge(partial)
+    if 'games' in paths:
+        for partial in map_csv_source('games', sketch_languages, path=paths['games']):
+            sketches.merge(partial)
+    return sketches
+
+@node('sketches', deps=['raw_sources', 'games_raw'])
+def sketches_node(sources, df_games):
+    """Sketches of the tags and languages of the games"""
+    return sketch_sources(sources, df_games["app_id"])
+
+def get_sketches():
+    return compute('sketches')
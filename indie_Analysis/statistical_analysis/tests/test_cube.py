@@ -0,0 +1,90 @@
+import itertools
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+from statistical_analysis.cube import build_cube
+from statistical_analysis.incidence import build_incidence
+from statistical_analysis.q2_analysis import BUCKET_ORDER
+
+
+class OlapCubeTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(6)
+        count = 300
+        self.games = pd.DataFrame({
+            'app_id': np.arange(1, count + 1),
+            'price_eur': np.round(rng.random(count) * 40, 2),
+            'price_bucket': pd.Categorical(rng.choice(BUCKET_ORDER, count), categories=BUCKET_ORDER),
+            'reviews': rng.integers(0, 1000, count).astype(float),
+        })
+        # Games in several genres and languages, some in none
+        self.genres = pd.DataFrame({
+            'app_id': rng.choice(self.games["app_id"], 400),
+            'genre_normalized': rng.choice(["Action", "RPG", "Puzzle"], 400),
+        }).drop_duplicates()
+        self.languages = pd.DataFrame({
+            'app_id': rng.choice(self.games["app_id"], 450),
+            'language': rng.choice(["English", "French", "German"], 450),
+        }).drop_duplicates()
+        self.cube = build_cube(
+            self.games, self.genres,
+            build_incidence(self.languages["app_id"], self.languages["language"]),
+            self.games["reviews"].to_numpy(),
+        )
+
+    def expected(self, genre=None, language=None, price_bucket=None):
+        """Measures of the distinct matching games, with pandas"""
+        as_list = lambda value: [value] if isinstance(value, str) else value
+        games = self.games
+        if genre:
+            games = games[games["app_id"].isin(self.genres.loc[self.genres["genre_normalized"].isin(as_list(genre)), "app_id"])]
+        if language:
+            games = games[games["app_id"].isin(self.languages.loc[self.languages["language"].isin(as_list(language)), "app_id"])]
+        if price_bucket:
+            games = games[games["price_bucket"].isin(as_list(price_bucket))]
+        return len(games), games["reviews"].sum(), games["price_eur"].sum()
+
+    def assert_cell(self, **filters):
+        cell = self.cube.cell(**filters)
+        games, reviews, price_sum = self.expected(**filters)
+        self.assertEqual(cell['games'], games, filters)
+        self.assertAlmostEqual(cell['total_reviews'], reviews, msg=filters)
+        self.assertAlmostEqual(cell['price_sum'], price_sum, msg=filters)
+        if games:
+            self.assertAlmostEqual(cell['avg_price'], price_sum / games)
+
+    def test_every_cell_and_roll_up(self):
+        # Every combination of values, None being the ALL marginal of a dimension
+        for genre, language, price_bucket in itertools.product(
+            [None, "Action", "RPG", "Puzzle"], [None, "English", "French", "German"], [None] + BUCKET_ORDER,
+        ):
+            self.assert_cell(genre=genre, language=language, price_bucket=price_bucket)
+
+    def test_roll_up(self):
+        fixed = {'genre': "RPG", 'language': "French", 'price_bucket': "Free"}
+        for dimension in fixed:
+            self.assertEqual(self.cube.roll_up(dimension, **fixed), self.cube.cell(**{**fixed, dimension: None}))
+
+    def test_lists_count_each_game_once(self):
+        for filters in [
+            {'genre': ["Action", "RPG"]},
+            {'language': ["English", "French", "German"]},
+            {'genre': ["Action", "Puzzle"], 'language': ["French", "German"]},
+            {'genre': ["RPG", "Puzzle"], 'language': "English", 'price_bucket': ["Free", BUCKET_ORDER[3]]},
+            {'genre': ["RPG", "RPG"]},
+            {'price_bucket': ["Free", BUCKET_ORDER[1]]},
+        ]:
+            self.assert_cell(**filters)
+
+    def test_drill_down(self):
+        rows = self.cube.drill_down("genre", language=["English", "German"], price_bucket="Free")
+        self.assertEqual([row['genre'] for row in rows], ["Action", "Puzzle", "RPG"])
+        for row in rows:
+            self.assertEqual(row['games'], self.expected(row['genre'], ["English", "German"], "Free")[0])
+
+    def test_unknown_values(self):
+        with self.assertRaisesRegex(KeyError, "Unknown genre: Racing"):
+            self.cube.cell(genre=["RPG", "Racing"])
+        with self.assertRaises(KeyError):
+            self.cube.drill_down("platform")
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+from statistical_analysis.exchange_rates import convert_to_eur, get_price_date, load_rate_table
+
+RATES = (
+    "date,currency,per_eur\n"
+    "2024-06-30,USD,1.25\n"
+    "2024-12-31,USD,2.0\n"
+    "2025-06-30,USD,4.0\n"
+    "2024-12-31,GBP,0.5\n"
+    "2024-12-31,EUR,1.0\n"
+)
+
+
+class ConvertToEurTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "rates.csv")
+        with open(path, "w") as f:
+            f.write(RATES)
+        settings = override_settings(DATAPLAY_EXCHANGE_RATES_FILE=path, DATAPLAY_PRICE_DATE=None)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def convert(self, prices, currencies, dates=None):
+        return convert_to_eur(prices, currencies, dates).tolist()
+
+    def test_latest_rate_at_each_date(self):
+        # Between two rates the earlier one applies, on a rate date that rate applies
+        dates = pd.to_datetime(["2024-09-15", "2024-12-31", "2025-01-01", "2026-01-01"])
+        self.assertEqual(self.convert([10, 10, 10, 10], ["USD"] * 4, dates), [8.0, 5.0, 5.0, 2.5])
+
+    def test_dates_before_the_first_rate(self):
+        dates = pd.to_datetime(["2020-01-01", "2020-01-01"])
+        self.assertEqual(self.convert([10, 10], ["USD", "GBP"], dates), [8.0, 20.0])
+
+    def test_unknown_currency_and_missing_prices(self):
+        self.assertEqual(self.convert([10, np.nan, 10, 10], ["XYZ", "USD", None, "EUR"]), [0.0, 0.0, 0.0, 10.0])
+
+    def test_rows_keep_their_order(self):
+        dates = pd.to_datetime(["2025-07-01", "2024-07-01", "2024-12-31"])
+        self.assertEqual(self.convert([4, 5, 1], ["USD", "USD", "GBP"], dates), [1.0, 4.0, 2.0])
+
+    def test_default_date_is_the_capture_date(self):
+        self.assertEqual(get_price_date(), pd.Timestamp("2024-12-31"))
+        self.assertEqual(self.convert([10, 10], ["USD", "GBP"]), [5.0, 20.0])
+        with override_settings(DATAPLAY_PRICE_DATE="2025-07-01"):
+            self.assertEqual(self.convert([10], ["USD"]), [2.5])
+
+    def test_rate_table(self):
+        table = load_rate_table()
+        self.assertTrue(table["date"].is_monotonic_increasing)
+        self.assertEqual(table.loc[table["currency"] == "USD", "rate_to_eur"].tolist(), [0.8, 0.5, 0.25])
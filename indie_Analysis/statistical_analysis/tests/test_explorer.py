@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+from statistical_analysis.explorer import FILTER_CACHE_ENTRIES, GameExplorer, decode_cursor, encode_cursor
+from statistical_analysis.incidence import build_incidence
+
+
+class GameExplorerTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        count = 500
+        price = rng.integers(0, 20, count).astype(float)
+        price[rng.random(count) < 0.1] = np.nan
+        self.games = pd.DataFrame({
+            'app_id': rng.permutation(np.arange(10, 10 + count)),
+            'name': [f"Jeu {i}" for i in range(count)],
+            'price_eur': price,
+            'total_reviews': rng.integers(0, 50, count).astype(float),
+            'metacritic_score': np.nan,
+        })
+        app_ids = self.games["app_id"].to_numpy()
+        self.genres = pd.DataFrame({
+            'app_id': app_ids,
+            'genre_normalized': rng.choice(["Action", "RPG", "Puzzle"], count),
+        })
+        self.tags = pd.DataFrame({'app_id': rng.choice(app_ids, 800), 'tag': rng.choice(["Pixel", "Rare"], 800, p=[0.95, 0.05])})
+        self.explorer = GameExplorer(
+            self.games, self.genres,
+            build_incidence(self.tags["app_id"], self.tags["tag"]),
+            build_incidence(app_ids, np.where(app_ids % 3, "English", "French")),
+        )
+
+    def all_pages(self, limit, **kwargs):
+        app_ids, cursor = [], None
+        while True:
+            rows, cursor = self.explorer.page(cursor=cursor, limit=limit, **kwargs)
+            self.assertLessEqual(len(rows), limit)
+            app_ids += [row["app_id"] for row in rows]
+            if cursor is None:
+                return app_ids
+
+    def expected(self, sort, descending, games=None):
+        games = self.games if games is None else games
+        # Missing values last, ties by app_id
+        ordered = games.assign(missing=games[sort].isna(), key=-games[sort] if descending else games[sort])
+        return ordered.sort_values(["missing", "key", "app_id"])["app_id"].tolist()
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(12.5, 42)), (12.5, 42))
+        for cursor in ("", "not a cursor", encode_cursor("price", 1)):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def test_pages_follow_the_sort_order(self):
+        for sort in ("price_eur", "total_reviews", "metacritic_score"):
+            for descending in (False, True):
+                self.assertEqual(self.all_pages(37, sort=sort, descending=descending), self.expected(sort, descending))
+
+    def test_filtered_pages(self):
+        rare = self.tags.loc[self.tags["tag"] == "Rare", "app_id"]
+        games = self.games[
+            self.games["app_id"].isin(self.genres.loc[self.genres["genre_normalized"].isin(["RPG", "Puzzle"]), "app_id"])
+            & self.games["app_id"].isin(rare)
+        ]
+        self.assertEqual(
+            self.all_pages(3, sort="price_eur", descending=False, genre=["RPG", "Puzzle"], tag=["Rare"]),
+            self.expected("price_eur", False, games),
+        )
+        self.assertEqual(self.all_pages(10, tag=["Inconnu"]), [])
+
+        french = self.games[self.games["app_id"] % 3 == 0]
+        self.assertEqual(self.all_pages(20, language=["French"]), self.expected("total_reviews", True, french))
+
+    def test_unknown_sort_key(self):
+        with self.assertRaises(ValueError):
+            self.explorer.page(sort="name")
+
+    def test_filter_sets_cached(self):
+        # Later pages and reordered values reuse the positions of the filter set
+        rows, cursor = self.explorer.page(limit=5, genre=["RPG", "Action"])
+        self.explorer.page(cursor=cursor, limit=5, genre=["Action", "RPG"])
+        self.assertEqual(len(self.explorer._positions), 1)
+
+        for i in range(FILTER_CACHE_ENTRIES + 5):
+            self.explorer.page(limit=1, genre=[f"Genre {i}"])
+        self.assertEqual(len(self.explorer._positions), FILTER_CACHE_ENTRIES)
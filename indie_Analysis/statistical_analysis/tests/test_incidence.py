@@ -0,0 +1,49 @@
+import numpy as np
+from django.test import SimpleTestCase
+from statistical_analysis.incidence import build_incidence
+
+
+class IncidenceMatrixTests(SimpleTestCase):
+
+    def dense(self, matrix):
+        result = np.zeros(matrix.shape)
+        result[matrix.row_ids(), matrix.indices] = 1
+        return result
+
+    def test_build_incidence(self):
+        matrix = build_incidence([3, 1, 3, 3, 2, None], ["b", "a", "a", "b", None, "c"])
+        self.assertEqual(matrix.row_labels.tolist(), [1, 3])
+        self.assertEqual(matrix.column_labels.tolist(), ["a", "b"])
+        np.testing.assert_array_equal(self.dense(matrix), [[1, 0], [1, 1]])
+        np.testing.assert_array_equal(matrix.column_nnz(), [2, 1])
+        self.assertEqual([label.tolist() for label in matrix.pairs()], [[1, 3, 3], ["a", "a", "b"]])
+        self.assertEqual(matrix.rows_with(["b", "z"]).tolist(), [3])
+        self.assertEqual(matrix.rows_with(["a", "b"]).tolist(), [1, 3])
+
+    def test_product_matches_dense(self):
+        rng = np.random.default_rng(3)
+        rows = np.arange(300)
+        left = build_incidence(rng.choice(rows, 2000), rng.integers(0, 40, 2000), row_labels=rows)
+        right = build_incidence(rng.choice(rows, 1500), rng.integers(0, 25, 1500), row_labels=rows)
+        weights = rng.random(len(rows))
+
+        expected = self.dense(left).T @ np.diag(weights) @ self.dense(right)
+        np.testing.assert_allclose(left.product(right, weights), expected)
+        np.testing.assert_allclose(left.product(right, weights, block_pairs=50), expected)
+        np.testing.assert_allclose(left.product(right), self.dense(left).T @ self.dense(right))
+        np.testing.assert_allclose(left.rmatvec(weights), self.dense(left).T @ weights)
+
+        part = left.rows(100, 200)
+        np.testing.assert_array_equal(self.dense(part), self.dense(left)[100:200])
+
+    def test_product_needs_aligned_rows(self):
+        left = build_incidence([1, 2], ["a", "b"])
+        right = build_incidence([1, 3], ["a", "b"])
+        with self.assertRaises(ValueError):
+            left.product(right)
+
+    def test_fixed_row_labels(self):
+        # Rows without pairs are kept, pairs of other rows dropped
+        matrix = build_incidence([5, 7, 9], ["a", "b", "a"], row_labels=[5, 6, 7])
+        self.assertEqual(matrix.shape, (3, 2))
+        np.testing.assert_array_equal(self.dense(matrix), [[1, 0], [0, 0], [0, 1]])
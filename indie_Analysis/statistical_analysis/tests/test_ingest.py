@@ -0,0 +1,109 @@
+import csv
+import os
+import tempfile
+from unittest import mock
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+from statistical_analysis import ingest
+from statistical_analysis.ingest import CSV_SOURCES, _plan_file, _restore_integers, find_record_boundaries
+
+# Text with the characters that make record boundaries hard to find
+TEXT_PARTS = ["jeu", "a,b", 'dit "oui"', "ligne\nsuivante", "\\", "\\\\", "fin\\", "\r\n", " "]
+
+
+def random_text(rng):
+    return "".join(rng.choice(TEXT_PARTS, size=rng.integers(1, 5)))
+
+
+@override_settings(DATAPLAY_INGEST_WORKERS=8, DATAPLAY_INGEST_SHARD_BYTES=64)
+class ShardedParseTests(SimpleTestCase):
+    """Shards parsed one by one and concatenated must equal a sequential read_csv"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        rng = np.random.default_rng(5)
+        count = 400
+        reviews = rng.integers(0, 10_000, count).astype(float)
+        reviews[-20:][rng.random(20) < 0.5] = np.nan  # missing values only after the head
+        self.rows = pd.DataFrame({
+            'app_id': np.arange(1, count + 1),
+            'name': [random_text(rng) for _ in range(count)],
+            'price': np.round(rng.random(count) * 60, 2),
+            'reviews': reviews,
+            'tag': rng.choice(["Action", "RPG", "Pixel Graphics"], count),
+        })
+
+    def write(self, name, lines):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write("".join(lines))
+        return path
+
+    def write_doubled_quotes(self):
+        # Quotes inside a field are doubled (genres.csv, tags.csv)
+        path = os.path.join(self.directory.name, "doubled.csv")
+        self.rows.to_csv(path, index=False, quoting=csv.QUOTE_NONNUMERIC)
+        return path
+
+    def write_escaped_quotes(self):
+        # Quotes and escape characters inside a field are escaped with a backslash (games.csv)
+        def field(value):
+            if isinstance(value, str):
+                return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+            return "" if pd.isna(value) else repr(value)
+        lines = [",".join(self.rows.columns) + "\n"]
+        lines += [",".join(field(value) for value in row) + "\n" for row in self.rows.itertuples(index=False)]
+        return self.write("escaped.csv", lines)
+
+    def assert_sharded_equals_sequential(self, path, options):
+        tasks, integers = _plan_file(path, options)
+        self.assertGreater(len(tasks), 1)
+        sharded = _restore_integers(pd.concat([func(*args) for func, args in tasks], ignore_index=True), integers)
+        sequential = pd.read_csv(path, **options)
+        pd.testing.assert_frame_equal(sharded, sequential)
+        return sharded
+
+    def test_doubled_quotes(self):
+        sharded = self.assert_sharded_equals_sequential(self.write_doubled_quotes(), CSV_SOURCES['tags']['options'])
+        self.assertEqual(sharded["name"].tolist(), self.rows["name"].tolist())
+
+    def test_escaped_quotes(self):
+        sharded = self.assert_sharded_equals_sequential(self.write_escaped_quotes(), CSV_SOURCES['games']['options'])
+        self.assertEqual(sharded["name"].tolist(), self.rows["name"].tolist())
+
+    def test_scan_blocks_cut_inside_fields(self):
+        # Blocks of a few bytes end inside quoted fields and runs of escape characters
+        for block_size in (3, 7, 64):
+            with self.subTest(block_size=block_size), mock.patch.object(ingest, "SCAN_BLOCK_SIZE", block_size):
+                self.assert_sharded_equals_sequential(self.write_escaped_quotes(), CSV_SOURCES['games']['options'])
+                self.assert_sharded_equals_sequential(self.write_doubled_quotes(), CSV_SOURCES['tags']['options'])
+
+    def test_no_quoting(self):
+        path = self.write("reviews.csv", ["app_id,total,positive\n"] + [f"{i},{i * 3},{i * 2}\n" for i in range(500)])
+        sharded = self.assert_sharded_equals_sequential(path, CSV_SOURCES['reviews']['options'])
+        self.assertEqual(sharded["total"].dtype, np.int64)
+
+    def test_dtypes_from_the_head(self):
+        path = self.write_escaped_quotes()
+        with mock.patch.object(ingest, "DTYPE_SAMPLE_BYTES", 256):
+            sharded = self.assert_sharded_equals_sequential(path, CSV_SOURCES['games']['options'])
+        # Integers without missing values stay integers, later missing values make floats
+        self.assertEqual(sharded["app_id"].dtype, np.int64)
+        self.assertEqual(sharded["reviews"].dtype, np.float64)
+        self.assertEqual(sharded["reviews"].isna().sum(), self.rows["reviews"].isna().sum())
+
+    def test_boundaries_start_records(self):
+        path = self.write_doubled_quotes()
+        boundaries = find_record_boundaries(path, 16, b'"')
+        self.assertEqual(boundaries[-1][1], os.path.getsize(path))
+        self.assertTrue(all(end == start for (_, end), (start, _) in zip(boundaries, boundaries[1:])))
+
+        with open(path, "rb") as f:
+            data = f.read()
+        for start, _ in boundaries:
+            # Every shard starts with an app_id, right after a newline outside quotes
+            self.assertEqual(data[start - 1:start], b"\n")
+            self.assertEqual(data[:start].count(b'"') % 2, 0)
+            self.assertRegex(data[start:start + 8].decode(), r"^\d+,")
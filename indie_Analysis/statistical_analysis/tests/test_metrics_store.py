@@ -0,0 +1,65 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+from statistical_analysis.metrics_store import get_store_root, open_metrics_store, store_path
+
+REVIEWS = pd.DataFrame({
+    'app_id': [30, 10, 20, 10],
+    'positive': [3.0, 1.0, 2.0, 5.0],
+    'negative': [0.0, 1.0, np.nan, 2.0],
+    'total': [3.0, 2.0, 2.0, 7.0],
+})
+
+
+class MetricsStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(DATAPLAY_METRICS_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.loads = 0
+
+    def open(self, version="v1"):
+        def load_reviews():
+            self.loads += 1
+            return REVIEWS
+        return open_metrics_store(load_reviews, version)
+
+    def test_sorted_by_app_id_last_row_wins(self):
+        store = self.open()
+        self.assertEqual(store.app_ids.tolist(), [10, 20, 30])
+        metrics = store.get(10)
+        self.assertEqual({key: metrics[key] for key in ('positive', 'negative', 'total')}, {
+            'positive': 5.0, 'negative': 2.0, 'total': 7.0,
+        })
+        # Columns missing from the reviews are stored as NaN
+        self.assertTrue(np.isnan(metrics['recommendations']))
+
+    def test_lookup_present_and_missing(self):
+        store = self.open()
+        np.testing.assert_array_equal(store.lookup([30, 5, 20, 40, 10], "total"), [3.0, np.nan, 2.0, np.nan, 7.0])
+        np.testing.assert_array_equal(store.lookup([30, 5, 40], "total", fill=0), [3.0, 0.0, 0.0])
+        # A game whose value is missing keeps its NaN, only absent games get the fill value
+        np.testing.assert_array_equal(store.lookup([20, 25], "negative", fill=-1), [np.nan, -1.0])
+        self.assertIsNone(store.get(25))
+        self.assertEqual(store.lookup([], "total").tolist(), [])
+
+    def test_built_once_per_version(self):
+        self.open()
+        self.open()
+        self.assertEqual(self.loads, 1)
+        self.open("v2")
+        self.assertEqual(self.loads, 2)
+
+    def test_old_stores_removed(self):
+        self.open("v1")
+        os.makedirs(os.path.join(get_store_root(), "building.tmp"))
+        self.open("v2")
+        self.assertEqual(
+            sorted(os.listdir(get_store_root())),
+            sorted([os.path.basename(store_path("v2")), "building.tmp"]),
+        )
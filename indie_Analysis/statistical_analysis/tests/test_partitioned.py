@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+from statistical_analysis.incidence import build_incidence
+from statistical_analysis.partitioned import column_aggregates, partition_rows
+
+
+class ColumnAggregatesTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        # Some rows have no pairs
+        self.matrix = build_incidence(
+            rng.integers(0, 400, 3000), rng.choice(list("abcdefgh"), 3000),
+            row_labels=np.arange(500),
+        )
+        self.values = rng.random(500) * 100
+
+    def expected(self):
+        """Sums and distinct rows per column, with pandas"""
+        rows, columns = self.matrix.pairs()
+        pairs = pd.DataFrame({'row': rows, 'column': columns, 'value': self.values[rows]})
+        grouped = pairs.groupby("column").agg(sums=("value", "sum"), counts=("row", "nunique"))
+        grouped = grouped.reindex(self.matrix.column_labels)
+        return grouped["sums"].to_numpy(), grouped["counts"].to_numpy()
+
+    def test_blocks_match_a_single_pass(self):
+        sums, counts = self.expected()
+        for block_pairs in (10 ** 9, 1000, 97, 1):
+            with self.subTest(block_pairs=block_pairs), override_settings(DATAPLAY_AGGREGATE_BLOCK_PAIRS=block_pairs):
+                block_sums, block_counts = column_aggregates(self.matrix, self.values)
+                np.testing.assert_allclose(block_sums, sums)
+                np.testing.assert_array_equal(block_counts, counts)
+
+    def test_partition_rows(self):
+        blocks = partition_rows(self.matrix, 7)
+        self.assertEqual(blocks[0][0], 0)
+        self.assertEqual(blocks[-1][1], self.matrix.shape[0])
+        self.assertTrue(all(end == start for (_, end), (start, _) in zip(blocks, blocks[1:])))
+        pairs = [self.matrix.indptr[end] - self.matrix.indptr[start] for start, end in blocks]
+        self.assertEqual(sum(pairs), self.matrix.nnz)
+        self.assertLess(max(pairs) - min(pairs), self.matrix.nnz / 7)
@@ -0,0 +1,186 @@
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from statistical_analysis import datasets, pipeline
+from statistical_analysis.datasets import register_snapshot, use_snapshot
+from statistical_analysis.pipeline import NODES, checkpoint_key, compute, invalidate, memory_usage, node
+
+
+class PipelineTestCase(SimpleTestCase):
+    """Test nodes and snapshots are registered per test and removed afterwards"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.nodes = []
+        self.calls = {}
+
+    def tearDown(self):
+        for name in self.nodes:
+            invalidate(name)
+            NODES.pop(name, None)
+        with datasets._registered_lock:
+            for snapshot_id in [key for key in datasets._registered if key.startswith("test-")]:
+                del datasets._registered[snapshot_id]
+
+    def snapshot(self, snapshot_id):
+        path = os.path.join(self.directory.name, snapshot_id)
+        os.makedirs(path, exist_ok=True)
+        register_snapshot(snapshot_id, path)
+        return path
+
+    def add_node(self, name, deps=(), value=lambda *inputs: sum(inputs, 1), **options):
+        """Register a node counting its calls"""
+        def func(*inputs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return value(*inputs)
+        node(name, deps=deps, **options)(func)
+        self.nodes.append(name)
+
+
+class ComputeTests(PipelineTestCase):
+
+    def test_memoized_per_dataset_version(self):
+        path = self.snapshot("test-memo")
+        self.add_node("test_base")
+        self.add_node("test_derived", deps=["test_base"])
+
+        with use_snapshot("test-memo"):
+            self.assertEqual(compute("test_derived"), 2)
+            self.assertEqual(compute("test_derived"), 2)
+            self.assertEqual(compute("test_base"), 1)
+            self.assertEqual(self.calls, {'test_base': 1, 'test_derived': 1})
+
+            # A new games.csv is a new dataset version
+            with open(os.path.join(path, "games.csv"), "w") as f:
+                f.write("app_id\n1\n")
+            compute("test_derived")
+            self.assertEqual(self.calls, {'test_base': 2, 'test_derived': 2})
+
+    def test_versioned_by_called_once_per_compute(self):
+        self.snapshot("test-versions")
+        versions = []
+        def rate_version():
+            versions.append(1)
+            return "rates-1"
+        self.add_node("test_rates", versioned_by=[rate_version])
+        self.add_node("test_prices", deps=["test_rates"])
+        self.add_node("test_report", deps=["test_prices", "test_rates"])
+
+        with use_snapshot("test-versions"):
+            compute("test_report")
+            versions.clear()
+            compute("test_report")
+        self.assertEqual(len(versions), 1)
+
+    def test_input_version_change_recomputes(self):
+        self.snapshot("test-inputs")
+        state = {'rates': 1}
+        self.add_node("test_rates", versioned_by=[lambda: state['rates']])
+        self.add_node("test_prices", deps=["test_rates"])
+
+        with use_snapshot("test-inputs"):
+            compute("test_prices")
+            compute("test_prices")
+            state['rates'] = 2
+            compute("test_prices")
+        self.assertEqual(self.calls, {'test_rates': 2, 'test_prices': 2})
+
+    def test_invalidate(self):
+        self.snapshot("test-invalidate")
+        self.add_node("test_base")
+        self.add_node("test_derived", deps=["test_base"])
+
+        with use_snapshot("test-invalidate"):
+            compute("test_derived")
+            invalidate("test_derived")
+            compute("test_derived")
+            self.assertEqual(self.calls, {'test_base': 1, 'test_derived': 2})
+            invalidate()
+            compute("test_derived")
+            self.assertEqual(self.calls, {'test_base': 2, 'test_derived': 3})
+
+    def test_unknown_node(self):
+        with self.assertRaises(KeyError):
+            compute("test_missing")
+
+
+class CheckpointTests(PipelineTestCase):
+
+    def test_key_follows_upstream_versions(self):
+        self.snapshot("test-keys")
+        state = {'rates': 1}
+        self.add_node("test_rates", code_version=1, versioned_by=[lambda: state['rates']])
+        self.add_node("test_prices", deps=["test_rates"])
+
+        with use_snapshot("test-keys"):
+            version = pipeline.get_dataset_version()
+            key = checkpoint_key("test_prices", version)
+            self.assertEqual(checkpoint_key("test_prices", version), key)
+
+            state['rates'] = 2
+            rates_key = checkpoint_key("test_prices", version)
+            self.assertNotEqual(rates_key, key)
+
+            self.add_node("test_rates", code_version=2, versioned_by=[lambda: state['rates']])
+            self.assertNotIn(checkpoint_key("test_prices", version), (key, rates_key))
+
+    def test_checkpoint_reused_after_restart(self):
+        self.snapshot("test-checkpoint")
+        self.add_node("test_frame", value=lambda: np.arange(3), checkpoint=True)
+
+        with override_settings(DATAPLAY_CHECKPOINT_DIR=os.path.join(self.directory.name, "checkpoints")):
+            with use_snapshot("test-checkpoint"):
+                compute("test_frame")
+                invalidate("test_frame")
+                np.testing.assert_array_equal(compute("test_frame"), np.arange(3))
+        self.assertEqual(self.calls, {'test_frame': 1})
+
+    def test_dependencies_skipped_on_checkpoint_hit(self):
+        self.snapshot("test-skip")
+        self.add_node("test_sources", value=lambda: np.arange(3))
+        self.add_node("test_loaded", deps=["test_sources"], value=lambda sources: sources * 2, checkpoint=True)
+
+        with override_settings(DATAPLAY_CHECKPOINT_DIR=os.path.join(self.directory.name, "checkpoints")):
+            with use_snapshot("test-skip"):
+                compute("test_loaded")
+                invalidate()
+                np.testing.assert_array_equal(compute("test_loaded"), np.arange(3) * 2)
+        self.assertEqual(self.calls, {'test_sources': 1, 'test_loaded': 1})
+
+
+class MemoryBudgetTests(PipelineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_node("test_array", value=lambda: np.zeros(1000))
+        for snapshot_id in ("test-a", "test-b", "test-c"):
+            self.snapshot(snapshot_id)
+
+    def compute_in(self, *snapshot_ids):
+        for snapshot_id in snapshot_ids:
+            with use_snapshot(snapshot_id):
+                compute("test_array")
+
+    def test_least_recently_used_snapshot_evicted(self):
+        with override_settings(DATAPLAY_SNAPSHOT_MEMORY_BYTES=None):
+            self.compute_in("test-a", "test-b")
+            # test-a used again: test-b is now the least recently used
+            self.compute_in("test-a")
+        with override_settings(DATAPLAY_SNAPSHOT_MEMORY_BYTES=16_500 + sum(
+            size for snapshot_id, size in memory_usage().items() if not snapshot_id.startswith("test-")
+        )):
+            self.compute_in("test-c")
+        usage = memory_usage()
+        self.assertNotIn("test-b", usage)
+        self.assertIn("test-a", usage)
+        self.assertIn("test-c", usage)
+
+    def test_active_snapshot_never_evicted(self):
+        with override_settings(DATAPLAY_SNAPSHOT_MEMORY_BYTES=100):
+            self.compute_in("test-a", "test-b")
+        usage = memory_usage()
+        self.assertNotIn("test-a", usage)
+        self.assertIn("test-b", usage)
+        self.assertEqual(self.calls, {'test_array': 2})
@@ -0,0 +1,135 @@
+from unittest import mock
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+from statistical_analysis import q2_analysis
+from statistical_analysis.incidence import build_incidence
+from statistical_analysis.quantiles import KLLSketch, build_price_sketches
+
+
+class KLLSketchTests(SimpleTestCase):
+
+    def setUp(self):
+        self.values = np.random.default_rng(2).lognormal(2, 1, 100_000)
+
+    def assert_rank_error(self, sketch, values, max_error):
+        for q in (0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+            rank = np.searchsorted(np.sort(values), sketch.quantile(q)) / len(values)
+            self.assertLess(abs(rank - q), max_error, q)
+
+    def test_exact_while_small(self):
+        sketch = KLLSketch()
+        sketch.update(self.values[:100])
+        self.assertTrue(sketch.is_exact())
+        np.testing.assert_allclose(sketch.quantiles([0.1, 0.5, 0.9]), np.quantile(self.values[:100], [0.1, 0.5, 0.9]))
+
+    def test_quantiles(self):
+        sketch = KLLSketch()
+        sketch.update(np.append(self.values, np.nan))
+        self.assertEqual(len(sketch), len(self.values))
+        self.assertAlmostEqual(sketch.mean(), self.values.mean())
+        self.assertEqual((sketch.min, sketch.max), (self.values.min(), self.values.max()))
+        self.assert_rank_error(sketch, self.values, 0.02)
+
+    def test_merge(self):
+        parts = []
+        for chunk in np.array_split(self.values, 10):
+            part = KLLSketch()
+            part.update(chunk)
+            parts.append(part)
+        merged = KLLSketch.merged(parts)
+        self.assertEqual(len(merged), len(self.values))
+        self.assertAlmostEqual(merged.total, self.values.sum(), places=3)
+        self.assert_rank_error(merged, self.values, 0.02)
+
+
+class PriceSketchesTests(SimpleTestCase):
+    """Small enough for every sketch to be exact, so it must match pandas"""
+
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        count = 150
+        prices = np.round(rng.lognormal(2, 0.8, count), 2)
+        prices[:30] = 0
+        self.games = pd.DataFrame({
+            'app_id': np.arange(100, 100 + count),
+            'price_eur': prices,
+            'is_free': prices == 0,
+            'is_paid': prices > 0,
+        })
+        # Games have one to three genres and languages
+        genres = pd.DataFrame({
+            'app_id': np.concatenate([self.games["app_id"], self.games["app_id"][::2], self.games["app_id"][::3]]),
+            'genre_normalized': np.concatenate([
+                rng.choice(["Action", "RPG", "Puzzle"], count),
+                np.full(len(self.games[::2]), "Action"),
+                np.full(len(self.games[::3]), "RPG"),
+            ]),
+        })
+        languages = pd.DataFrame({
+            'app_id': np.concatenate([self.games["app_id"], self.games["app_id"][::4]]),
+            'language': np.concatenate([rng.choice(["English", "French"], count), np.full(len(self.games[::4]), "German")]),
+        })
+        self.genres = genres.drop_duplicates()
+        self.languages = languages.drop_duplicates()
+        self.sketches = build_price_sketches(
+            self.games, self.genres, build_incidence(self.languages["app_id"], self.languages["language"]),
+        )
+
+    def expected(self, genres=None, languages=None, segment=None):
+        """Prices of the distinct games matching the filters, with pandas"""
+        games = self.games
+        if genres:
+            games = games[games["app_id"].isin(self.genres.loc[self.genres["genre_normalized"].isin(genres), "app_id"])]
+        if languages:
+            games = games[games["app_id"].isin(self.languages.loc[self.languages["language"].isin(languages), "app_id"])]
+        if segment == "free":
+            games = games[games["is_free"]]
+        elif segment == "paid":
+            games = games[games["is_paid"]]
+        return games["price_eur"]
+
+    def assert_matches(self, sketch, prices):
+        self.assertEqual(sketch.n, len(prices))
+        self.assertTrue(sketch.is_exact())
+        qs = [0.1, 0.25, 0.5, 0.75, 0.9]
+        np.testing.assert_allclose(sketch.quantiles(qs), prices.quantile(qs).to_numpy())
+        self.assertAlmostEqual(sketch.mean(), prices.mean())
+
+    def test_single_values(self):
+        for genre, language, segment in [(None, None, None), ("RPG", None, None), (None, "French", "paid"), ("Action", "German", "free")]:
+            with self.subTest(genre=genre, language=language, segment=segment):
+                self.assert_matches(
+                    self.sketches.query(genre, language, segment),
+                    self.expected(genre and [genre], language and [language], segment),
+                )
+
+    def test_multiple_values_count_each_game_once(self):
+        for genres, languages in [(["Action", "RPG"], None), (["RPG", "Puzzle"], ["French", "German"]), (None, ["English", "German"])]:
+            with self.subTest(genres=genres, languages=languages):
+                self.assert_matches(self.sketches.query(genres, languages), self.expected(genres, languages))
+                self.assert_matches(self.sketches.query(genres, languages, "paid"), self.expected(genres, languages, "paid"))
+
+    def test_selection_cached(self):
+        first = self.sketches.query(["Action", "RPG"], ["French"])
+        self.assertIs(self.sketches.query(["RPG", "Action"], ["French"]), first)
+        self.assertIsNot(self.sketches.query(["RPG", "Action"], ["English"]), first)
+
+    def test_unknown_value(self):
+        self.assertEqual(self.sketches.query("Racing").n, 0)
+        self.assertEqual(self.sketches.query(["Racing", "Puzzle"]).n, len(self.expected(["Puzzle"])))
+
+    def test_get_statistics(self):
+        with mock.patch.object(q2_analysis, "get_price_sketches", return_value=self.sketches):
+            stats = q2_analysis.get_statistics(["Action", "RPG"], "French")
+        prices = self.expected(["Action", "RPG"], ["French"])
+        paid = prices[prices > 0]
+        self.assertEqual(
+            (stats['total_games'], stats['free_games'], stats['paid_games']),
+            (len(prices), int((prices == 0).sum()), len(paid)),
+        )
+        self.assertAlmostEqual(stats['median_price'], paid.median())
+        self.assertAlmostEqual(stats['p25_price'], paid.quantile(0.25))
+        self.assertAlmostEqual(stats['p90_price'], paid.quantile(0.9))
+        self.assertAlmostEqual(stats['average_price'], paid.mean())
+        self.assertEqual(stats['under_10'], int((paid < 10).sum()))
@@ -0,0 +1,93 @@
+import csv
+import os
+import tempfile
+from django.test import SimpleTestCase
+from statistical_analysis.sanitizer import SANITIZER_VERSION, is_fresh, read_stats, sanitize_csv
+
+RAW = (
+    'app_id,name,score\n'
+    '1,"Pixel ""Quest""",10\n'
+    '2,"Deux\nlignes",\\N\n'
+    '3,Trop,de,champs\n'
+    '4,"Mal"quoté,5\n'
+    '5,Court\n'
+    '\n'
+    '6,Fin,N\n'
+)
+
+
+class SanitizeCsvTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = self.file("raw.csv")
+        with open(self.path, "w", encoding="utf-8", newline="") as f:
+            f.write(RAW)
+        self.output_path = self.file("clean", "raw.csv")
+        self.rejects_path = self.file("clean", "raw.rejects.csv")
+
+    def file(self, *names):
+        return os.path.join(self.directory.name, *names)
+
+    def sanitize(self, options=None):
+        return sanitize_csv(self.path, self.output_path, self.rejects_path, options or {})
+
+    def read(self, path):
+        with open(path, encoding="utf-8", newline="") as f:
+            return list(csv.reader(f))
+
+    def test_clean_output(self):
+        self.sanitize()
+        self.assertEqual(self.read(self.output_path), [
+            ['app_id', 'name', 'score'],
+            ['1', 'Pixel "Quest"', '10'],
+            ['2', 'Deux lignes', ''],
+            ['5', 'Court', ''],
+            ['6', 'Fin', ''],
+        ])
+
+    def test_rejects(self):
+        self.sanitize()
+        header, wide, broken = self.read(self.rejects_path)
+        self.assertEqual(header, ['line', 'reason', 'fields'])
+        self.assertEqual(wide, ['5', 'expected 3 fields, saw 4', '3,Trop,de,champs'])
+        self.assertEqual(broken[0], '6')
+        self.assertIn("expected after '\"'", broken[1])
+
+    def test_stats(self):
+        stats = self.sanitize()
+        self.assertEqual(read_stats(self.output_path), stats)
+        self.assertEqual(stats['version'], SANITIZER_VERSION)
+        self.assertEqual(stats['source_size'], os.path.getsize(self.path))
+        self.assertEqual(
+            {key: stats[key] for key in ('rows_read', 'rows_written', 'rows_padded', 'rows_quarantined', 'nulls_normalized')},
+            {'rows_read': 6, 'rows_written': 4, 'rows_padded': 1, 'rows_quarantined': 2, 'nulls_normalized': 2},
+        )
+
+    def test_no_quoting_strips_quotes(self):
+        with open(self.path, "w", encoding="utf-8", newline="") as f:
+            f.write('"app_id","total"\n"1","12"\n"2","N"\n')
+        self.sanitize({'quoting': csv.QUOTE_NONE})
+        self.assertEqual(self.read(self.output_path), [['app_id', 'total'], ['1', '12'], ['2', '']])
+
+    def test_freshness(self):
+        self.assertFalse(is_fresh(self.path, self.output_path))
+        self.sanitize()
+        self.assertTrue(is_fresh(self.path, self.output_path))
+
+        # Same size, other modification time
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertFalse(is_fresh(self.path, self.output_path))
+        self.sanitize()
+
+        # Other size
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('7,Nouveau,1\n')
+        os.utime(self.path, ns=(stat.st_atime_ns, read_stats(self.output_path)['source_mtime_ns']))
+        self.assertFalse(is_fresh(self.path, self.output_path))
+
+        self.sanitize()
+        os.remove(self.output_path)
+        self.assertFalse(is_fresh(self.path, self.output_path))
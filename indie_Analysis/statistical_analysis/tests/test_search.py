@@ -0,0 +1,76 @@
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase
+from statistical_analysis import search
+from statistical_analysis.search import NameIndex, normalize_name, trigrams
+
+NAMES = [
+    "Portal 2",
+    "Portal",
+    "Stardew Valley",
+    "Hollow Knight",
+    "Hollow Knight: Silksong",
+    "The Knight Witch",
+    "Pokémon Portal Quest",
+    "Valley of Knights",
+]
+
+
+class NameIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = NameIndex(np.arange(1, len(NAMES) + 1) * 10, NAMES)
+
+    def names(self, query, limit=10):
+        return [match['name'] for match in self.index.search(query, limit)]
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("  Pokémon:  Portal-Quest! "), "pokemon portal quest")
+        self.assertEqual(normalize_name(None), "")
+
+    def test_prefix_matches_rank_first_shortest_first(self):
+        self.assertEqual(self.names("port")[:2], ["Portal", "Portal 2"])
+        self.assertEqual(self.names("hollow kn", limit=2), ["Hollow Knight", "Hollow Knight: Silksong"])
+        # Accents and case are ignored
+        self.assertEqual(self.names("POKEMON"), ["Pokémon Portal Quest"])
+
+    def test_infix_matches_after_prefix_matches(self):
+        names = self.names("portal")
+        self.assertEqual(names[:2], ["Portal", "Portal 2"])
+        self.assertIn("Pokémon Portal Quest", names[2:])
+
+        names = self.names("knight")
+        self.assertEqual(set(names[:4]), {"Hollow Knight", "Hollow Knight: Silksong", "The Knight Witch", "Valley of Knights"})
+
+    def test_scores_decrease(self):
+        matches = self.index.search("hollow knight")
+        self.assertEqual(matches[0], {'app_id': 40, 'name': "Hollow Knight", 'score': 3.0})
+        scores = [match['score'] for match in matches]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_typo(self):
+        self.assertEqual(self.names("stardew valey")[0], "Stardew Valley")
+        self.assertEqual(self.names("hollow nkight")[0], "Hollow Knight")
+
+    def test_limit_and_empty_queries(self):
+        self.assertEqual(len(self.index.search("a", limit=1)), 0)
+        self.assertEqual(len(self.index.search("knight", limit=2)), 2)
+        self.assertEqual(self.index.search("  !! "), [])
+        self.assertEqual(self.index.search("zzzzzz"), [])
+
+    def test_dense_and_sparse_counts_agree(self):
+        # Few candidates are sorted, many are counted over every name
+        index = NameIndex(np.arange(1000), NAMES + [f"qq{i:04d}" for i in range(1000 - len(NAMES))])
+        for query in ("hollow knight", "knight witch", "portal quest", "valley knights", "qq0042"):
+            sparse = index.trigram_matches(query, len(index))
+            with mock.patch.object(search, "DENSE_CANDIDATES", 10 ** 9):
+                dense = index.trigram_matches(query, len(index))
+            self.assertEqual(sorted(zip(*map(np.ndarray.tolist, sparse))), sorted(zip(*map(np.ndarray.tolist, dense))))
+
+            # Names sharing at least 60% of the trigrams of the best match
+            shared = {name: len(trigrams(name) & trigrams(query)) for name in index.normalized}
+            best = max(shared.values())
+            self.assertEqual(
+                {index.normalized[position] for position in sparse[0].tolist()},
+                {name for name, count in shared.items() if count >= int(best * 0.6)},
+            )
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+from statistical_analysis.q1_analysis import tag_counts_node, tag_matrix_node
+from statistical_analysis.sketches import CountMinSketch, HyperLogLog, sketch_sources
+
+
+class CountMinSketchTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.values = np.array([f"tag{i}" for i in rng.zipf(1.5, 50_000) % 2000], dtype=object)
+        self.counts = pd.Series(self.values).value_counts()
+
+    def test_estimates_within_bound(self):
+        sketch = CountMinSketch(epsilon=0.01, delta=0.01)
+        sketch.update(self.values)
+        estimates = np.array([sketch.estimate(value) for value in self.counts.index])
+        self.assertTrue((estimates >= self.counts.to_numpy()).all())
+        self.assertTrue((estimates - self.counts.to_numpy() <= sketch.error_bound()).all())
+        self.assertEqual(sketch.top(5).index.tolist(), self.counts.index[:5].tolist())
+
+    def test_merge_matches_single_sketch(self):
+        whole = CountMinSketch(epsilon=0.01, delta=0.01)
+        whole.update(self.values)
+        merged = CountMinSketch(epsilon=0.01, delta=0.01)
+        for chunk in np.array_split(self.values, 4):
+            part = CountMinSketch(epsilon=0.01, delta=0.01)
+            part.update(chunk)
+            merged.merge(part)
+        np.testing.assert_array_equal(merged.table, whole.table)
+        self.assertEqual(merged.total, whole.total)
+        self.assertEqual(merged.top(10).to_dict(), whole.top(10).to_dict())
+
+
+class HyperLogLogTests(SimpleTestCase):
+
+    def test_count_within_error(self):
+        sketch = HyperLogLog()
+        sketch.update(np.arange(100_000))
+        self.assertLess(abs(sketch.count() / 100_000 - 1), 4 * sketch.relative_error())
+
+    def test_small_counts(self):
+        sketch = HyperLogLog()
+        sketch.update(np.array(["a", "b", "c", "a"], dtype=object))
+        self.assertEqual(sketch.count(), 3)
+
+    def test_merge_is_union(self):
+        left, right, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        left.update(np.arange(0, 60_000))
+        right.update(np.arange(40_000, 100_000))
+        union.update(np.arange(0, 100_000))
+        left.merge(right)
+        self.assertEqual(left.count(), union.count())
+
+
+class DatasetSketchesTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        app_ids = rng.integers(1, 3000, 40_000)
+        tags = np.array([f"tag{i}" for i in rng.zipf(1.6, 40_000) % 300], dtype=object)
+        # Some pairs are listed twice, with stray spaces
+        tags[::7] = " " + tags[::7]
+        self.sources = {
+            'tags': pd.DataFrame({'app_id': np.concatenate([app_ids, app_ids[:5000]]),
+                                  'tag': np.concatenate([tags, tags[:5000]])}),
+            'games': pd.DataFrame({'app_id': np.arange(1, 2500), 'type': "game",
+                                   'languages': "English, French"}),
+        }
+        self.games = self.sources['games'][["app_id"]]
+
+    def test_tag_counts_match_exact_counts(self):
+        # Both modes count the distinct games of each tag
+        exact = tag_counts_node(tag_matrix_node(self.sources, self.games))
+        sketches = sketch_sources(self.sources, self.games["app_id"])
+        estimates = np.array([sketches.tags.estimate(tag) for tag in exact.index])
+
+        error_bound, _ = sketches.tag_error()
+        self.assertEqual(sketches.tags.total, exact.sum())
+        self.assertTrue((estimates >= exact.to_numpy()).all())
+        self.assertTrue((estimates - exact.to_numpy() <= error_bound).all())
+        self.assertEqual(sketches.top_tags(3).index.tolist(), exact.index[:3].tolist())
+        self.assertLess(abs(sketches.distinct_tag_count() / len(exact) - 1), 0.05)
+
+    def test_language_game_counts(self):
+        counts = sketch_sources(self.sources, self.games["app_id"]).language_game_counts()
+        self.assertEqual(set(counts.index), {"English", "French"})
+        self.assertTrue((abs(counts / 2499 - 1) < 0.05).all())
@@ -1,5 +1,19 @@
 # utils/chart_config.py
 
+import base64
+import functools
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# Serialize figures with orjson when it is installed
+try:
+    import orjson
+    pio.json.config.default_engine = 'orjson'
+except ImportError:
+    pio.json.config.default_engine = 'json'
+
 # Your color scheme - used across all charts
 COLORS = {
     'bg_dark': '#0a0e1a',
@@ -12,30 +26,53 @@ COLORS = {
     'text_white': '#ffffff',
 }
 
-def get_base_layout(title, height=600):
+# Name of the Plotly template carrying the DataPlay look
+TEMPLATE_NAME = 'dataplay'
+
+def register_template():
     """
-    Returns base Plotly layout configuration
-    Use this for consistent styling across all charts
+    Register the DataPlay look as a Plotly template (validated once, at import)
+    Returns the template as a plain dict, ready to embed in figure specs
     """
-    return {
-        'title': {
-            'text': title,
+    template = go.layout.Template(pio.templates['plotly'])
+    template.layout.update(
+        title={
             'font': {'size': 20, 'color': COLORS['text_white'], 'family': 'Segoe UI'},
             'x': 0.5,
             'xanchor': 'center'
         },
-        'plot_bgcolor': COLORS['dark_blue'],
-        'paper_bgcolor': COLORS['bg_dark'],
-        'font': dict(family='Segoe UI', color=COLORS['text_light']),
-        'hovermode': 'closest',
+        plot_bgcolor=COLORS['dark_blue'],
+        paper_bgcolor=COLORS['bg_dark'],
+        font=dict(family='Segoe UI', color=COLORS['text_light']),
+        hovermode='closest'
+    )
+    pio.templates[TEMPLATE_NAME] = template
+    return template.to_plotly_json()
+
+TEMPLATE = register_template()
+
+# Typed-array dtypes understood by plotly.js, smallest first
+TYPED_ARRAY_INT_DTYPES = ['i1', 'u1', 'i2', 'u2', 'i4', 'u4']
+
+# Div ids of the charts whose spec was already checked by the validators
+_validated = set()
+
+def get_base_layout(title, height=600):
+    """
+    Returns base Plotly layout configuration
+    Use this for consistent styling across all charts
+    """
+    return {
+        'title': {'text': title},
         'height': height,
-        'margin': dict(t=80, b=60, l=60, r=40)
+        'margin': dict(t=80, b=60, l=60, r=40),
+        'template': TEMPLATE,
     }
 
 def get_axis_style(title, grid=True):
     """Returns axis styling configuration"""
     config = {
-        'title': title,
+        'title': {'text': title},
         'color': COLORS['text_light'],
     }
     if grid:
@@ -43,4 +80,72 @@ def get_axis_style(title, grid=True):
             'gridcolor': COLORS['primary_blue'],
             'gridwidth': 0.5
         })
-    return config
\ No newline at end of file
+    return config
+
+def hline(y, text, color=COLORS['text_light']):
+    """Dashed horizontal reference line with its label, as (shape, annotation)"""
+    shape = dict(type='line', xref='x domain', yref='y', x0=0, x1=1, y0=y, y1=y,
+                 line=dict(color=color, dash='dash'))
+    annotation = dict(text=text, xref='x domain', yref='y', x=1, y=y, xanchor='left',
+                      yanchor='middle', showarrow=False)
+    return shape, annotation
+
+@functools.lru_cache(maxsize=None)
+def get_plotlyjs_loader():
+    """
+    Script tags loading plotly.js from the CDN
+    Built once: Plotly reads and hashes the bundled plotly.js (SRI) every time it writes them
+    """
+    html = pio.to_html({'data': [], 'layout': {}}, include_plotlyjs='cdn', full_html=False,
+                       div_id='plotlyjs-loader', validate=False)
+    return html[len('<div>'):html.index('<div id="plotlyjs-loader"')].strip()
+
+def encode_array(values):
+    """
+    Encode a numeric array in plotly.js typed-array form ({'dtype', 'bdata'} in base64,
+    plus 'shape' as "rows, columns" for 2-D arrays such as heatmap z)
+    Integers use the smallest dtype that holds them, other arrays become plain lists
+    """
+    array = np.asarray(values)
+    if array.dtype.kind in 'iu' and array.size:
+        low, high = array.min(), array.max()
+        for dtype in TYPED_ARRAY_INT_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                break
+        else:
+            dtype = 'f8'
+    elif array.dtype.kind == 'f':
+        dtype = 'f4' if array.dtype == np.float32 else 'f8'
+    else:
+        # Text, booleans, dates: JSON lists (pandas objects keep their element types)
+        return values.tolist()
+    data = np.ascontiguousarray(array, dtype=np.dtype(dtype).newbyteorder('<'))
+    encoded = {'dtype': dtype, 'bdata': base64.b64encode(data.tobytes()).decode('ascii')}
+    if array.ndim > 1:
+        encoded['shape'] = ", ".join(str(length) for length in array.shape)
+    return encoded
+
+def encode_arrays(spec):
+    """Encode every NumPy / pandas array of a trace (recursively) as a typed array"""
+    encoded = {}
+    for key, value in spec.items():
+        if isinstance(value, dict):
+            value = encode_arrays(value)
+        elif isinstance(value, (np.ndarray, pd.Series, pd.Index)):
+            value = encode_array(value)
+        encoded[key] = value
+    return encoded
+
+def render_chart(traces, layout, div_id):
+    """
+    Render a figure spec (plain dicts, see get_base_layout) to HTML
+    The spec of each chart goes through the Plotly validators the first time only,
+    numeric arrays are sent as typed arrays
+    """
+    spec = {'data': [encode_arrays(trace) for trace in traces], 'layout': layout}
+    if div_id not in _validated:
+        go.Figure(spec)
+        _validated.add(div_id)
+    html = pio.to_html(spec, include_plotlyjs=False, full_html=False, div_id=div_id, validate=False)
+    return get_plotlyjs_loader() + html